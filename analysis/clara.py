@@ -0,0 +1,189 @@
+# ----------------------------------------
+# CLARA (Clustering LARge Applications): sampled k-medoids for large customer bases
+#   - PAM runs on repeated random samples (never on all n rows --> no n×n matrix)
+#   - every sample's medoids are scored against the full dataset in chunks;
+#     the lowest total distance wins
+#   - memory cap bounds both the sample size (s×s PAM matrix) and the assignment chunks
+#   - compare_to_pam() reports how closely it matches full PAM on a dataset
+# ----------------------------------------
+
+# imports
+import time, numpy as np, pandas as pd
+from sklearn import metrics
+from sklearn.base import BaseEstimator, ClusterMixin, clone
+from sklearn.metrics import pairwise_distances
+from sklearn.utils import check_random_state
+from sklearn_extra.cluster import KMedoids
+from typing import Literal, Optional, Union
+
+
+# -------------------------- estimator --------------------------
+class Clara(BaseEstimator, ClusterMixin):
+    '''
+    sklearn style CLARA estimator (fit/predict/fit_predict, labels_, cluster_centers_, inertia_)
+
+    Parameters
+    ----------
+    n_clusters: number of medoids
+    metric: distance metric (euclidean, manhattan, cosine, ...)
+    init: PAM init used on each sample (k-medoids++, build, heuristic, random)
+    n_sampling: number of samples drawn (best one kept)
+    sample_size: rows per sample (default: max(1000, 40 + 2k)); always limited to n and the memory cap
+    max_memory_mb: cap for the sample distance matrix and each assignment chunk
+    max_iter: PAM iterations per sample
+    random_state: seed for sampling and PAM init
+    '''
+    def __init__(
+        self,
+        n_clusters: int = 8,
+        metric: str = 'euclidean',
+        init: Literal['k-medoids++', 'build', 'heuristic', 'random'] = 'k-medoids++',
+        n_sampling: int = 5,
+        sample_size: Optional[int] = None,
+        max_memory_mb: float = 512,
+        max_iter: int = 300,
+        random_state=None
+    ):
+        self.n_clusters = n_clusters
+        self.metric = metric
+        self.init = init
+        self.n_sampling = n_sampling
+        self.sample_size = sample_size
+        self.max_memory_mb = max_memory_mb
+        self.max_iter = max_iter
+        self.random_state = random_state
+
+    # ---- memory bounds ---- #
+    def _max_bytes(self) -> int:
+        return int(self.max_memory_mb * 1024 ** 2)
+
+    def _sample_rows(self, n: int) -> int:
+        '''
+        rows per sample, shrunk so the s×s float64 PAM matrix fits the memory cap
+        '''
+        size = self.sample_size or max(40 + 2 * self.n_clusters, 1000)
+        cap = int(np.sqrt(self._max_bytes() / 8))
+        return max(self.n_clusters, min(n, size, cap))
+
+    def _chunk_rows(self) -> int:
+        '''
+        rows per assignment chunk (chunk×k distances + temporaries within the cap)
+        '''
+        return max(1, self._max_bytes() // (8 * 4 * max(1, self.n_clusters)))
+
+    # ---- assignment ---- #
+    def _assign(self, X: np.ndarray, medoids: np.ndarray):
+        '''
+        nearest medoid per row (chunked) --> (labels, total distance)
+        '''
+        labels = np.empty(len(X), dtype=np.int64)
+        total = 0.0
+        step = self._chunk_rows()
+        for start in range(0, len(X), step):
+            dist = pairwise_distances(X[start:start + step], medoids, metric=self.metric)
+            labels[start:start + len(dist)] = dist.argmin(axis=1)
+            total += dist.min(axis=1).sum()
+        return labels, total
+
+    # ---- fit ---- #
+    def fit(self, X, y=None):
+        X = np.ascontiguousarray(X.values if isinstance(X, pd.DataFrame) else X, dtype=np.float64)
+        n = len(X)
+        if n < self.n_clusters:
+            raise ValueError(f'⚠ VALUE ERROR: n_samples={n} must be >= n_clusters={self.n_clusters}')
+
+        rng = check_random_state(self.random_state)
+        size = self._sample_rows(n)
+        best = None
+
+        for _ in range(self.n_sampling):
+            # keep current best medoids in the sample (classic CLARA) --> cost never gets worse
+            keep = best['medoid_indices'] if best else np.empty(0, dtype=np.int64)
+            pool = np.setdiff1d(np.arange(n), keep, assume_unique=True)
+            sample = np.concatenate([keep, rng.choice(pool, size - len(keep), replace=False)])
+
+            pam = KMedoids(
+                n_clusters=self.n_clusters,
+                metric=self.metric,
+                method='pam',
+                init=self.init,
+                max_iter=self.max_iter,
+                random_state=rng.randint(np.iinfo(np.int32).max)
+            ).fit(X[sample])
+
+            medoid_indices = sample[pam.medoid_indices_]
+            labels, cost = self._assign(X, X[medoid_indices])
+            if best is None or cost < best['cost']:
+                best = {'cost': cost, 'medoid_indices': medoid_indices, 'labels': labels}
+
+            # whole dataset fits in one sample --> more samples can't differ
+            if size == n:
+                break
+
+        self.medoid_indices_ = best['medoid_indices']
+        self.cluster_centers_ = X[self.medoid_indices_]
+        self.labels_ = best['labels']
+        self.inertia_ = best['cost']
+        self.sample_size_ = size
+        return self
+
+    def predict(self, X) -> np.ndarray:
+        X = np.asarray(X.values if isinstance(X, pd.DataFrame) else X, dtype=np.float64)
+        return self._assign(X, self.cluster_centers_)[0]
+
+
+# -------------------------- comparison report --------------------------
+def compare_to_pam(
+    data: Union[pd.DataFrame, np.ndarray],
+    pam_model: KMedoids,
+    clara_model: Optional[Clara] = None,
+    silhouette_sample: Optional[int] = 10_000
+) -> pd.DataFrame:
+    '''
+    fit full PAM and CLARA on the same data and report how closely CLARA matches
+
+    rows: PAM, CLARA
+    columns: silhouette, inertia, wall_time, medoid_shift (mean distance from each PAM medoid
+             to its closest CLARA medoid), medoids_shared (exact medoid matches), label_agreement (ARI)
+
+    Parameters
+    ----------
+    data: scaled dataframe/array
+    pam_model: unfitted KMedoids(method='pam') model (ex. best_pam_model)
+    clara_model: optional Clara model (default: same k/metric/init/random_state as pam_model)
+    silhouette_sample: rows used for silhouette (None --> all rows, O(n²))
+    '''
+    X = np.ascontiguousarray(data.values if isinstance(data, pd.DataFrame) else data, dtype=np.float64)
+    clara_model = clara_model or Clara(
+        n_clusters=pam_model.n_clusters,
+        metric=pam_model.metric,
+        init=pam_model.init,
+        random_state=pam_model.random_state
+    )
+
+    fits = {}
+    for name, model in [('PAM', pam_model), ('CLARA', clara_model)]:
+        started = time.perf_counter()
+        fitted = clone(model).fit(X)
+        fits[name] = (fitted, time.perf_counter() - started)
+
+    pam, clara = fits['PAM'][0], fits['CLARA'][0]
+    medoid_dist = pairwise_distances(pam.cluster_centers_, clara.cluster_centers_, metric=pam_model.metric)
+    shared = len(np.intersect1d(pam.medoid_indices_, clara.medoid_indices_))
+    sample_size = silhouette_sample if silhouette_sample and silhouette_sample < len(X) else None
+
+    rows = []
+    for name, (fitted, wall_time) in fits.items():
+        rows.append({
+            'Model': name,
+            'silhouette': metrics.silhouette_score(
+                X, fitted.labels_, metric=pam_model.metric,
+                sample_size=sample_size, random_state=pam_model.random_state
+            ),
+            'inertia': fitted.inertia_,
+            'wall_time': wall_time,
+            'medoid_shift': 0.0 if name == 'PAM' else medoid_dist.min(axis=1).mean(),
+            'medoids_shared': pam.n_clusters if name == 'PAM' else shared,
+            'label_agreement': 1.0 if name == 'PAM' else metrics.adjusted_rand_score(pam.labels_, fitted.labels_)
+        })
+    return pd.DataFrame(rows).set_index('Model')
@@ -0,0 +1,121 @@
+# ----------------------------------------
+# Pairwise distance matrix cache for PAM + silhouette evaluation
+#   - keyed on dataset fingerprint + metric
+#   - stored as float32 .npy files and read back memory-mapped
+#     (worker processes share the same pages instead of recomputing n×n)
+#   - least recently used files evicted to stay within a disk budget
+# ----------------------------------------
+
+# imports
+import hashlib, os, numpy as np, pandas as pd
+from pathlib import Path
+from sklearn.metrics import pairwise_distances
+from typing import Union
+
+# cache location/budget
+cache_dir = Path(__file__).resolve().parents[1] / 'data' / 'cache' / 'distances'
+disk_budget_bytes = 2 * 1024 ** 3
+
+# rows computed per block when filling a new matrix
+block_rows = 2048
+
+
+# -------------------------- keys --------------------------
+def fingerprint(data: Union[pd.DataFrame, np.ndarray]) -> str:
+    '''
+    sha1 of shape + values (float64, C order) --> same data gives same key
+    '''
+    arr = np.ascontiguousarray(data.values if isinstance(data, pd.DataFrame) else data, dtype=np.float64)
+    digest = hashlib.sha1(str(arr.shape).encode())
+    digest.update(arr.tobytes())
+    return digest.hexdigest()
+
+
+def cache_path(data, metric: str) -> Path:
+    return cache_dir / f'{fingerprint(data)}_{metric}.f32.npy'
+
+
+# -------------------------- cache --------------------------
+def _fill(out: np.ndarray, arr: np.ndarray, metric: str) -> np.ndarray:
+    '''
+    write pairwise distances into out one block of rows at a time
+    (diagonal forced to 0 so silhouette accepts it as precomputed)
+    '''
+    for start in range(0, len(arr), block_rows):
+        block = out[start:start + block_rows]
+        block[:] = pairwise_distances(arr[start:start + block_rows], arr, metric=metric)
+        rows = np.arange(len(block))
+        block[rows, start + rows] = 0
+    return out
+
+
+def get_distances(
+    data: Union[pd.DataFrame, np.ndarray],
+    metric: str = 'euclidean',
+    writable: bool = False
+) -> np.memmap:
+    '''
+    return n×n distance matrix (float32, read-only memory map) for data + metric,
+    computing it block by block on a cache miss
+    writable=True --> copy-on-write map (pages copied only if written, cache file never changes);
+    needed by Cython code that takes non-const buffers, ex) KMedoids(method='pam')
+
+    use with metric='precomputed', ex)
+        KMedoids(metric='precomputed', ...).fit(get_distances(df, 'manhattan'))
+        silhouette_score(get_distances(df), labels, metric='precomputed')
+    '''
+    path = cache_path(data, metric)
+    mmap_mode = 'c' if writable else 'r'
+
+    # hit: mark as recently used
+    if path.exists():
+        os.utime(path)
+        return np.load(path, mmap_mode=mmap_mode)
+
+    arr = np.ascontiguousarray(data.values if isinstance(data, pd.DataFrame) else data, dtype=np.float64)
+    n = len(arr)
+
+    # larger than the whole budget: compute in memory, don't cache
+    if n * n * 4 > disk_budget_bytes:
+        return _fill(np.empty((n, n), dtype=np.float32), arr, metric)
+
+    # miss: fill a memory mapped file block by block (peak ram = one block)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    evict(extra_bytes=n * n * 4)
+
+    tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+    out = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float32, shape=(n, n))
+    _fill(out, arr, metric).flush()
+    del out
+
+    # atomic publish (another process may have written the same key meanwhile)
+    os.replace(tmp_path, path)
+    return np.load(path, mmap_mode=mmap_mode)
+
+
+def evict(extra_bytes: int = 0, budget: int = None) -> int:
+    '''
+    delete least recently used matrices until cache + extra_bytes fits the budget
+    returns number of files removed
+    '''
+    budget = disk_budget_bytes if budget is None else budget
+    if not cache_dir.exists():
+        return 0
+
+    files = sorted(cache_dir.glob('*.npy'), key=lambda p: p.stat().st_mtime)
+    total = sum(p.stat().st_size for p in files) + extra_bytes
+    removed = 0
+    for p in files:
+        if total <= budget:
+            break
+        total -= p.stat().st_size
+        p.unlink(missing_ok=True)
+        removed += 1
+    return removed
+
+
+def clear() -> None:
+    '''
+    remove every cached matrix
+    '''
+    evict(budget=0)
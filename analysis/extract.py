@@ -0,0 +1,148 @@
+# ----------------------------------------
+# Streaming extract: Postgres query --> typed pandas/Arrow columns
+#   - named (server side) cursor streams fixed size chunks (no full list of tuples)
+#   - numeric decoded straight to float (no Decimal objects / pd.to_numeric pass)
+#   - each chunk converted to typed numpy columns (float64, int64, datetime64, bool)
+#   - optional column projection pushed into the query
+#   - optional pyarrow output
+# ----------------------------------------
+
+# imports
+import itertools, numpy as np, pandas as pd, psycopg2
+from psycopg2 import sql
+from typing import Iterator, Optional, Sequence
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+# rows per fetch from the server side cursor
+chunk_rows = 100_000
+
+# postgres type oid --> numpy dtype (anything else stays object)
+oid_dtypes = {
+    16:     np.bool_,               # bool
+    20:     np.int64,               # int8
+    21:     np.int64,               # int2
+    23:     np.int64,               # int4
+    700:    np.float64,             # float4
+    701:    np.float64,             # float8
+    1700:   np.float64,             # numeric
+    1082:   'datetime64[D]',        # date
+    1114:   'datetime64[us]',       # timestamp
+}
+
+# numeric --> float at the driver level
+DEC2FLOAT = psycopg2.extensions.new_type(
+    psycopg2.extensions.DECIMAL.values,
+    'DEC2FLOAT',
+    lambda value, cur: float(value) if value is not None else None
+)
+
+# unique cursor names per connection
+_cursor_ids = itertools.count()
+
+
+# -------------------------- query --------------------------
+def project(query: str, columns: Optional[Sequence[str]] = None):
+    '''
+    wrap query so only the given columns come back from the server
+    '''
+    if not columns:
+        return query
+    return sql.SQL('SELECT {cols} FROM ({query}) AS q').format(
+        cols=sql.SQL(', ').join(map(sql.Identifier, columns)),
+        query=sql.SQL(query)
+    )
+
+
+# -------------------------- decoding --------------------------
+def to_column(values: tuple, type_code: int) -> np.ndarray:
+    '''
+    one chunk of a column --> typed numpy array
+    (ints with NULLs become float64 with nan; dates/timestamps with NULLs become NaT)
+    '''
+    dtype = oid_dtypes.get(type_code, object)
+    if dtype is np.int64 and None in values:
+        dtype = np.float64
+    if dtype is np.bool_ and None in values:
+        dtype = object
+
+    arr = np.array(values, dtype=dtype)
+    if isinstance(dtype, str):
+        arr = arr.astype('datetime64[ns]')
+    return arr
+
+
+def iter_chunks(
+    conn,
+    query: str,
+    params=None,
+    columns: Optional[Sequence[str]] = None,
+    chunk_size: int = chunk_rows
+) -> Iterator[dict]:
+    '''
+    stream query results as {column name: typed numpy array} chunks of up to chunk_size rows
+    (uses a named cursor --> conn must not be in autocommit mode)
+    '''
+    with conn.cursor(name=f'extract_{next(_cursor_ids)}') as cur:
+        psycopg2.extensions.register_type(DEC2FLOAT, cur)
+        cur.itersize = chunk_size
+        cur.execute(project(query, columns), params)
+
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield {
+                desc.name: to_column(values, desc.type_code)
+                for desc, values in zip(cur.description, zip(*rows))
+            }
+
+
+# -------------------------- frames --------------------------
+def read_frame(
+    conn,
+    query: str,
+    params=None,
+    columns: Optional[Sequence[str]] = None,
+    chunk_size: int = chunk_rows
+) -> pd.DataFrame:
+    '''
+    run query and return a typed dataframe built from streamed chunks
+
+    Parameters
+    ----------
+    conn: psycopg2 connection
+    query: select statement (psycopg2 %s placeholders allowed)
+    params: optional query parameters
+    columns: optional subset of the query's columns to fetch
+    chunk_size: rows per fetch (bounds the python object overhead held at once)
+    '''
+    chunks = list(iter_chunks(conn, query, params, columns, chunk_size))
+    if not chunks:
+        return pd.DataFrame(columns=list(columns or []))
+    return pd.DataFrame({
+        name: np.concatenate([chunk[name] for chunk in chunks])
+        for name in chunks[0]
+    })
+
+
+def read_arrow(
+    conn,
+    query: str,
+    params=None,
+    columns: Optional[Sequence[str]] = None,
+    chunk_size: int = chunk_rows
+):
+    '''
+    same as read_frame() but returns a pyarrow Table (one record batch per chunk)
+    '''
+    if pa is None:
+        raise ImportError('⚠ ERROR: pyarrow is required for read_arrow()--> pip install pyarrow')
+    batches = [
+        pa.RecordBatch.from_pydict({name: pa.array(arr, from_pandas=True) for name, arr in chunk.items()})
+        for chunk in iter_chunks(conn, query, params, columns, chunk_size)
+    ]
+    return pa.Table.from_batches(batches) if batches else pa.table({name: [] for name in columns or []})
@@ -0,0 +1,329 @@
+# ----------------------------------------
+# Model selection grid for rfm_modeling.ipynb
+#   - each KMeans/KMedoids combination is fit ONCE and every score comes from that fit
+#   - combinations run in a process pool; the scaled dataset is shared read-only
+#     through shared memory (no copy per task)
+#   - wall time reported per combination
+#   - KMedoids fits + silhouette read cached n×n distances (distance_cache.py)
+#     through metric='precomputed' instead of recomputing them per combination
+# ----------------------------------------
+
+# imports
+import itertools, os, time, numpy as np, pandas as pd, threadpoolctl
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from sklearn import metrics
+from sklearn.base import clone
+from sklearn.cluster import KMeans
+from sklearn_extra.cluster import KMedoids
+from typing import List, Literal, Optional, Tuple, Union
+from distance_cache import get_distances
+
+# score names (in output order) and display names
+score_lst = ['silhouette', 'ch_score', 'davies_bouldin', 'inertia']
+score_names = ['Silhouette (↑)', 'CH Index (↑)', 'DB Index (↓)', 'Inertia (↓)']
+
+# worker state: shared dataset attached once per process
+_shared = {}
+
+
+# -------------------------- labels --------------------------
+def model_label(model: Union[KMeans, 'KMedoids']) -> str:
+    '''
+    descriptive row label ex) KMedoids | k=3 | metric=euclidean | init=k-medoids++
+    '''
+    model_type = model.__class__.__name__
+    idx = f'{model_type} | k={model.n_clusters}'
+    return f'{idx} | metric={model.metric} | init={model.init}' if model_type == 'KMedoids' else idx
+
+
+# -------------------------- single fit --------------------------
+def fit_model(
+    model: Union[KMeans, 'KMedoids'],
+    data: Union[pd.DataFrame, np.ndarray],
+    use_cache: bool = True
+) -> Tuple[Union[KMeans, 'KMedoids'], np.ndarray]:
+    '''
+    fit a clone of model and return (fitted model, cluster centers in feature space)
+    - KMedoids (use_cache) fits on the cached distance matrix for its metric;
+      centers are then the medoid rows of data
+      (method='pam' swaps in Cython that rejects read-only buffers --> copy-on-write map)
+    '''
+    data = data.values if isinstance(data, pd.DataFrame) else data
+    if use_cache and isinstance(model, KMedoids):
+        dist = get_distances(data, model.metric, writable=model.method == 'pam')
+        fitted = clone(model).set_params(metric='precomputed').fit(dist)
+        return fitted, data[fitted.medoid_indices_]
+
+    fitted = clone(model).fit(data)
+    return fitted, fitted.cluster_centers_
+
+
+def score_fit(model: Union[KMeans, 'KMedoids'], data: np.ndarray, use_cache: bool = True) -> dict:
+    '''
+    fit model once and compute every score from that fit
+    (silhouette from the cached euclidean distance matrix when use_cache)
+    '''
+    started = time.perf_counter()
+    fitted, _ = fit_model(model, data, use_cache)
+    labels = fitted.labels_
+
+    row = {
+        'silhouette': (
+            metrics.silhouette_score(get_distances(data), labels, metric='precomputed')
+            if use_cache else metrics.silhouette_score(data, labels)
+        ),
+        'ch_score': metrics.calinski_harabasz_score(data, labels),
+        'davies_bouldin': metrics.davies_bouldin_score(data, labels),
+        'inertia': fitted.inertia_
+    }
+    row['wall_time'] = time.perf_counter() - started
+    return row
+
+
+def _init_worker(shm_name, shape, dtype):
+    '''
+    attach shared dataset (read-only) and keep one thread per process
+    '''
+    shm = shared_memory.SharedMemory(name=shm_name)
+    data = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    data.setflags(write=False)
+    _shared['shm'], _shared['data'] = shm, data
+
+    os.environ['OMP_NUM_THREADS'] = '1'
+    threadpoolctl.threadpool_limits(1)
+
+
+def _score_shared(model, use_cache):
+    return score_fit(model, _shared['data'], use_cache)
+
+
+# -------------------------- grid executor --------------------------
+def run_grid(
+    models: List[Union[KMeans, 'KMedoids']],
+    data: Union[pd.DataFrame, np.ndarray],
+    n_jobs: Optional[int] = None,
+    verbose: bool = True,
+    use_cache: bool = True
+) -> List[dict]:
+    '''
+    score every model (one fit each) and return rows in model order
+
+    Parameters
+    ----------
+    models: unfitted KMeans/KMedoids models to evaluate
+    data: scaled dataframe/array to fit on
+    n_jobs: worker processes (default: all cores; 1 --> run in this process)
+    verbose: print wall time per combination as each one finishes
+    use_cache: fit KMedoids + score silhouette on cached distance matrices (metric='precomputed')
+    '''
+    data = np.ascontiguousarray(data.values if isinstance(data, pd.DataFrame) else data, dtype=np.float64)
+    n_jobs = min(n_jobs or os.cpu_count() or 1, len(models)) or 1
+    rows = [None] * len(models)
+
+    # build each needed distance matrix once up front (workers then only memory map them)
+    if use_cache:
+        for metric in {'euclidean'} | {m.metric for m in models if isinstance(m, KMedoids)}:
+            get_distances(data, metric)
+
+    def record(i, row):
+        row['Model'] = model_label(models[i])
+        rows[i] = row
+        if verbose:
+            print(f"{row['Model']:<60} {row['wall_time']:8.2f}s")
+
+    # small grids / single core: no pool overhead
+    if n_jobs == 1:
+        for i, model in enumerate(models):
+            record(i, score_fit(model, data, use_cache))
+        return rows
+
+    # shared read-only copy of the dataset for all workers
+    shm = shared_memory.SharedMemory(create=True, size=data.nbytes)
+    try:
+        np.ndarray(data.shape, dtype=data.dtype, buffer=shm.buf)[:] = data
+        with ProcessPoolExecutor(
+            max_workers=n_jobs,
+            initializer=_init_worker,
+            initargs=(shm.name, data.shape, data.dtype)
+        ) as pool:
+            futures = {pool.submit(_score_shared, model, use_cache): i for i, model in enumerate(models)}
+            for fut in as_completed(futures):
+                record(futures[fut], fut.result())
+    finally:
+        shm.close()
+        shm.unlink()
+    return rows
+
+
+# -------------------------- notebook helpers --------------------------
+# function: get cluster scores based on a metric
+def get_cluster_scores(
+    use_model: Union[KMeans, 'KMedoids'],
+    df: pd.DataFrame,
+    k_vals=range(2,6),
+    metric: Literal['silhouette', 'ch_score', 'davies_bouldin', 'inertia'] = 'davies_bouldin'
+):
+    '''
+    score diffent cluster counts by one of three different metrics
+    returns list of dicts with k value and score
+
+    Parameters
+    ----------
+    use_model: use Kmeans or KMedoids/PAM model
+    df: scaled/transformed dataframe
+    k_vals: optional list of potential number of segments
+    metric: optional choice of metric to score each k value by (default is davies_bouldin)
+    '''
+    # make case insensitive
+    metric = metric.lower()
+    if metric not in score_lst:
+        raise ValueError("Metric must be one of the following: silhouette, ch_score, davies_bouldin, inertia")
+
+    rows = run_grid([clone(use_model).set_params(n_clusters=k) for k in k_vals], df, n_jobs=1, verbose=False)
+    print(f'Finished scoring by {metric}')
+
+    return [{'k': k, 'score': row[metric]} for k, row in zip(k_vals, rows)]
+
+
+# function: get cluster scores for all metrics ['silhouette', 'ch_score', 'davies_bouldin', 'inertia']
+def get_all_cluster_scores(
+    model: Union[KMeans, 'KMedoids'],
+    df: pd.DataFrame
+) -> dict:
+    '''
+    returns all scores of one model (single fit) as a row dictionary
+    '''
+    row = run_grid([model], df, n_jobs=1, verbose=False)[0]
+    return {score: row[score] for score in score_lst}
+
+
+# function: test different models and get dataframe with score results ['Silhouette','CH Index','DB Index','Inertia']
+def get_models_scores(
+    scaled_df: pd.DataFrame,
+
+    multi_models: Optional[List[Union[KMeans, 'KMedoids']]] = None,
+    base_model: Optional[Union[KMeans, 'KMedoids']] = None,
+
+    changing_k: Optional[bool] = False,
+    k_vals: Optional[List[int]] = None,
+
+    changing_pam_metric: Optional[bool] = False,
+    pam_metrics: Optional[List[Literal['euclidean', 'manhattan', 'cosine']]] = None,
+
+    changing_pam_init: Optional[bool] = False,
+    pam_inits: Optional[List[Literal['k-medoids++', 'build', 'heuristic', 'random']]] = None,
+
+    n_jobs: Optional[int] = None
+) -> pd.DataFrame:
+
+    '''
+    Description:
+    - Get scores for ['Silhouette','CH Index','DB Index','Inertia'] from different models.
+    - Every model is fit once (all scores from that fit) and models run in parallel (n_jobs).
+    - Need to input scaled_df with either:
+        - multi_models
+        - base_model with at least one of the following changed from default: changing_k/k_vals, changing_pam_metric/pam_metrics, changing_pam_init/pam_inits
+
+    Scenarios:
+    1) **want to test list of multiple models**--> input multi_models
+    2) **want to test varying factors for one base model**
+        - *KMeans:* can test with changing_k
+        - *KMedoids/PAM:* can test with changing_k, changing_pam_metric, changing_pam_init
+
+    Parameters
+    ----------
+    - scaled_df: scaled DataFrame from which to fit model on
+
+    - multi_models: (optional) only enter list of KMeans and/or KMedoids/PAM models to test (nothing else can be entered)
+    - base_model: (optional) enter either KMeans or KMedoids/PAM model to test different k values along with other parameters
+
+    - changing_k: (optional) set to True if you want to test different k values on the base_model (will default to k=[2,3,4] if nothing entered for k_vals)
+    - k_vals: (optional) specified list of k values to test
+
+    - changing_pam_metric: (optional) only for KMedoids model--> set to True to test different metrics
+    - pam_metrics: (optional) only for KMedoids model--> specify list or it will default to ['euclidean', 'manhattan', 'cosine']
+
+    - changing_pam_init: (optional) only for KMedoids model--> set to True to test different inits
+    - pam_inits: (optional) only for Kmedoids model--> specify list or it will default to ['k-medoids++', 'build', 'random']
+
+    - n_jobs: (optional) worker processes (default: all cores)
+
+    Returns scores dataframe; wall time per combination (seconds) is in scores_df.attrs['wall_time']
+    '''
+
+    # update optional boolean parameters based on related parameter
+    changing_k = True if k_vals is not None and changing_k == False else changing_k
+    k_vals = range(2,5) if changing_k == True and k_vals == None else k_vals
+
+    changing_pam_metric = True if pam_metrics is not None and changing_pam_metric == False else changing_pam_metric
+    pam_metrics = ['euclidean', 'manhattan', 'cosine'] if changing_pam_metric and pam_metrics == None else pam_metrics
+
+    changing_pam_init = True if pam_inits is not None and changing_pam_init == False else changing_pam_init
+    pam_inits = ['k-medoids++', 'build', 'random'] if changing_pam_init and pam_inits == None else pam_inits
+
+    model_type = base_model.__class__.__name__ if base_model else None
+
+    # ---- Scenario 1 (Multi Models--K Means and/or PAM) -------------------- #
+    if (
+        multi_models is not None
+        and (changing_k and changing_k) == False
+        and base_model == None
+    ):
+        models = list(multi_models)
+
+    # ---- Scenario 2 (Base Model--K Means and/or PAM) -------------------- #
+    elif (
+        base_model
+        and (changing_k or changing_pam_metric or changing_pam_init) == True
+        and not (model_type != 'KMedoids' and (changing_pam_init or changing_pam_metric))
+    ):
+        # set up variables
+        k_vals = [base_model.n_clusters] if changing_k == False else k_vals
+        if model_type == 'KMedoids':
+            pam_metrics = [base_model.metric] if changing_pam_metric == False else pam_metrics
+            pam_inits = [base_model.init] if changing_pam_init == False else pam_inits
+
+        # build grid of models to tests' structure
+        m_structures = (
+            itertools.product(k_vals, pam_metrics, pam_inits)
+            if model_type == 'KMedoids'
+            else itertools.product(k_vals, [None], [None])
+        )
+
+        # create each model
+        models = []
+        for k, metric, init in m_structures:
+            model = clone(base_model).set_params(n_clusters=k)
+            if metric and init:
+                model.set_params(metric=metric, init=init)
+            models.append(model)
+
+    # -- Value Errors: doesn't fit either scenario --------------------------------------------------------------- #
+    else:
+        if base_model and multi_models:
+            raise ValueError('⚠ ERROR: can only enter base_model or multi_models')
+        elif base_model and model_type != 'KMedoids':
+            if (changing_pam_init or changing_pam_metric):
+                raise ValueError('⚠ ERROR: can only test different inits or metrics on KMedoids/PAM models')
+            if changing_k == False:
+                raise ValueError('⚠ ERROR: need to enter changing_k=True or set k_vals to test KMeans model')
+        elif base_model and model_type == 'KMedoids' and (changing_k or changing_pam_metric or changing_pam_init) == False:
+            raise ValueError('⚠ ERROR: need to enter at least one changing factor (k, metric, or init) for KMedoids/PAM model')
+        elif multi_models and (changing_k or changing_pam_metric or changing_pam_init):
+            raise ValueError('⚠ ERROR: can only score different models when multi_models entered and not changing factors')
+        raise ValueError('⚠ ERROR: Check if parameter values are entered correctly')
+
+    # fit + score every combination once (parallel)
+    started = time.perf_counter()
+    results = run_grid(models, scaled_df, n_jobs=n_jobs)
+    print(f'Scored {len(models)} combinations in {time.perf_counter() - started:.2f}s')
+
+    # set up score result
+    scores_df = pd.DataFrame(results).set_index('Model')
+    wall_time = scores_df['wall_time']
+    scores_df = scores_df[score_lst]
+    scores_df.columns = score_names
+    scores_df.attrs['wall_time'] = wall_time
+
+    return scores_df
@@ -0,0 +1,107 @@
+# ----------------------------------------
+# Percentile ranks for segment_analysis.ipynb
+#   - same values as scipy.stats.percentileofscore(kind='rank') for every row/column
+#     in one sort + searchsorted pass per column (O(n log n) instead of O(n²))
+#   - recency (lower = better) inverted as 100 - pct
+#   - per segment p25/median/p75 with one vectorised groupby quantile
+#   - optional SQL version (rfm_percentiles() in db/01_schema.sql)
+# ----------------------------------------
+
+# imports
+import numpy as np, pandas as pd
+from typing import Iterable, Optional, Sequence
+
+# columns where a lower value is better
+lower_better_cols = ('recency',)
+
+# summary quantiles --> column suffix
+summary_quantiles = {0.25: 'p25', 0.5: 'median', 0.75: 'p75'}
+
+
+# -------------------------- percentile ranks --------------------------
+def rank_percentiles(reference, values=None, higher_better: bool = True) -> np.ndarray:
+    '''
+    percentile rank (0-100) of each value within reference, matching
+    percentileofscore(reference, value, kind='rank'):
+        (count below + count at or below + [any equal]) * 50 / n
+
+    Parameters
+    ----------
+    reference: distribution to rank against (ex. rfm_df['monetary'])
+    values: values to rank (default: reference itself --> every customer)
+    higher_better: False --> 100 - pct (ex. recency)
+    '''
+    reference = np.asarray(reference, dtype=np.float64)
+    ref = np.sort(reference)
+    vals = reference if values is None else np.asarray(values, dtype=np.float64)
+
+    left = np.searchsorted(ref, vals, side='left')
+    right = np.searchsorted(ref, vals, side='right')
+    pct = (left + right + (right > left)) * (50.0 / len(ref))
+    return pct if higher_better else 100 - pct
+
+
+def add_percentiles(
+    reference: pd.DataFrame,
+    cols: Sequence[str],
+    values: Optional[pd.DataFrame] = None,
+    decimal_no_pct: bool = False,
+    lower_better: Iterable[str] = lower_better_cols
+) -> pd.DataFrame:
+    '''
+    copy of values (default: reference) with a {col}_pct column per col
+
+    Parameters
+    ----------
+    reference: dataframe holding the full distribution (ex. rfm_df)
+    cols: columns to rank (ex. ['recency', 'frequency', 'monetary'])
+    values: optional rows to rank against reference (ex. medoids_df)
+    decimal_no_pct: return 0-1 instead of 0-100
+    lower_better: columns inverted so higher pct = better
+    '''
+    out = (reference if values is None else values).copy()
+    scale = 100 if decimal_no_pct else 1
+    for col in cols:
+        out[f'{col}_pct'] = rank_percentiles(
+            reference[col],
+            None if values is None else values[col],
+            higher_better=col not in lower_better
+        ) / scale
+    return out
+
+
+# -------------------------- segment summary --------------------------
+def segment_percentile_summary(
+    pct_df: pd.DataFrame,
+    cols: Sequence[str],
+    by: str = 'segment',
+    quantiles: dict = summary_quantiles
+) -> pd.DataFrame:
+    '''
+    per segment quantiles of each {col}_pct column (one groupby quantile call)
+    columns: {col}_p25, {col}_median, {col}_p75 in cols order
+    '''
+    pct_cols = [f'{col}_pct' for col in cols]
+    summary = pct_df.groupby(by)[pct_cols].quantile(list(quantiles)).unstack()
+    summary.columns = [f'{col[:-len("_pct")]}_{quantiles[q]}' for col, q in summary.columns]
+    return summary
+
+
+# -------------------------- sql version --------------------------
+def sql_percentiles(conn, end_date) -> pd.DataFrame:
+    '''
+    same percentile ranks computed in postgres from customer_rfm_agg (rfm_percentiles())
+    returns dataframe indexed by customer_id with recency_pct, frequency_pct, monetary_pct
+    '''
+    with conn.cursor() as cur:
+        cur.execute(
+            '''
+            SELECT customer_id, recency_pct, frequency_pct, monetary_pct
+            FROM rfm_percentiles(%s)
+            ORDER BY customer_id
+            ''', (end_date,)
+        )
+        rows = cur.fetchall()
+    return pd.DataFrame(
+        rows, columns=['customer_id', 'recency_pct', 'frequency_pct', 'monetary_pct']
+    ).set_index('customer_id')
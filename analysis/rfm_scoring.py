@@ -0,0 +1,186 @@
+# ----------------------------------------
+# Headless RFM scoring:
+#   - persists fitted medoids, RobustScaler params and segment labels to the db
+#   - scores every customer against the stored medoids (no refit)
+#       sqrt/log1p transforms --> robust scaling --> nearest medoid, O(n·k)
+# ----------------------------------------
+
+# imports
+import numpy as np, pandas as pd
+from typing import Dict, Optional
+
+# rfm column order used by the model (same as rfm_modeling.ipynb)
+rfm_cols = ['recency', 'frequency', 'monetary']
+
+# rows scored per chunk when computing distances (keeps n·k·3 temporaries small)
+score_chunk_rows = 1_000_000
+
+
+# -------------------------- transforms --------------------------
+def transform_rfm(rfm: np.ndarray) -> np.ndarray:
+    '''
+    apply rfm_modeling.ipynb transforms to raw [recency, frequency, monetary] columns
+    - recency: -sqrt (sign flipped so higher = better)
+    - frequency, monetary: log1p
+    '''
+    rfm = np.asarray(rfm, dtype=np.float64)
+    return np.column_stack([
+        -np.sqrt(rfm[:, 0]),
+        np.log1p(rfm[:, 1]),
+        np.log1p(rfm[:, 2])
+    ])
+
+
+def pairwise_to_medoids(x: np.ndarray, medoids: np.ndarray, metric: str = 'euclidean') -> np.ndarray:
+    '''
+    distances (n, k) between scaled rows and medoids
+    '''
+    if metric == 'euclidean':
+        return np.sqrt(((x[:, None, :] - medoids[None, :, :]) ** 2).sum(axis=2))
+    if metric == 'manhattan':
+        return np.abs(x[:, None, :] - medoids[None, :, :]).sum(axis=2)
+    if metric == 'cosine':
+        x_norm = x / np.linalg.norm(x, axis=1, keepdims=True).clip(min=1e-12)
+        m_norm = medoids / np.linalg.norm(medoids, axis=1, keepdims=True).clip(min=1e-12)
+        return 1 - x_norm @ m_norm.T
+    raise ValueError(f'⚠ VALUE ERROR: metric "{metric}" must be one of: euclidean, manhattan, cosine')
+
+
+# -------------------------- model storage --------------------------
+def save_model(conn, model, scaler, label_map: Dict[int, str]) -> int:
+    '''
+    store fitted KMedoids medoids, RobustScaler params and cluster --> label map,
+    mark it as the active scoring model and return its model_id
+    (not committed here--the caller's `with psycopg2.connect(...)` block commits)
+
+    Parameters
+    ----------
+    conn: psycopg2 connection to order_mgmt
+    model: fitted KMedoids model (fit on the scaled rfm data)
+    scaler: fitted RobustScaler used to scale the transformed rfm data
+    label_map: cluster number --> segment label (ex. {0: 'Hibernating', ...})
+    '''
+    medoids = np.asarray(model.cluster_centers_, dtype=np.float64)
+
+    with conn.cursor() as cur:
+        # make sure labels exist
+        cur.execute(
+            '''
+            INSERT INTO rfm_segment_def (label)
+            SELECT unnest(%s::text[])
+            ON CONFLICT DO NOTHING
+            ''', (list(label_map.values()),)
+        )
+
+        # one active model at a time
+        cur.execute('UPDATE rfm_model SET is_active = false WHERE is_active')
+        cur.execute(
+            '''
+            INSERT INTO rfm_model (metric, scaler_center, scaler_scale)
+            VALUES (%s, %s, %s)
+            RETURNING model_id
+            ''', (model.metric, scaler.center_.tolist(), scaler.scale_.tolist())
+        )
+        model_id = cur.fetchone()[0]
+
+        # medoids with their segment, one statement (centers flattened, sliced back per cluster)
+        n_clusters, n_dims = medoids.shape
+        cur.execute(
+            '''
+            INSERT INTO rfm_model_medoid (model_id, cluster_no, segment_id, center)
+            SELECT  %(model_id)s, m.cluster_no, s.segment_id,
+                    (%(centers)s::float8[])[m.cluster_no * %(n_dims)s + 1 : (m.cluster_no + 1) * %(n_dims)s]
+            FROM unnest(%(cluster_nos)s::int[], %(labels)s::text[]) AS m (cluster_no, label)
+            JOIN rfm_segment_def s USING (label)
+            ''', {
+                'model_id': model_id,
+                'centers': medoids.ravel().tolist(),
+                'n_dims': n_dims,
+                'cluster_nos': list(range(n_clusters)),
+                'labels': [label_map[i] for i in range(n_clusters)]
+            }
+        )
+    return model_id
+
+
+def load_model(conn, model_id: Optional[int] = None) -> dict:
+    '''
+    load a stored scoring model (active one by default)
+    returns dict with model_id, metric, center, scale, medoids (k, 3) and labels (k,)
+    '''
+    with conn.cursor() as cur:
+        cur.execute(
+            '''
+            SELECT model_id, metric, scaler_center, scaler_scale
+            FROM rfm_model
+            WHERE model_id = %s OR (%s IS NULL AND is_active)
+            ORDER BY model_id DESC
+            LIMIT 1
+            ''', (model_id, model_id)
+        )
+        row = cur.fetchone()
+        if row is None:
+            raise LookupError('⚠ ERROR: no stored rfm model--run save_model() from segment_analysis.ipynb first')
+        model_id, metric, center, scale = row
+
+        cur.execute(
+            '''
+            SELECT m.center, s.label
+            FROM rfm_model_medoid m
+            JOIN rfm_segment_def s USING (segment_id)
+            WHERE m.model_id = %s
+            ORDER BY m.cluster_no
+            ''', (model_id,)
+        )
+        medoids, labels = zip(*cur.fetchall())
+
+    return {
+        'model_id': model_id,
+        'metric': metric,
+        'center': np.asarray(center, dtype=np.float64),
+        'scale': np.asarray(scale, dtype=np.float64),
+        'medoids': np.asarray(medoids, dtype=np.float64),
+        'labels': np.asarray(labels, dtype=object)
+    }
+
+
+# -------------------------- scoring --------------------------
+def assign_segments(rfm: np.ndarray, model: dict) -> np.ndarray:
+    '''
+    label raw [recency, frequency, monetary] rows with the nearest stored medoid's segment
+    (vectorised, chunked so memory stays bounded for large customer bases)
+    '''
+    rfm = np.asarray(rfm, dtype=np.float64)
+    cluster_no = np.empty(len(rfm), dtype=np.int64)
+
+    for start in range(0, len(rfm), score_chunk_rows):
+        chunk = rfm[start:start + score_chunk_rows]
+        scaled = (transform_rfm(chunk) - model['center']) / model['scale']
+        dist = pairwise_to_medoids(scaled, model['medoids'], model['metric'])
+        cluster_no[start:start + len(chunk)] = dist.argmin(axis=1)
+
+    return model['labels'][cluster_no]
+
+
+def score_customers(conn, end_date, model_id: Optional[int] = None) -> pd.DataFrame:
+    '''
+    score every customer from customer_rfm_agg for an analysis end date
+    returns dataframe shaped like data/derived/rfm_labels.csv
+    (customer_id, recency_days, frequency, monetary_amt, label)
+    '''
+    model = load_model(conn, model_id)
+
+    with conn.cursor() as cur:
+        cur.execute(
+            '''
+            SELECT customer_id, recency_days, frequency, monetary_amt::float8
+            FROM rfm_inputs(%s)
+            ORDER BY customer_id
+            ''', (end_date,)
+        )
+        rows = cur.fetchall()
+
+    rfm_df = pd.DataFrame(rows, columns=['customer_id', 'recency_days', 'frequency', 'monetary_amt'])
+    rfm_df['label'] = assign_segments(rfm_df[['recency_days', 'frequency', 'monetary_amt']].to_numpy(), model)
+    rfm_df['monetary_amt'] = rfm_df['monetary_amt'].round(2)
+    return rfm_df
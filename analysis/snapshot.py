@@ -0,0 +1,78 @@
+# ----------------------------------------
+# Reader for the local Parquet snapshot (written by elt/07_snapshot_parquet.py)
+#   - memory mapped, column pruned reads (only requested columns leave the disk)
+#   - hive partition columns (order_year, run_id) usable as filters
+#   - purchases() rebuilds the per order totals rfm_modeling.ipynb pulls from postgres
+# ----------------------------------------
+
+# imports
+import pandas as pd, pyarrow.compute as pc, pyarrow.dataset as ds
+from pyarrow import fs
+from pathlib import Path
+from typing import Optional, Sequence
+
+# snapshot location
+snapshot_dir = Path(__file__).resolve().parents[1] / 'data' / 'snapshot'
+
+# statuses counted as purchases (same as rfm modeling)
+purchase_statuses = ['Shipped', 'Resolved']
+
+
+# -------------------------- tables --------------------------
+def dataset(table: str) -> ds.Dataset:
+    path = snapshot_dir / table
+    if not any(path.rglob('*.parquet')):
+        raise FileNotFoundError(f'⚠ ERROR: no snapshot for {table}--> run elt/07_snapshot_parquet.py first')
+    return ds.dataset(
+        str(path),
+        format='parquet',
+        partitioning='hive',
+        filesystem=fs.LocalFileSystem(use_mmap=True)
+    )
+
+
+def read_table(
+    table: str,
+    columns: Optional[Sequence[str]] = None,
+    filter=None
+) -> pd.DataFrame:
+    '''
+    read one snapshot table into pandas
+
+    Parameters
+    ----------
+    table: orders, order_lines, customers or customer_segments
+    columns: optional subset of columns to read
+    filter: optional pyarrow expression ex) ds.field('order_year') >= 2004
+    '''
+    return dataset(table).to_table(
+        columns=list(columns) if columns else None,
+        filter=filter
+    ).to_pandas()
+
+
+def latest_segments(columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    '''
+    customer_segments rows from the newest scoring run only
+    '''
+    run_ids = dataset('customer_segments').to_table(columns=['run_id']).column('run_id')
+    return read_table('customer_segments', columns, ds.field('run_id') == pc.max(run_ids).as_py())
+
+
+# -------------------------- notebook inputs --------------------------
+def purchases() -> pd.DataFrame:
+    '''
+    one row per shipped/resolved order: order_no, customer_id, order_date, total_sales
+    (same result as the orders/order_lines query in rfm_modeling.ipynb)
+    '''
+    orders = read_table(
+        'orders',
+        ['order_no', 'customer_id', 'order_date'],
+        ds.field('status').isin(purchase_statuses)
+    )
+    sales = (
+        read_table('order_lines', ['order_no', 'sales'])
+        .groupby('order_no', as_index=False)['sales'].sum()
+        .rename(columns={'sales': 'total_sales'})
+    )
+    return orders.merge(sales, on='order_no').sort_values('order_no', ignore_index=True)
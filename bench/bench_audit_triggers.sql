@@ -0,0 +1,100 @@
+/*---------------------------------------------------------
+Benchmark: row level vs statement level audit triggers
+    - 1M row insert, 1M row update, 1M row no-op update on a customers copy
+    - runs in a scratch schema inside one transaction that is rolled back
+
+usage (from bench folder, after bootstrap):
+    psql -d order_mgmt -f bench_audit_triggers.sql
+---------------------------------------------------------*/
+\timing on
+\set rows 1000000
+
+BEGIN;
+
+CREATE SCHEMA bench_audit;
+SET LOCAL search_path = bench_audit, public;
+
+/*--scratch tables (no serial defaults so public sequences are untouched)-----------------------------------------------------*/
+CREATE TABLE customers (LIKE public.customers);
+ALTER TABLE customers ADD PRIMARY KEY (customer_id);
+CREATE TABLE customers_audit (LIKE public.customers_audit);
+CREATE SEQUENCE customers_audit_seq;
+ALTER TABLE customers_audit ALTER COLUMN audit_id SET DEFAULT nextval('customers_audit_seq');
+ALTER TABLE customers_audit ALTER COLUMN changed_at SET DEFAULT now();
+
+/*--old per record audit function (as shipped before statement level triggers)-----------------------------------------------------*/
+CREATE FUNCTION audit_customers_row()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+        AND NEW IS NOT DISTINCT FROM OLD THEN
+        RETURN NEW;
+    END IF;
+
+    INSERT INTO customers_audit (
+        customer_id, operation, changed_by,
+        company_name, contact_last_name, contact_first_name, phone, phone_valid
+    )
+    VALUES (
+        COALESCE(NEW.customer_id, OLD.customer_id),
+        CASE TG_OP WHEN 'INSERT' THEN 'I' WHEN 'UPDATE' THEN 'U' ELSE 'D' END,
+        current_user,
+        CASE WHEN TG_OP = 'DELETE' THEN OLD.company_name       ELSE NEW.company_name END,
+        CASE WHEN TG_OP = 'DELETE' THEN OLD.contact_last_name  ELSE NEW.contact_last_name END,
+        CASE WHEN TG_OP = 'DELETE' THEN OLD.contact_first_name ELSE NEW.contact_first_name END,
+        CASE WHEN TG_OP = 'DELETE' THEN OLD.phone              ELSE NEW.phone END,
+        CASE WHEN TG_OP = 'DELETE' THEN OLD.phone_valid        ELSE NEW.phone_valid END
+    );
+    RETURN CASE WHEN TG_OP = 'DELETE' THEN OLD ELSE NEW END;
+END;
+$$ LANGUAGE plpgsql;
+
+
+/*---------------------------------------------------------
+------------------ BEFORE: FOR EACH ROW -------------------
+---------------------------------------------------------*/
+\echo '---------------- row level: insert / update / no-op update ----------------'
+CREATE TRIGGER trg_bench_row
+AFTER INSERT OR UPDATE OR DELETE ON customers
+FOR EACH ROW EXECUTE FUNCTION audit_customers_row();
+
+INSERT INTO customers (customer_id, company_name, contact_last_name, contact_first_name, phone)
+SELECT g, 'Company ' || g, 'Last ' || g, 'First ' || g, '555' || g
+FROM generate_series(1, :rows) g;
+
+UPDATE customers SET phone_valid = true;
+UPDATE customers SET phone = phone;
+
+SELECT operation, count(*) AS audit_rows FROM customers_audit GROUP BY operation ORDER BY operation;
+
+-- reset
+DROP TRIGGER trg_bench_row ON customers;
+TRUNCATE customers, customers_audit;
+
+
+/*---------------------------------------------------------
+---------------- AFTER: FOR EACH STATEMENT ----------------
+---------------------------------------------------------*/
+\echo '---------------- statement level: insert / update / no-op update ----------------'
+-- audit_customers() resolves customers_audit through search_path --> scratch table
+CREATE TRIGGER trg_bench_stmt_ins
+AFTER INSERT ON customers
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION public.audit_customers();
+
+CREATE TRIGGER trg_bench_stmt_upd
+AFTER UPDATE ON customers
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION public.audit_customers();
+
+INSERT INTO customers (customer_id, company_name, contact_last_name, contact_first_name, phone)
+SELECT g, 'Company ' || g, 'Last ' || g, 'First ' || g, '555' || g
+FROM generate_series(1, :rows) g;
+
+UPDATE customers SET phone_valid = true;
+UPDATE customers SET phone = phone;
+
+-- audit content should match the row level run
+SELECT operation, count(*) AS audit_rows FROM customers_audit GROUP BY operation ORDER BY operation;
+
+ROLLBACK;
@@ -0,0 +1,74 @@
+# -------------------------------------------
+# Benchmark: geocoding client throughput against the local stub
+#   - compares serial baseline (old: requests.get + sleep 0.1) with the
+#     concurrent client at several concurrency levels (and batch sizes)
+#
+# usage: python bench_geocoder.py --n 500 --latency 0.05 --batch-size 1 100
+# -------------------------------------------
+
+# imports
+import argparse, sys, time, requests
+from pathlib import Path
+from geocode_stub import serve
+
+elt_dir = Path(__file__).resolve().parents[1] / 'elt'
+sys.path.insert(0, str(elt_dir))
+from geocoder import GeocodeClient
+
+
+# -------------------------- fake addresses --------------------------
+def make_queries(n) -> list:
+    return [
+        {'address': f'{i} Main Street', 'city': 'Springfield', 'postal': f'{10000 + i % 900}', 'countryCode': 'USA'}
+        for i in range(n)
+    ]
+
+
+# -------------------------- runs --------------------------
+def run_serial(base_url, queries, sleep=0.1) -> float:
+    '''
+    old behaviour: one requests.get per address without a session + fixed sleep
+    '''
+    started = time.perf_counter()
+    for q in queries:
+        requests.get(f'{base_url}/findAddressCandidates', params={'f': 'pjson', **q}, timeout=10).json()
+        time.sleep(sleep)
+    return time.perf_counter() - started
+
+
+def run_client(base_url, queries, concurrency, rate, batch_size=1) -> tuple:
+    client = GeocodeClient(
+        base_url=base_url, base_params={'f': 'pjson'}, batch_params={'f': 'pjson'},
+        concurrency=concurrency, rate=rate, batch_size=batch_size
+    )
+    started = time.perf_counter()
+    found = sum(1 for cand in client.map(queries) if cand)
+    elapsed = time.perf_counter() - started
+    client.close()
+    return elapsed, found, client.stats()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='geocoding client benchmark')
+    parser.add_argument('--n', type=int, default=500, help='addresses to geocode')
+    parser.add_argument('--latency', type=float, default=0.05, help='stub latency per request (s)')
+    parser.add_argument('--throttle', type=float, default=0.0, help='share of 429 responses')
+    parser.add_argument('--rate', type=float, default=None, help='client rate limit (req/s)')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16, 64])
+    parser.add_argument('--batch-size', type=int, nargs='+', default=[1], help='records per request')
+    parser.add_argument('--drop', type=float, default=0.0, help='share of batch records the stub leaves out')
+    parser.add_argument('--url', default=None, help='use an already running server instead of the built in stub')
+    args = parser.parse_args()
+
+    base_url = args.url or serve(latency=args.latency, throttle=args.throttle, drop=args.drop, background=True)[1]
+    queries = make_queries(args.n)
+
+    # serial baseline on a small slice (it is slow by design)
+    n_serial = min(args.n, 50)
+    serial = run_serial(base_url, queries[:n_serial])
+    print(f'serial baseline: {n_serial / serial:8.1f} addr/s')
+
+    for b in args.batch_size:
+        for c in args.concurrency:
+            elapsed, found, stats = run_client(base_url, queries, c, args.rate, b)
+            print(f'batch={b:<5} concurrency={c:<4} {args.n / elapsed:8.1f} addr/s  ({found}/{args.n} found; {stats})')
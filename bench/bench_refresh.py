@@ -0,0 +1,117 @@
+# -------------------------------------------
+# Benchmark: core refresh (02_refresh_core.sql) on a large delta
+#   - scratch database (order_mgmt_e2e, recreated each run) from run_benchmarks.py
+#   - optional base load first (--base-rows) so the refresh runs against filled core tables
+#   - delta = generated extract staged into raw_orders_csv, then the refresh timed statement by statement
+#   - reports seconds per statement, rows each target received and how often delta was scanned
+#     (pg_stat_xact_user_tables, read before the refresh commits --> temp tables still there)
+#
+# usage (from bench folder):
+#   python bench_refresh.py --rows 1000000
+#   python bench_refresh.py --rows 5000000 --base-rows 20000000
+# -------------------------------------------
+
+# imports
+import argparse, importlib, time
+from generate_sales import first_order_no, generate
+from run_benchmarks import bench_data_dir, bench_db, bootstrap
+
+
+# -------------------------- setup --------------------------
+def extract(rows, seed, first_order=first_order_no) -> object:
+    '''
+    generated extract for rows/seed/first order number (reused when already there)
+    '''
+    path = bench_data_dir / f'refresh_{rows}_s{seed}_o{first_order}.csv'
+    if not path.exists():
+        generate(path, rows, seed=seed, first_order=first_order)
+    return path
+
+
+def stage_raw(cur, load_raw, path) -> int:
+    '''
+    copy + merge one extract into raw_orders_csv (no refresh) --> new raw records
+    '''
+    plan = load_raw.plan_file(cur, path, reload=True)
+    new_records = load_raw.load_raw_orders(cur, plan)
+    cur.execute('DROP TABLE IF EXISTS stage')
+    return new_records
+
+
+# -------------------------- timed refresh --------------------------
+def timed_refresh(cur, load_raw, metrics) -> tuple:
+    '''
+    run the refresh statement by statement
+    returns ([(statement, seconds, rows written or None)], delta seq scans)
+    '''
+    cur.execute("SELECT set_config('app.trim_mode', %s, false)", (load_raw.trim_mode,))
+    statements = metrics.split_statements(load_raw.refresh_core_sql.read_text())
+    timings, delta_scans = [], None
+
+    for statement in statements:
+        if metrics.strip_comments(statement).upper().startswith('COMMIT'):
+            # temp tables are dropped at commit --> read their scan counts first
+            cur.execute("SELECT seq_scan FROM pg_stat_xact_user_tables WHERE relname = 'delta'")
+            row = cur.fetchone()
+            delta_scans = row[0] if row else None
+
+        started = time.perf_counter()
+        cur.execute(statement)
+        words = (cur.statusmessage or '').split()
+        rows = int(words[-1]) if words and words[0] in ('INSERT', 'UPDATE', 'DELETE', 'MERGE') else None
+        timings.append((statement, time.perf_counter() - started, rows))
+    return timings, delta_scans
+
+
+# -------------------------- main driver --------------------------
+def main(rows, base_rows=0, seed=0) -> None:
+    run_id = f"bench-refresh-{time.strftime('%Y%m%d-%H%M%S')}"
+    bootstrap(run_id, reset=True)
+
+    # elt modules read etl_target_db at import --> import after bootstrap() set it
+    load_raw = importlib.import_module('03_load_raw')
+    import metrics
+    from common import connect
+
+    with connect() as conn, conn.cursor() as cur:
+        load_raw.load_country_codes_tables(cur)
+
+        # 1) base load: core tables already filled when the measured refresh runs
+        if base_rows:
+            print(f"Base load: {base_rows:,} rows")
+            stage_raw(cur, load_raw, extract(base_rows, seed))
+            load_raw.refresh_core_tables(cur)
+            conn.commit()
+
+        # 2) delta: order numbers past the base load, same seed --> same customers (repeat buyers) get new orders
+        print(f"Delta: {rows:,} rows")
+        new_records = stage_raw(cur, load_raw, extract(rows, seed, first_order_no + base_rows))
+        conn.commit()
+
+        # 3) measured refresh
+        started = time.perf_counter()
+        timings, delta_scans = timed_refresh(cur, load_raw, metrics)
+        seconds = time.perf_counter() - started
+        conn.commit()
+
+    # report
+    print(f"\n{'seconds':>9} {'rows':>12}  statement")
+    for statement, step_seconds, step_rows in timings:
+        summary = ' '.join(metrics.strip_comments(statement).split())[:60]
+        print(f"{step_seconds:>9.2f} {'' if step_rows is None else f'{step_rows:,}':>12}  {summary}")
+
+    print(f"\nTargets:")
+    for table, table_rows in metrics.rows_by_table([(s, r) for s, _, r in timings]).items():
+        print(f"\t{table}: {table_rows:,} rows")
+    print(f"\n☑ Refresh of {new_records:,} delta rows in {seconds:.1f}s "
+          f"({new_records / max(seconds, 1e-9):,.0f} rows/s, delta scanned {delta_scans if delta_scans is not None else '?'} times) on {bench_db}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='core refresh benchmark on a large delta')
+    parser.add_argument('--rows', type=int, default=1_000_000, help='delta rows')
+    parser.add_argument('--base-rows', type=int, default=0, help='rows loaded and refreshed before the delta')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    main(args.rows, args.base_rows, args.seed)
@@ -0,0 +1,336 @@
+# -------------------------------------------
+# Query plan regression harness for the ELT + analytics queries
+#   - creates a scratch database (order_mgmt_bench), applies 01_schema.sql + 04_indexes.sql
+#   - seeds a large synthetic dataset with generate_series
+#   - captures EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) for every query
+#   - compares plan shape (node types, relations, indexes) and runtime with explain_baseline.json
+#     and exits 1 when a plan changes or a query gets slower than the tolerance
+#
+# usage (from bench folder):
+#   python explain_plans.py --update-baseline        # first run / accepted change
+#   python explain_plans.py                          # check against baseline
+#   python explain_plans.py --customers 1000000 --reseed
+# -------------------------------------------
+
+# imports
+import argparse, json, os, sys, psycopg2, psycopg2.sql as sql
+from pathlib import Path
+from dotenv import load_dotenv
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+# paths
+schema_sql = Path('../db/01_schema.sql')
+indexes_sql = Path('../db/04_indexes.sql')
+baseline_path = Path('explain_baseline.json')
+
+# scratch database (never the real one)
+bench_db = 'order_mgmt_bench'
+
+# regression thresholds: slower than baseline * (1 + tolerance) AND by more than min_delta_ms
+tolerance = 0.5
+min_delta_ms = 5.0
+
+# pull credentials from .env
+load_dotenv('../.env')
+admin_dsn = (
+    f"dbname={os.getenv('maintenance_db')} user={os.getenv('super_user')} "
+    f"password={os.getenv('pg_password')} host={os.getenv('host')} port={os.getenv('port')}"
+)
+bench_dsn = admin_dsn.replace(f"dbname={os.getenv('maintenance_db')}", f'dbname={bench_db}', 1)
+
+
+# -------------------------- synthetic data --------------------------
+# triggers (audit, updated_at, fk checks) off while seeding --> session_replication_role = replica
+seed_sql = '''
+SET session_replication_role = replica;
+
+INSERT INTO iso_country_codes (alpha3, alpha2, name)
+VALUES ('USA', 'US', 'United States'), ('SWE', 'SE', 'Sweden'),
+       ('FRA', 'FR', 'France'), ('GBR', 'GB', 'United Kingdom')
+ON CONFLICT DO NOTHING;
+
+INSERT INTO products (product_code, product_line, msrp)
+SELECT 'S' || g, (ARRAY['Classic Cars', 'Motorcycles', 'Planes', 'Ships'])[1 + g %% 4], 50 + g %% 150
+FROM generate_series(1, 200) g;
+
+-- 1 in 50 customers still needs phone validation
+INSERT INTO customers (customer_id, company_name, contact_last_name, contact_first_name, phone, phone_valid)
+SELECT g, 'Bench Co ' || g, 'Last ' || g, 'First ' || g, '555' || lpad(g::text, 7, '0'),
+       CASE WHEN g %% 50 = 0 THEN NULL ELSE true END
+FROM generate_series(1, %(customers)s) g;
+
+-- 1 in 20 addresses still needs geocoding
+INSERT INTO addresses (address_id, customer_id, st_addr, city, postal_code, country_code, score)
+SELECT g, g, g || ' Main Street', 'City ' || g %% 500, lpad((g %% 99999)::text, 5, '0'),
+       (ARRAY['USA', 'SWE', 'FRA', 'GBR'])[1 + g %% 4],
+       CASE WHEN g %% 20 = 0 THEN NULL ELSE 95 END
+FROM generate_series(1, %(customers)s) g;
+
+INSERT INTO orders (order_no, customer_id, ship_addr_id, order_date, status, deal_size)
+SELECT g, c, c, DATE '2003-01-01' + g %% 900,
+       (ARRAY['Shipped', 'Shipped', 'Shipped', 'Resolved', 'Cancelled', 'On Hold'])[1 + g %% 6],
+       (ARRAY['Small', 'Medium', 'Large'])[1 + g %% 3]
+FROM generate_series(1, %(customers)s * %(orders_per_customer)s) g,
+     LATERAL (SELECT 1 + (g::bigint * 7919) %% %(customers)s AS c) x;
+
+INSERT INTO order_lines (order_no, line_no, product_code, quantity, price_each, sales)
+SELECT o, l, 'S' || (1 + (o + l) %% 200), 1 + (o + l) %% 40, 75, 75 * (1 + (o + l) %% 40)
+FROM generate_series(1, %(customers)s * %(orders_per_customer)s) o,
+     generate_series(1, %(lines_per_order)s) l;
+
+INSERT INTO customer_rfm_agg (customer_id, first_order_date, last_order_date, order_count, total_sales)
+SELECT o.customer_id, MIN(o.order_date), MAX(o.order_date), COUNT(DISTINCT o.order_no), SUM(ol.sales)
+FROM orders o
+JOIN order_lines ol USING (order_no)
+WHERE o.status IN ('Shipped', 'Resolved')
+GROUP BY o.customer_id;
+
+INSERT INTO rfm_segment_def (label)
+VALUES ('Champion'), ('Potential Loyalist'), ('Hibernating')
+ON CONFLICT DO NOTHING;
+
+INSERT INTO rfm_run (start_date, end_date) VALUES ('2003-01-01', '2005-12-31');
+
+INSERT INTO customer_segments (customer_id, segment_id, run_id, recency_days, frequency, monetary_amt)
+SELECT a.customer_id, 1 + a.customer_id %% 3, (SELECT MAX(run_id) FROM rfm_run),
+       DATE '2005-12-31' - a.last_order_date, a.order_count, LEAST(a.total_sales, 99999999)
+FROM customer_rfm_agg a;
+
+SET session_replication_role = DEFAULT;
+ANALYZE;
+'''
+
+# -------------------------- queries under test --------------------------
+# name --> (sql, params); data modifying statements are rolled back after EXPLAIN ANALYZE
+queries = {
+    # 04_transform_raw.py
+    'phone_pending': ('''
+        SELECT  c.customer_id, c.phone, c.phone_valid, ic.alpha2
+        FROM customers c
+        JOIN addresses a ON c.customer_id = a.customer_id
+        JOIN iso_country_codes ic ON a.country_code = ic.alpha3
+        WHERE c.customer_id > %s
+            AND c.phone_valid IS NULL
+        ORDER BY c.customer_id
+    ''', (0,)),
+    'geocode_pending': ('''
+        SELECT  address_id, customer_id, st_addr, sub_addr, city, region,
+                postal_code, country_code, score
+        FROM addresses
+        WHERE address_id > %s
+            AND score IS NULL
+        ORDER BY address_id
+    ''', (0,)),
+    'address_corrections': (r'''
+        WITH matches AS (
+            SELECT  DISTINCT ON (a.address_id)
+                    a.address_id, r.pattern, r.canonical_street, r.city
+            FROM address_correction_rules r
+            JOIN addresses a
+                ON a.country_code = r.country_code
+                AND f_street_key(a.st_addr) %% r.match_key
+            WHERE a.address_id > %s
+                AND similarity(f_street_key(a.st_addr), r.match_key) > r.threshold
+                AND a.st_addr ~* r.pattern
+            ORDER BY a.address_id, similarity(f_street_key(a.st_addr), r.match_key) DESC
+        )
+        UPDATE addresses a
+        SET st_addr = regexp_replace(a.st_addr, m.pattern, m.canonical_street, 'i'),
+            city = COALESCE(m.city, a.city)
+        FROM matches m
+        WHERE a.address_id = m.address_id
+    ''', (0,)),
+
+    # 02_refresh_core.sql lookups
+    'customer_by_company': ('''
+        SELECT  c.customer_id
+        FROM unnest(%s::text[]) AS d(customername)
+        JOIN customers c ON d.customername = c.company_name
+    ''', ([f'Bench Co {i}' for i in range(1, 5001, 7)],)),
+    'addresses_by_customer': ('''
+        SELECT  a.address_id, a.country_code
+        FROM unnest(%s::bigint[]) AS d(customer_id)
+        JOIN addresses a USING (customer_id)
+    ''', (list(range(1, 5001, 7)),)),
+
+    # analytics
+    'rfm_purchases': ('''
+        SELECT  o.order_no, o.customer_id, o.order_date, SUM(ol.sales) AS total_sales
+        FROM orders o
+        JOIN order_lines ol USING (order_no)
+        WHERE o.status IN ('Shipped', 'Resolved')
+        GROUP BY o.order_no, o.customer_id, o.order_date
+        ORDER BY o.order_no
+    ''', None),
+    'rfm_inputs': ('SELECT * FROM rfm_inputs(%s)', ('2005-12-31',)),
+    'customer_orders': ('''
+        SELECT  order_no, order_date, status
+        FROM orders
+        WHERE customer_id = %s
+    ''', (42,)),
+    'customer_purchase_dates': ('''
+        SELECT  MIN(order_date), MAX(order_date), COUNT(*)
+        FROM orders
+        WHERE customer_id = %s
+            AND status IN ('Shipped', 'Resolved')
+    ''', (42,)),
+    'segment_summary': ('''
+        SELECT  d.label, COUNT(*), AVG(cs.monetary_amt)
+        FROM customer_segments cs
+        JOIN rfm_segment_def d USING (segment_id)
+        GROUP BY d.label
+    ''', None),
+}
+
+
+# -------------------------- setup --------------------------
+def create_db():
+    conn = psycopg2.connect(admin_dsn)
+    conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(sql.SQL('CREATE DATABASE {}').format(sql.Identifier(bench_db)))
+        print(f'☑ Created database: {bench_db}')
+    except psycopg2.errors.DuplicateDatabase:
+        pass
+    finally:
+        conn.close()
+
+
+def prepare(conn, customers, orders_per_customer, lines_per_order, reseed=False, with_indexes=True):
+    '''
+    apply schema (+ indexes) and seed synthetic rows if the bench db is empty
+    '''
+    with conn.cursor() as cur:
+        cur.execute(schema_sql.read_text())
+        if reseed:
+            cur.execute('''
+                TRUNCATE customer_segments, rfm_run, customer_rfm_agg, order_lines, orders,
+                         addresses, customers, products, customers_audit, addresses_audit,
+                         customer_segments_audit CASCADE
+            ''')
+        cur.execute('SELECT COUNT(*) FROM customers')
+        if cur.fetchone()[0] == 0:
+            print(f'Seeding {customers:,} customers / {customers * orders_per_customer:,} orders....')
+            cur.execute(seed_sql, {
+                'customers': customers,
+                'orders_per_customer': orders_per_customer,
+                'lines_per_order': lines_per_order
+            })
+
+        # indexes on/off (off --> compare plans without 04_indexes.sql)
+        if with_indexes:
+            cur.execute(indexes_sql.read_text())
+        else:
+            cur.execute('''
+                SELECT indexname FROM pg_indexes
+                WHERE schemaname = current_schema() AND indexname IN (
+                    'idx_customers_phone_pending',
+                    'idx_addresses_country', 'idx_addresses_street_key_trgm',
+                    'idx_addresses_geocode_pending',
+                    'idx_orders_customer', 'idx_orders_purchases_cover', 'idx_customer_segments_segment'
+                )
+            ''')
+            for (name,) in cur.fetchall():
+                cur.execute(sql.SQL('DROP INDEX {}').format(sql.Identifier(name)))
+            cur.execute('ANALYZE')
+    conn.commit()
+
+
+# -------------------------- plans --------------------------
+def plan_shape(node) -> list:
+    '''
+    pre-order list of "Node Type [on relation] [using index]" (the part of a plan that should not drift)
+    '''
+    label = node['Node Type']
+    if 'Relation Name' in node:
+        label += f" on {node['Relation Name']}"
+    if 'Index Name' in node:
+        label += f" using {node['Index Name']}"
+    shape = [label]
+    for child in node.get('Plans', []):
+        shape += plan_shape(child)
+    return shape
+
+
+def explain(conn, query, params, repeat=3) -> dict:
+    '''
+    EXPLAIN (ANALYZE, BUFFERS) a query `repeat` times (rolled back each time),
+    returns shape, best execution time and shared buffer hits/reads of that run
+    '''
+    best = None
+    for _ in range(repeat):
+        with conn.cursor() as cur:
+            cur.execute(f'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query}', params)
+            result = cur.fetchone()[0][0]
+        conn.rollback()
+
+        if best is None or result['Execution Time'] < best['Execution Time']:
+            best = result
+
+    plan = best['Plan']
+    return {
+        'shape': plan_shape(plan),
+        'ms': round(best['Execution Time'], 3),
+        'shared_hit': plan.get('Shared Hit Blocks', 0),
+        'shared_read': plan.get('Shared Read Blocks', 0)
+    }
+
+
+def compare(results, baseline) -> list:
+    '''
+    list of regression messages (empty --> all good)
+    '''
+    problems = []
+    for name, res in results.items():
+        base = baseline.get(name)
+        if base is None:
+            problems.append(f'{name}: not in baseline (run with --update-baseline to accept)')
+            continue
+        if res['shape'] != base['shape']:
+            problems.append(
+                f"{name}: PLAN CHANGED\n\t\tbaseline: {' > '.join(base['shape'])}\n\t\tnow:      {' > '.join(res['shape'])}"
+            )
+        if res['ms'] > base['ms'] * (1 + tolerance) and res['ms'] - base['ms'] > min_delta_ms:
+            problems.append(f"{name}: SLOWER {base['ms']:.1f} ms --> {res['ms']:.1f} ms")
+    return problems
+
+
+# -------------------------- main driver --------------------------
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='EXPLAIN ANALYZE regression check for ELT/analytics queries')
+    parser.add_argument('--customers', type=int, default=200_000)
+    parser.add_argument('--orders-per-customer', type=int, default=10)
+    parser.add_argument('--lines-per-order', type=int, default=3)
+    parser.add_argument('--reseed', action='store_true', help='truncate and seed again')
+    parser.add_argument('--no-indexes', action='store_true', help='drop 04_indexes.sql indexes (before/after comparison)')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per query (fastest kept)')
+    parser.add_argument('--only', nargs='*', default=None, help='subset of query names')
+    parser.add_argument('--update-baseline', action='store_true', help=f'write results to {baseline_path}')
+    args = parser.parse_args()
+
+    create_db()
+    with psycopg2.connect(bench_dsn) as conn:
+        prepare(conn, args.customers, args.orders_per_customer, args.lines_per_order, args.reseed, not args.no_indexes)
+
+        results = {}
+        for name, (query, params) in queries.items():
+            if args.only and name not in args.only:
+                continue
+            results[name] = res = explain(conn, query, params, args.repeat)
+            print(f"{name:<28} {res['ms']:>10.2f} ms   {res['shape'][0]}")
+
+    if args.update_baseline or not baseline_path.exists():
+        baseline = json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+        baseline.update(results)
+        baseline_path.write_text(json.dumps(baseline, indent=2) + '\n')
+        print(f'☑ Baseline written to {baseline_path}')
+        sys.exit(0)
+
+    problems = compare(results, json.loads(baseline_path.read_text()))
+    if problems:
+        print('\n⚠ REGRESSIONS:')
+        for p in problems:
+            print(f'\t{p}')
+        sys.exit(1)
+    print('\n☑ No plan/runtime regressions')
@@ -0,0 +1,294 @@
+# -------------------------------------------
+# Synthetic raw order extracts at any scale (same 25 column layout as data/raw/sales_data_sample.csv)
+#   - distributions taken from the sample: countries/territories, product lines, statuses,
+#     order lines per order (1-18), quantities, deal sizes, ~30 rows per customer
+#   - dirty values the pipeline cleans today: padded whitespace, malformed phones,
+#     Swedish street variants (mis-encoded/unaccented), USA/UK country aliases
+#   - streamed to disk in chunks (memory flat up to 100M+ rows), optional parallel shards
+#     (one file per shard --> exercises the sharded load in 03_load_raw.py)
+#
+# usage (from bench folder):
+#   python generate_sales.py --rows 1000000 --out ../data/bench/sales_1m.csv
+#   python generate_sales.py --rows 100000000 --shards 16 --out ../data/bench/sales_100m
+# -------------------------------------------
+
+# imports
+import argparse, csv, time, numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from functools import lru_cache
+from pathlib import Path
+
+# -------------------------------------
+# Prepare variables
+# -------------------------------------
+header = [
+    'ORDERNUMBER', 'QUANTITYORDERED', 'PRICEEACH', 'ORDERLINENUMBER', 'SALES', 'ORDERDATE', 'STATUS',
+    'QTR_ID', 'MONTH_ID', 'YEAR_ID', 'PRODUCTLINE', 'MSRP', 'PRODUCTCODE', 'CUSTOMERNAME', 'PHONE',
+    'ADDRESSLINE1', 'ADDRESSLINE2', 'CITY', 'STATE', 'POSTALCODE', 'COUNTRY', 'TERRITORY',
+    'CONTACTLASTNAME', 'CONTACTFIRSTNAME', 'DEALSIZE'
+]
+raw_encoding = 'latin-1'
+
+# sample shape
+rows_per_customer = 30
+first_order_no = 10100
+first_order_date = date(2003, 1, 6)
+span_days = 880                     # ~2.5 years of orders
+
+# status --> share of orders
+statuses = {
+    'Shipped': 0.927, 'Cancelled': 0.021, 'Resolved': 0.017,
+    'On Hold': 0.016, 'In Process': 0.014, 'Disputed': 0.005
+}
+
+# product line --> (share of lines, product code prefixes, msrp range)
+product_lines = {
+    'Classic Cars':     (0.343, ['S18', 'S24', 'S12'], (35, 215)),
+    'Vintage Cars':     (0.215, ['S18', 'S24', 'S50'], (30, 170)),
+    'Motorcycles':      (0.117, ['S10', 'S12', 'S32'], (60, 150)),
+    'Planes':           (0.108, ['S18', 'S24', 'S700', 'S72'], (50, 120)),
+    'Trucks and Buses': (0.107, ['S12', 'S18', 'S32', 'S50'], (60, 140)),
+    'Ships':            (0.083, ['S700', 'S72'], (50, 120)),
+    'Trains':           (0.027, ['S18', 'S32', 'S50'], (55, 105)),
+}
+products_per_line = 16
+
+# country (as written in the extracts) --> (share of customers, territory, [(city, state, postal pattern)], phone patterns)
+#   # --> random digit
+countries = {
+    'USA':          (0.36, 'NA', [('NYC', 'NY', '100##'), ('San Francisco', 'CA', '941##'), ('Boston', 'MA', '021##'),
+                                  ('Philadelphia', 'PA', '191##'), ('Las Vegas', 'NV', '891##')],
+                     ['##########', '(###) ###-####']),
+    'Spain':        (0.12, 'EMEA', [('Madrid', '', '280##'), ('Barcelona', '', '080##'), ('Sevilla', '', '411##')],
+                     ['(91) 555 ## ##', '+34 913 ### ###']),
+    'France':       (0.11, 'EMEA', [('Paris', '', '750##'), ('Reims', '', '51100'), ('Nantes', '', '44000')],
+                     ['##.##.####', '+33 1 ## ## ####', '(1) ##.##.####']),
+    'Australia':    (0.065, 'APAC', [('North Sydney', 'NSW', '20##'), ('Melbourne', 'Victoria', '30##')],
+                     ['02 #### ####', '+61 2 #### ####']),
+    'UK':           (0.05, 'EMEA', [('London', '', 'WX# #FW'), ('Manchester', '', 'EC# #NT')],
+                     ['(171) 555-####']),
+    'Italy':        (0.04, 'EMEA', [('Torino', '', '10100'), ('Bergamo', '', '24100')], ['0##-######']),
+    'Finland':      (0.033, 'EMEA', [('Helsinki', '', '00###'), ('Oulu', '', '90110')], ['90-### ####', '+358 9 #### ###']),
+    'Norway':       (0.03, 'EMEA', [('Oslo', '', 'N 0###'), ('Bergen', '', 'N 5###')], ['+47 22## ####']),
+    'Singapore':    (0.028, 'APAC', [('Singapore', '', '#####')], ['+65 2## ####']),
+    'Canada':       (0.025, 'NA', [('Vancouver', 'BC', 'V3F #K1'), ('Montreal', 'Quebec', 'H1J #C3')], ['(604) 555-####']),
+    'Denmark':      (0.022, 'EMEA', [('Kobenhavn', '', '17##'), ('Aarhus', '', '8200')], ['## ## ####']),
+    'Germany':      (0.022, 'EMEA', [('Munich', '', '806##'), ('Frankfurt', '', '605##')], ['+49 89 ## ## ####']),
+    'Sweden':       (0.02, 'EMEA', [('Lulea', '', 'S-958 ##'), ('Boras', '', 'S-844 ##')], ['0921-## ####']),
+    'Austria':      (0.019, 'EMEA', [('Salzburg', '', '5020'), ('Graz', '', '8010')], ['####-####']),
+    'Japan':        (0.018, 'Japan', [('Minato-ku', 'Tokyo', '106-00##'), ('Osaka', 'Osaka', '530-00##')], ['+81 3 #### ####']),
+    'Belgium':      (0.012, 'EMEA', [('Bruxelles', '', 'B-1###'), ('Charleroi', '', 'B-6000')], ['(02) #### ##']),
+    'Switzerland':  (0.011, 'EMEA', [('Geneve', '', '12##')], ['0897-######']),
+    'Philippines':  (0.009, 'Japan', [('Makati City', '', '1227 MM')], ['+63 2 555 ####']),
+    'Ireland':      (0.006, 'EMEA', [('Dublin', '', '#')], ['+353 1### ####']),
+}
+
+# dirty values (share of customers/rows)
+dirty_phone_share = 0.03            # unparseable phone numbers
+padded_share = 0.02                 # text fields with leading/trailing spaces
+malformed_phones = ['555-CALL-NOW', '12', '+00 000', 'n/a', '(000)']
+
+# Swedish street spellings the address correction rules fold together (as in the sample extracts)
+street_names = ['Main Street', "rue de l'Abbaye", 'Long Airport Avenue', 'Calle Mayor', 'High St.']
+swedish_streets = ['Berguvsv\x84gen', 'Berguvsvagen', 'Berguvsvägen', '?kergatan', 'Akergatan', 'Åkergatan', 'Storgatan']
+
+# names
+company_words = ['Land of Toys', 'Collectables', 'Mini Gifts', 'Auto Imports', 'Classic Models',
+                 'Diecast Co.', 'Souveniers', 'Replicas', 'Gift Depot', 'Scale Models']
+company_suffixes = ['Inc.', 'Ltd', 'Co.', 'GmbH', 'S.A.', 'AB', 'Corp']
+last_names = ['Yu', 'Henriot', 'Da Cunha', 'Young', 'Brown', 'Hirano', 'Frick', 'Saveley', 'Pipps', 'Larsson']
+first_names = ['Kwai', 'Paul', 'Daniel', 'Julie', 'Allen', 'Juri', 'Michael', 'Mary', 'Georg', 'Maria']
+
+# rows per generated chunk (numpy draws per chunk, csv rows streamed)
+chunk_orders = 20_000
+
+
+# -------------------------------------
+# Functions
+# -------------------------------------
+# -------------------------- reference data --------------------------
+def build_products(seed: int) -> list:
+    '''
+    product catalogue: (product_code, product_line, msrp) per product
+    '''
+    rng = np.random.default_rng([seed, 1])
+    products = []
+    for n, (line, (_, prefixes, (lo, hi))) in enumerate(product_lines.items()):
+        for i in range(products_per_line):
+            # unique code per product (same code twice would load as one product)
+            code = f'{prefixes[i % len(prefixes)]}_{1000 + n * 100 + i}'
+            products.append((code, line, int(rng.integers(lo, hi))))
+    return products
+
+
+def product_weights(products: list) -> np.ndarray:
+    weights = np.array([product_lines[line][0] / products_per_line for _, line, _ in products])
+    return weights / weights.sum()
+
+
+def fill(pattern: str, rng) -> str:
+    '''
+    replace each # in pattern with a random digit
+    '''
+    return ''.join(str(rng.integers(10)) if ch == '#' else ch for ch in pattern)
+
+
+@lru_cache(maxsize=200_000)
+def customer(customer_no: int, seed: int) -> tuple:
+    '''
+    fixed attributes of one customer (same every time --> repeat orders share them)
+    (customername, phone, addressline1, addressline2, city, state, postalcode, country, territory, last, first)
+    '''
+    rng = np.random.default_rng([seed, 2, customer_no])
+    names = list(countries)
+    country = names[rng.choice(len(names), p=_country_weights)]
+    _, territory, places, phones = countries[country]
+    city, state, postal = places[rng.integers(len(places))]
+
+    name = f'{company_words[customer_no % len(company_words)]} {customer_no} {company_suffixes[rng.integers(len(company_suffixes))]}'
+    phone = fill(phones[rng.integers(len(phones))], rng)
+    if rng.random() < dirty_phone_share:
+        phone = malformed_phones[rng.integers(len(malformed_phones))]
+
+    number = int(rng.integers(1, 300))
+    if country == 'Sweden':
+        street = f'{swedish_streets[rng.integers(len(swedish_streets))]}  {number}'
+    else:
+        street = f'{number} {street_names[rng.integers(len(street_names))]}'
+    suite = f'Suite {rng.integers(100, 999)}' if rng.random() < 0.1 else ''
+
+    return (
+        name, phone, street, suite, city, state, fill(postal, rng), country, territory,
+        last_names[rng.integers(len(last_names))], first_names[rng.integers(len(first_names))]
+    )
+
+
+_country_weights = np.array([c[0] for c in countries.values()])
+_country_weights = _country_weights / _country_weights.sum()
+
+
+def pad(value: str, rng) -> str:
+    return f'  {value} ' if value and rng.random() < padded_share else value
+
+
+def deal_size(sales: float) -> str:
+    return 'Small' if sales < 3000 else 'Medium' if sales < 7000 else 'Large'
+
+
+# -------------------------- writer --------------------------
+def write_shard(job) -> tuple:
+    '''
+    write rows [first_row, first_row + n_rows) of the dataset to path
+    (shard i of n writes order numbers i, i + n, i + 2n, ... --> no key collides across shards,
+     dates follow the order number --> every shard covers the whole date span)
+    returns (path, rows written, bytes written)
+    '''
+    path, shard, n_shards, first_row, n_rows, total_rows, customers, seed, first_order = job
+    rng = np.random.default_rng([seed, 3, first_row])
+    products = build_products(seed)
+    p_weights = product_weights(products)
+    status_names, status_p = list(statuses), np.array(list(statuses.values()))
+    status_p = status_p / status_p.sum()
+
+    # average 9.5 lines per order --> expected order count sets the date scale
+    total_orders = max(1, int(total_rows / 9.5))
+    order_no = first_order + shard
+
+    written = 0
+    with open(path, 'w', newline='', encoding=raw_encoding) as fh:
+        writer = csv.writer(fh, lineterminator='\n')
+        # every shard is a complete extract (own header)
+        writer.writerow(header)
+
+        while written < n_rows:
+            # one chunk of orders
+            n_lines = rng.integers(1, 19, size=chunk_orders)
+            cust_ids = rng.integers(1, customers + 1, size=chunk_orders)
+            status_idx = rng.choice(len(status_names), size=chunk_orders, p=status_p)
+            line_products = rng.choice(len(products), size=int(n_lines.sum()), p=p_weights)
+            quantities = rng.integers(6, 98, size=len(line_products))
+            price_factor = rng.uniform(0.8, 1.25, size=len(line_products))
+
+            pos = 0
+            for k in range(chunk_orders):
+                if written >= n_rows:
+                    break
+                day = first_order_date + timedelta(days=min(span_days, (order_no - first_order) * span_days // total_orders))
+                (name, phone, street, suite, city, state, postal, country, territory,
+                 last, first) = customer(int(cust_ids[k]), seed)
+                status = status_names[status_idx[k]]
+
+                for line_no in range(1, int(n_lines[k]) + 1):
+                    if written >= n_rows:
+                        break
+                    code, line, msrp = products[line_products[pos]]
+                    qty = int(quantities[pos])
+                    price = min(100.0, round(msrp * float(price_factor[pos]), 2))
+                    sales = round(qty * msrp * float(price_factor[pos]), 2)
+                    pos += 1
+
+                    writer.writerow([
+                        order_no, qty, price, line_no, sales, f'{day.month}/{day.day}/{day.year} 0:00', status,
+                        (day.month - 1) // 3 + 1, day.month, day.year, line, msrp, code,
+                        pad(name, rng), phone, pad(street, rng), suite, pad(city, rng), state, postal,
+                        country, territory, pad(last, rng), first, deal_size(sales)
+                    ])
+                    written += 1
+                order_no += n_shards
+
+    return path, written, path.stat().st_size
+
+
+def generate(out, rows: int, shards: int = 1, customers: int = None, seed: int = 0, first_order: int = first_order_no) -> list:
+    '''
+    write rows synthetic order lines to out (file) or out/sales_NNN.csv (shards > 1)
+    returns [(path, rows, bytes), ...]
+
+    Parameters
+    ----------
+    out: csv file (shards = 1) or directory (shards > 1)
+    rows: total order lines
+    shards: files written in parallel (one process each)
+    customers: distinct customers (default: rows / 30 like the sample)
+    seed: same seed --> same files
+    first_order: first order number (a later extract starts past the last one --> new orders, not duplicates)
+    '''
+    out = Path(out)
+    customers = customers or max(10, rows // rows_per_customer)
+    if shards > 1:
+        out.mkdir(parents=True, exist_ok=True)
+        paths = [out / f'sales_{i:03d}.csv' for i in range(shards)]
+    else:
+        out.parent.mkdir(parents=True, exist_ok=True)
+        paths = [out]
+
+    # contiguous row ranges per shard
+    bounds = np.linspace(0, rows, len(paths) + 1).astype(np.int64)
+    jobs = [
+        (p, i, len(paths), int(lo), int(hi - lo), rows, customers, seed, first_order)
+        for i, (p, lo, hi) in enumerate(zip(paths, bounds[:-1], bounds[1:]))
+    ]
+
+    if len(jobs) == 1:
+        return [write_shard(jobs[0])]
+    with ProcessPoolExecutor(max_workers=len(jobs)) as pool:
+        return list(pool.map(write_shard, jobs))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='write synthetic raw order extracts')
+    parser.add_argument('--rows', type=int, default=1_000_000, help='order lines to write (1k - 100M+)')
+    parser.add_argument('--out', default='../data/bench/sales.csv', help='csv file, or directory with --shards > 1')
+    parser.add_argument('--shards', type=int, default=1, help='files written in parallel')
+    parser.add_argument('--customers', type=int, default=None, help=f'distinct customers (default: rows / {rows_per_customer})')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--first-order', type=int, default=first_order_no, help='first order number')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    results = generate(args.out, args.rows, args.shards, args.customers, args.seed, args.first_order)
+    seconds = time.perf_counter() - started
+    total_rows, total_bytes = sum(r for _, r, _ in results), sum(b for *_, b in results)
+    print(f'☑ {total_rows:,} rows, {total_bytes / 1e6:.1f} MB in {len(results)} file(s) --> {args.out} '
+          f'({seconds:.1f}s, {total_rows / max(seconds, 1e-9):,.0f} rows/s)')
@@ -0,0 +1,144 @@
+# -------------------------------------------
+# Local stub of the ArcGIS geocode server for benchmarks
+#   - GET .../findAddressCandidates --> one candidate echoing the query
+#   - POST .../geocodeAddresses --> one location per record (batch shape)
+#   - simulated latency and throttling (429) to exercise retries
+#   - dropped batch records (--drop) to exercise single request fallback
+#
+# usage: python geocode_stub.py --port 8765 --latency 0.05 --throttle 0.01 --drop 0.01
+#   then: geocode_url=http://127.0.0.1:8765/arcgis/rest/services/World/GeocodeServer
+# -------------------------------------------
+
+# imports
+import argparse, json, random, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+# geocodeAddresses record attribute --> findAddressCandidates query field
+record_fields = {
+    'Address':      'address',
+    'Address2':     'address2',
+    'City':         'city',
+    'Region':       'region',
+    'Postal':       'postal',
+    'CountryCode':  'countryCode'
+}
+
+
+# -------------------------- responses --------------------------
+def make_candidate(fields) -> dict:
+    '''
+    candidate in findAddressCandidates shape built from query fields
+    '''
+    st_addr = fields.get('address', '')
+    return {
+        'address': st_addr,
+        'location': {'x': 0.0, 'y': 0.0},
+        'score': 95 if st_addr else 40,
+        'attributes': {
+            'StAddr':       st_addr,
+            'SubAddr':      fields.get('address2', ''),
+            'City':         fields.get('city', ''),
+            'Region':       fields.get('region', ''),
+            'Postal':       fields.get('postal', ''),
+            'CountryCode':  fields.get('countryCode', ''),
+            'Status':       'M'
+        }
+    }
+
+
+def make_location(record) -> dict:
+    '''
+    geocodeAddresses location for one batch record (unmatched when no address line)
+    '''
+    attrs = record.get('attributes', {})
+    cand = make_candidate({record_fields[k]: v for k, v in attrs.items() if k in record_fields})
+    status = 'M' if cand['score'] >= 80 else 'U'
+    return {
+        'address': cand['address'],
+        'location': cand['location'],
+        'score': cand['score'] if status == 'M' else 0,
+        'attributes': {
+            **cand['attributes'],
+            'ResultID': attrs.get('OBJECTID'),
+            'Status': status,
+            'Score': cand['score'] if status == 'M' else 0
+        }
+    }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # keep-alive like the real service
+    protocol_version = 'HTTP/1.1'
+
+    # set by serve()
+    latency = 0.0
+    throttle = 0.0
+    drop = 0.0
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        fields = {k: v[0] for k, v in parse_qs(url.query).items()}
+        time.sleep(self.latency)
+
+        if random.random() < self.throttle:
+            return self.send_json(429, {'error': {'code': 429, 'message': 'Too many requests'}})
+        if url.path.endswith('/findAddressCandidates'):
+            return self.send_json(200, {'candidates': [make_candidate(fields)]})
+        self.send_json(404, {'error': {'code': 404, 'message': 'Not found'}})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode()
+        fields = {k: v[0] for k, v in parse_qs(body).items()}
+        time.sleep(self.latency)
+
+        if random.random() < self.throttle:
+            return self.send_json(429, {'error': {'code': 429, 'message': 'Too many requests'}})
+        if not url.path.endswith('/geocodeAddresses'):
+            return self.send_json(404, {'error': {'code': 404, 'message': 'Not found'}})
+
+        records = json.loads(fields.get('addresses', '{}')).get('records', [])
+        locations = [make_location(r) for r in records if random.random() >= self.drop]
+        self.send_json(200, {'spatialReference': {'wkid': 4326}, 'locations': locations})
+
+    def log_message(self, *args):
+        pass
+
+
+# -------------------------- server --------------------------
+def serve(port=0, latency=0.0, throttle=0.0, drop=0.0, background=False):
+    '''
+    start stub server; returns (server, base_url)
+    port=0 --> any free port; background=True --> runs in a daemon thread
+    '''
+    handler = type('Handler', (StubHandler,), {'latency': latency, 'throttle': throttle, 'drop': drop})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    base_url = f'http://127.0.0.1:{server.server_address[1]}/arcgis/rest/services/World/GeocodeServer'
+
+    if background:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, base_url
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='local geocode server stub')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds per request')
+    parser.add_argument('--throttle', type=float, default=0.0, help='share of requests answered with 429')
+    parser.add_argument('--drop', type=float, default=0.0, help='share of batch records left out of the answer')
+    args = parser.parse_args()
+
+    server, base_url = serve(args.port, args.latency, args.throttle, args.drop)
+    print(f'☑ Stub geocoder listening: {base_url}')
+    server.serve_forever()
@@ -0,0 +1,231 @@
+# -------------------------------------------
+# End-to-end ELT benchmark on synthetic extracts (generate_sales.py)
+#   - scratch database (order_mgmt_e2e, never the real one) bootstrapped with the elt's own 01_bootstrap_db.py
+#   - stages run with the real elt code: load_raw (COPY + merge + core refresh), phones, geocode (local stub), load_rfm
+#   - each stage in its own process --> peak RSS per stage, not the max of the whole run
+#   - reports rows/s, MB/s, wall seconds and peak memory per stage (--json to keep results for comparison)
+#   - stage/step rows also land in the scratch db's etl_run_metrics under the printed run id
+#
+# usage (from bench folder):
+#   python run_benchmarks.py --rows 100000
+#   python run_benchmarks.py --rows 10000000 --shards 8 --json results_10m.json
+#   python run_benchmarks.py --rows 1000000 --stages load_raw --reset
+# -------------------------------------------
+
+# imports
+import argparse, json, multiprocessing as mp, os, resource, sys, time
+from datetime import datetime
+from pathlib import Path
+from generate_sales import generate
+from geocode_stub import serve
+
+# -------------------------------------
+# Prepare variables
+# -------------------------------------
+elt_dir = Path(__file__).resolve().parents[1] / 'elt'
+bench_data_dir = Path(__file__).resolve().parents[1] / 'data' / 'bench'
+
+# scratch database the elt is pointed at (etl_target_db, read by common.py)
+bench_db = 'order_mgmt_e2e'
+
+# stages in run order
+stage_names = ['load_raw', 'phones', 'geocode', 'load_rfm']
+
+# stub geocoder latency per request (seconds)
+stub_latency = 0.0
+
+
+# -------------------------------------
+# Stage processes
+# -------------------------------------
+def elt_env(run_id, geocode_url=None) -> None:
+    '''
+    point the elt modules at the scratch db/stub (before they're imported --> read at import time)
+    '''
+    os.environ['etl_target_db'] = bench_db
+    os.environ['etl_run_id'] = run_id
+    if geocode_url:
+        os.environ['geocode_url'] = geocode_url
+    if str(elt_dir) not in sys.path:
+        sys.path.insert(0, str(elt_dir))
+
+
+def run_stage(name, source):
+    '''
+    run one elt stage on its own connection --> (rows, bytes_read)
+    '''
+    import importlib
+    import metrics
+    from common import connect
+
+    rows = None
+    with metrics.stage(name) as metric, connect() as conn:
+        if name == 'load_raw':
+            # rows = new raw records (the stage's own row count also has the staging COPY and core inserts)
+            rows = importlib.import_module('03_load_raw').load(conn, source)
+            metric.bytes_read = sum(p.stat().st_size for p in Path(source).parent.glob(Path(source).name))
+        elif name in ('phones', 'geocode'):
+            transform = importlib.import_module('04_transform_raw')
+            try:
+                fn = transform.validate_phones if name == 'phones' else transform.geocode_addresses
+                fn(conn)
+            finally:
+                transform.client.close()
+        elif name == 'load_rfm':
+            load_rfm = importlib.import_module('05_load_rfm')
+            load_rfm.rfm_csv = source
+            load_rfm.load_rfm(conn)
+        conn.commit()
+    return (metric.rows or 0) if rows is None else rows, metric.bytes_read or 0
+
+
+def stage_process(conn, name, source, run_id, geocode_url) -> None:
+    '''
+    child process: run the stage and send (rows, bytes, seconds, peak rss MB) or the error back
+    '''
+    elt_env(run_id, geocode_url)
+    try:
+        started = time.perf_counter()
+        rows, n_bytes = run_stage(name, source)
+        seconds = time.perf_counter() - started
+        # ru_maxrss is kB on linux; children --> sharded COPY workers
+        rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                  resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+        conn.send({'rows': rows, 'bytes': n_bytes, 'seconds': seconds, 'peak_rss_mb': rss / 1024})
+    except BaseException as e:
+        conn.send({'error': repr(e)})
+    finally:
+        conn.close()
+
+
+def measure(name, source, run_id, geocode_url) -> dict:
+    '''
+    run one stage in a fresh (spawned) process --> result dict
+    '''
+    ctx = mp.get_context('spawn')
+    parent_conn, child_conn = ctx.Pipe(duplex=False)
+    proc = ctx.Process(target=stage_process, args=(child_conn, name, str(source), run_id, geocode_url))
+    proc.start()
+    child_conn.close()
+    try:
+        result = parent_conn.recv()
+    except EOFError:
+        result = {'error': f'stage process exited with code {proc.exitcode}'}
+    proc.join()
+    return result
+
+
+# -------------------------------------
+# Scratch database
+# -------------------------------------
+def bootstrap(run_id, reset=False) -> None:
+    '''
+    (re)create the scratch db with the elt's bootstrap script
+    '''
+    elt_env(run_id)
+    import importlib, psycopg2, psycopg2.sql as sql
+
+    boot = importlib.import_module('01_bootstrap_db')
+    if reset:
+        conn = psycopg2.connect(boot.admin_dsn)
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cur:
+                cur.execute(sql.SQL('DROP DATABASE IF EXISTS {} WITH (FORCE)').format(sql.Identifier(bench_db)))
+            print(f'☑ Dropped database: {bench_db}')
+        finally:
+            conn.close()
+    boot.main()
+
+
+def write_rfm_labels(path) -> None:
+    '''
+    labels csv for load_rfm from the loaded orders (quintile on monetary --> 5 labels)
+    '''
+    from common import connect
+
+    query = '''
+        COPY (
+            SELECT o.customer_id,
+                   (max(max(o.order_date)) OVER () - max(o.order_date))::int AS recency_days,
+                   count(DISTINCT o.order_no) AS frequency,
+                   round(sum(l.sales), 2) AS monetary_amt,
+                   (ARRAY['Lost', 'At Risk', 'Regular', 'Loyal', 'Champions'])[ntile(5) OVER (ORDER BY sum(l.sales))] AS label
+            FROM orders o
+            JOIN order_lines l USING (order_no)
+            GROUP BY o.customer_id
+        ) TO STDOUT WITH (FORMAT csv, HEADER true)
+    '''
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with connect() as conn, conn.cursor() as cur, open(path, 'w', encoding='utf-8') as f:
+        cur.copy_expert(query, f)
+
+
+# -------------------------------------
+# Report
+# -------------------------------------
+def report(results: dict) -> None:
+    print(f"\n{'stage':<10} {'rows':>12} {'seconds':>9} {'rows/s':>12} {'MB/s':>8} {'peak MB':>9}")
+    for name, r in results.items():
+        if 'error' in r:
+            print(f"{name:<10} ⚠ ERROR! {r['error']}")
+            continue
+        seconds = max(r['seconds'], 1e-9)
+        print(f"{name:<10} {r['rows']:>12,} {r['seconds']:>9.2f} {r['rows'] / seconds:>12,.0f} "
+              f"{r['bytes'] / 1e6 / seconds:>8.1f} {r['peak_rss_mb']:>9.0f}")
+
+
+# -------------------------- main driver --------------------------
+def main(rows, shards=1, stages=stage_names, reset=False, seed=0, json_path=None) -> bool:
+    run_id = f"bench-{datetime.now():%Y%m%d-%H%M%S}"
+    print(f"Benchmark run {run_id}: {rows:,} rows --> {bench_db}")
+
+    # 1) synthetic extracts (reused when the same size/seed was generated before)
+    out = bench_data_dir / f'sales_{rows}_s{seed}'
+    source = out / 'sales_*.csv' if shards > 1 else out / 'sales.csv'
+    if not list(source.parent.glob(source.name)):
+        started = time.perf_counter()
+        generate(out if shards > 1 else source, rows, shards, seed=seed)
+        print(f"☑ Generated {rows:,} rows in {time.perf_counter() - started:.1f}s --> {source}")
+    else:
+        print(f"☐ Extracts already generated --> reusing {source}")
+
+    # 2) scratch db + stub geocoder
+    bootstrap(run_id, reset)
+    server, geocode_url = serve(latency=stub_latency, background=True)
+
+    # 3) stages, each in its own process
+    results = {}
+    try:
+        for name in stages:
+            stage_source = source
+            if name == 'load_rfm':
+                stage_source = out / 'rfm_labels.csv'
+                write_rfm_labels(stage_source)
+            print(f"\nStage {name}: started")
+            results[name] = measure(name, stage_source, run_id, geocode_url)
+            if 'error' in results[name]:
+                print(f"⚠ ERROR! Stage {name} failed: {results[name]['error']}")
+                break
+            print(f"☑ Stage {name} done in {results[name]['seconds']:.1f}s")
+    finally:
+        server.shutdown()
+
+    report(results)
+    if json_path:
+        Path(json_path).write_text(json.dumps({'run_id': run_id, 'rows': rows, 'shards': shards, 'stages': results}, indent=2))
+        print(f"☑ Results written: {json_path}")
+    return all('error' not in r for r in results.values())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='end-to-end elt benchmark on synthetic extracts')
+    parser.add_argument('--rows', type=int, default=100_000, help='synthetic order lines')
+    parser.add_argument('--shards', type=int, default=1, help='extract files (>1 --> sharded load)')
+    parser.add_argument('--stages', nargs='+', default=stage_names, choices=stage_names)
+    parser.add_argument('--reset', action='store_true', help=f'drop and recreate {bench_db} first')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', dest='json_path', default=None, help='write results to this json file')
+    args = parser.parse_args()
+
+    sys.exit(0 if main(args.rows, args.shards, args.stages, args.reset, args.seed, args.json_path) else 1)
@@ -2,8 +2,12 @@
 -------------------- CREATE TABLES ------------------------
 ---------------------------------------------------------*/
 /*--landing / raw data-----------------------------------------------------*/
+-- partitioned by month of load (created_at) --> vacuum, index size and delta scans follow recent data
+--   - partitions created on demand by ensure_raw_partition() (03_load_raw.py), default partition catches the rest
+--   - old partitions detached/dropped by drop_raw_partitions() once core refresh has processed them
+--   - existing single table dbs: db/05_partition_raw.sql converts them
 CREATE TABLE IF NOT EXISTS raw_orders_csv (
-    raw_id              bigserial PRIMARY KEY,
+    raw_id              bigserial,
     ordernumber         int,
     quantityordered     int,
     priceeach           numeric(10,2),
@@ -29,10 +33,77 @@ CREATE TABLE IF NOT EXISTS raw_orders_csv (
     contactlastname     text,
     contactfirstname    text,
     dealsize            text,
-    created_at          timestamptz DEFAULT now(),
-    UNIQUE (ordernumber, orderlinenumber)
+    created_at          timestamptz NOT NULL DEFAULT now(),
+    PRIMARY KEY (raw_id, created_at)
+) PARTITION BY RANGE (created_at);
+
+-- default partition (only once raw_orders_csv is partitioned, older dbs get it from 05_partition_raw.sql)
+DO $$
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = 'raw_orders_csv'::regclass) = 'p' THEN
+        CREATE TABLE IF NOT EXISTS raw_orders_csv_default PARTITION OF raw_orders_csv DEFAULT;
+    END IF;
+END $$;
+
+-- dedup registry: one row per (ordernumber, orderlinenumber) ever loaded
+--   (a unique index on a partitioned table must include created_at, so dedup can't live there;
+--    kept when partitions are dropped --> old lines are still never reloaded)
+CREATE TABLE IF NOT EXISTS raw_order_keys (
+    ordernumber         int,
+    orderlinenumber     smallint,
+    first_seen          timestamptz DEFAULT now(),
+    PRIMARY KEY (ordernumber, orderlinenumber)
 );
 
+-- monthly partition covering p_ts (created if missing), returns its name
+CREATE OR REPLACE FUNCTION ensure_raw_partition(p_ts timestamptz DEFAULT now())
+RETURNS text AS $$
+DECLARE
+    month_start date := date_trunc('month', p_ts)::date;
+    part_name text := format('raw_orders_csv_p%s', to_char(month_start, 'YYYYMM'));
+BEGIN
+    IF to_regclass(part_name) IS NULL THEN
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF raw_orders_csv FOR VALUES FROM (%L) TO (%L)',
+            part_name, month_start, (month_start + interval '1 month')::date
+        );
+    END IF;
+    RETURN part_name;
+END;
+$$ LANGUAGE plpgsql;
+
+-- retention: detach (p_drop = false) or drop monthly partitions older than p_keep_months
+--   only partitions whose rows core refresh has already processed (raw_id <= core_refresh watermark)
+--   returns names of partitions removed
+CREATE OR REPLACE FUNCTION drop_raw_partitions(p_keep_months int, p_drop boolean DEFAULT true)
+RETURNS SETOF text AS $$
+DECLARE
+    part record;
+    max_raw_id bigint;
+    processed_id bigint := (SELECT last_id FROM etl_watermark WHERE target = 'core_refresh');
+BEGIN
+    FOR part IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'raw_orders_csv'::regclass
+            AND c.relname ~ '^raw_orders_csv_p[0-9]{6}$'
+            AND to_date(right(c.relname, 6), 'YYYYMM')
+                < date_trunc('month', now()) - make_interval(months => p_keep_months)
+        ORDER BY c.relname
+    LOOP
+        EXECUTE format('SELECT MAX(raw_id) FROM %I', part.relname) INTO max_raw_id;
+        CONTINUE WHEN max_raw_id > COALESCE(processed_id, 0);
+
+        EXECUTE format('ALTER TABLE raw_orders_csv DETACH PARTITION %I', part.relname);
+        IF p_drop THEN
+            EXECUTE format('DROP TABLE %I', part.relname);
+        END IF;
+        RETURN NEXT part.relname;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
 -- control table
 CREATE TABLE IF NOT EXISTS etl_watermark (
     target      text PRIMARY KEY,
@@ -40,6 +111,49 @@ CREATE TABLE IF NOT EXISTS etl_watermark (
     updated_at  timestamptz DEFAULT now()
 );------------------------------------------------------------------------
 
+/*--elt instrumentation: one row per stage/sub-step of a run (elt/metrics.py)-----------------------------------------------------*/
+-- step = 'total' --> whole stage; db_ms = time spent waiting on postgres (execute/copy calls)
+CREATE TABLE IF NOT EXISTS etl_run_metrics (
+    metric_id           bigserial PRIMARY KEY,
+    run_id              text NOT NULL,
+    stage               text NOT NULL,              -- ex. load_raw, geocode
+    step                text NOT NULL,              -- ex. total, copy, refresh 07: INSERT INTO orders ...
+    started_at          timestamptz NOT NULL,
+    wall_ms             numeric(14,2),
+    db_ms               numeric(14,2),
+    statements          int,                        -- statements/copies sent
+    rows_affected       bigint,
+    bytes_read          bigint,
+    ok                  boolean DEFAULT true        -- false --> step raised
+);
+
+CREATE INDEX IF NOT EXISTS idx_etl_run_metrics_run ON etl_run_metrics (run_id);
+CREATE INDEX IF NOT EXISTS idx_etl_run_metrics_step ON etl_run_metrics (stage, step, started_at);
+------------------------------------------------------------------------
+
+/*--ingest manifest: raw extract files already loaded by 03_load_raw.py-----------------------------------------------------*/
+-- unchanged file --> skipped, file that only grew --> read from last_offset, anything else --> full reload
+CREATE TABLE IF NOT EXISTS ingest_manifest (
+    source_path         text PRIMARY KEY,           -- absolute path of the extract
+    file_size           bigint NOT NULL,            -- size when last loaded
+    last_offset         bigint NOT NULL,            -- bytes loaded so far (next append starts here)
+    content_hash        char(32) NOT NULL,          -- md5 of the first last_offset bytes
+    rows_loaded         bigint DEFAULT 0,           -- csv rows read from the file (all loads)
+    loaded_at           timestamptz DEFAULT now()
+);------------------------------------------------------------------------
+
+/*--geocode cache: answers keyed by md5 of normalised address query-----------------------------------------------------*/
+CREATE TABLE IF NOT EXISTS geocode_cache (
+    query_hash          char(32) PRIMARY KEY,
+    candidate           jsonb,                      -- best candidate (NULL --> service found no match)
+    created_at          timestamptz DEFAULT now(),  -- when answer fetched (ttl)
+    last_hit_at         timestamptz DEFAULT now(),  -- lru eviction
+    hits                int DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS idx_geocode_cache_last_hit ON geocode_cache (last_hit_at);
+------------------------------------------------------------------------
+
 /*--iso country codes-----------------------------------------------------*/
 CREATE TABLE IF NOT EXISTS iso_country_codes (
     alpha3          char(3)     PRIMARY KEY,
@@ -117,8 +231,22 @@ CREATE TABLE IF NOT EXISTS order_lines (
     quantity            int,
     price_each          numeric(10,2),
     sales               numeric(12,2),
+    line_id             bigserial,                                  -- insert order (incremental readers, late lines included)
     PRIMARY KEY (order_no, line_no)
-); -----------------------------------------------------------------------
+);
+
+-- older dbs: add line_id (existing lines numbered once) and restart the order_lines parquet snapshot,
+--   its watermark held order numbers, not line ids
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = 'order_lines' AND column_name = 'line_id'
+    ) THEN
+        ALTER TABLE order_lines ADD COLUMN line_id bigserial;
+        DELETE FROM etl_watermark WHERE target = 'parquet_order_lines';
+    END IF;
+END $$; -----------------------------------------------------------------------
 
 /*--segmentation tables-----------------------------------------------------*/
 CREATE TABLE IF NOT EXISTS rfm_run (
@@ -148,6 +276,145 @@ CREATE TABLE IF NOT EXISTS customer_segments (
         CHECK (monetary_amt >= 0)
 ); -----------------------------------------------------------------------
 
+/*--segment history: every run's full result, one LIST partition per run_id-----------------------------------------------------*/
+--   - customer_segments holds the current segment (rewritten only where it changed, 03_load_rfm.sql)
+--   - old runs removed with drop_segment_history() --> DROP TABLE per run, no DELETE/vacuum
+CREATE TABLE IF NOT EXISTS customer_segment_history (
+    run_id              bigint NOT NULL REFERENCES rfm_run,
+    customer_id         bigint NOT NULL,
+    segment_id          int,
+    recency_days        int,
+    frequency           int,
+    monetary_amt        numeric(10,2),
+    PRIMARY KEY (run_id, customer_id)
+) PARTITION BY LIST (run_id);
+
+-- partition for one run (created by 03_load_rfm.sql before the run's rows are written)
+CREATE OR REPLACE FUNCTION ensure_segment_history_partition(p_run_id bigint)
+RETURNS text AS $$
+DECLARE
+    part_name text := format('customer_segment_history_r%s', p_run_id);
+BEGIN
+    IF to_regclass(part_name) IS NULL THEN
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF customer_segment_history FOR VALUES IN (%s)',
+            part_name, p_run_id
+        );
+    END IF;
+    RETURN part_name;
+END;
+$$ LANGUAGE plpgsql;
+
+-- retention: drop history partitions of all but the newest p_keep_runs runs
+--   returns names of partitions removed
+CREATE OR REPLACE FUNCTION drop_segment_history(p_keep_runs int)
+RETURNS SETOF text AS $$
+DECLARE
+    part record;
+BEGIN
+    FOR part IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'customer_segment_history'::regclass
+            AND c.relname ~ '^customer_segment_history_r[0-9]+$'
+            AND substring(c.relname FROM '[0-9]+$')::bigint NOT IN (
+                SELECT run_id FROM rfm_run ORDER BY run_id DESC LIMIT p_keep_runs
+            )
+        ORDER BY c.relname
+    LOOP
+        EXECUTE format('DROP TABLE %I', part.relname);
+        RETURN NEXT part.relname;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql; -----------------------------------------------------------------------
+
+
+/*--stored scoring models: scaler params + medoids (scaled space) to label customers without refitting-----------------------------------------------------*/
+CREATE TABLE IF NOT EXISTS rfm_model (
+    model_id            serial PRIMARY KEY,
+    metric              varchar(20) DEFAULT 'euclidean',
+    scaler_center       float8[],           -- RobustScaler.center_ (recency, frequency, monetary)
+    scaler_scale        float8[],           -- RobustScaler.scale_
+    is_active           boolean DEFAULT true,
+    created_at          timestamptz DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS rfm_model_medoid (
+    model_id            int REFERENCES rfm_model(model_id),
+    cluster_no          int,
+    segment_id          int REFERENCES rfm_segment_def(segment_id),
+    center              float8[],           -- medoid after transforms + scaling
+    PRIMARY KEY (model_id, cluster_no)
+); -----------------------------------------------------------------------
+
+/*--rfm aggregates: per customer rfm inputs kept up to date by core refresh (delta only)-----------------------------------------------------*/
+-- only 'Shipped'/'Resolved' orders count (same as rfm modeling)
+CREATE TABLE IF NOT EXISTS customer_rfm_agg (
+    customer_id         bigint PRIMARY KEY REFERENCES customers(customer_id),
+    first_order_date    date,
+    last_order_date     date,
+    order_count         int DEFAULT 0,
+    total_sales         numeric(14,2) DEFAULT 0,
+    updated_at          timestamptz DEFAULT now()
+);
+
+-- rfm inputs for an analysis end date (recency = end date - last order)
+--   - end date on/after the latest aggregated order --> customer_rfm_agg as is (covers all loaded history)
+--   - earlier end date --> same inputs from the purchases placed up to it (aggregates would count later
+--     orders and give negative recency)
+--   - only one branch returns rows (one time filters on the latest aggregated order date)
+CREATE OR REPLACE FUNCTION rfm_inputs(p_end_date date)
+RETURNS TABLE (
+    customer_id     bigint,
+    recency_days    int,
+    frequency       int,
+    monetary_amt    numeric
+) AS $$
+    SELECT  a.customer_id,
+            p_end_date - a.last_order_date,
+            a.order_count,
+            a.total_sales
+    FROM customer_rfm_agg a
+    WHERE a.order_count > 0
+        AND p_end_date >= (SELECT MAX(last_order_date) FROM customer_rfm_agg)
+
+    UNION ALL
+
+    SELECT  o.customer_id,
+            p_end_date - MAX(o.order_date),
+            COUNT(DISTINCT o.order_no)::int,
+            SUM(ol.sales)
+    FROM orders o
+    JOIN order_lines ol USING (order_no)
+    WHERE o.status IN ('Shipped', 'Resolved')
+        AND o.customer_id IS NOT NULL
+        AND o.order_date <= p_end_date
+        AND p_end_date < (SELECT MAX(last_order_date) FROM customer_rfm_agg)
+    GROUP BY o.customer_id
+$$ LANGUAGE sql STABLE; -----------------------------------------------------------------------
+
+-- rank based percentiles per customer (same values as scipy percentileofscore(kind='rank'))
+--   pct = (count below + count at or below + 1) * 50 / n  --> (rank() + count(*) up to peers) * 50 / n
+--   percent_rank() = (rank - 1) / (n - 1) is a different definition, so it is not used here
+--   recency inverted (100 - pct) so higher = more recent
+CREATE OR REPLACE FUNCTION rfm_percentiles(p_end_date date)
+RETURNS TABLE (
+    customer_id     bigint,
+    recency_pct     float8,
+    frequency_pct   float8,
+    monetary_pct    float8
+) AS $$
+    SELECT  customer_id,
+            100 - (rank() OVER w_r + count(*) OVER w_r) * (50.0::float8 / count(*) OVER ()),
+            (rank() OVER w_f + count(*) OVER w_f) * (50.0::float8 / count(*) OVER ()),
+            (rank() OVER w_m + count(*) OVER w_m) * (50.0::float8 / count(*) OVER ())
+    FROM rfm_inputs(p_end_date)
+    WINDOW  w_r AS (ORDER BY recency_days),
+            w_f AS (ORDER BY frequency),
+            w_m AS (ORDER BY monetary_amt)
+$$ LANGUAGE sql STABLE; -----------------------------------------------------------------------
+
 
 /*--audit tables-----------------------------------------------------*/
 CREATE TABLE IF NOT EXISTS customers_audit (
@@ -212,169 +479,252 @@ END;
 $$ LANGUAGE plpgsql;
 
 -- for customers
+DROP TRIGGER IF EXISTS trg_cust_touch_updated ON customers;
 CREATE TRIGGER trg_cust_touch_updated
 BEFORE UPDATE ON customers
 FOR EACH ROW EXECUTE FUNCTION touch_updated_at();
 
 -- for addresses
+DROP TRIGGER IF EXISTS trg_addr_touch_updated ON addresses;
 CREATE TRIGGER trg_addr_touch_updated
 BEFORE UPDATE ON addresses
 FOR EACH ROW EXECUTE FUNCTION touch_updated_at();------------------------------------------------------------------------
 
 
-/*--customers: capture old values for updating/deleting and new for insert-----------------------------------------------------*/
+/*--audit triggers: statement level, one INSERT per statement from transition tables
+    - new_rows/old_rows hold every row the statement touched
+    - updates with no changes (new row IS NOT DISTINCT FROM old row) are skipped
+    - transition tables need one trigger per event, so each table gets three triggers
+-----------------------------------------------------*/
+
+/*--customers: capture old values for deleting and new for insert/update-----------------------------------------------------*/
 CREATE OR REPLACE FUNCTION audit_customers()
 RETURNS trigger AS $$
 BEGIN
-    -- ignore updates with no changes
-    IF TG_OP = 'UPDATE'
-        AND NEW IS NOT DISTINCT FROM OLD THEN
-        RETURN NEW;
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO customers_audit (
+            customer_id, operation, changed_by,
+            company_name, contact_last_name, contact_first_name, phone, phone_valid
+        )
+        SELECT  n.customer_id, 'I', current_user,
+                n.company_name, n.contact_last_name, n.contact_first_name, n.phone, n.phone_valid
+        FROM new_rows n;
+
+    ELSIF TG_OP = 'UPDATE' THEN
+        INSERT INTO customers_audit (
+            customer_id, operation, changed_by,
+            company_name, contact_last_name, contact_first_name, phone, phone_valid
+        )
+        SELECT  n.customer_id, 'U', current_user,
+                n.company_name, n.contact_last_name, n.contact_first_name, n.phone, n.phone_valid
+        FROM new_rows n
+        JOIN old_rows o ON o.customer_id = n.customer_id
+        -- ignore updates with no changes
+        WHERE n IS DISTINCT FROM o;
+
+    ELSE
+        INSERT INTO customers_audit (
+            customer_id, operation, changed_by,
+            company_name, contact_last_name, contact_first_name, phone, phone_valid
+        )
+        SELECT  o.customer_id, 'D', current_user,
+                o.company_name, o.contact_last_name, o.contact_first_name, o.phone, o.phone_valid
+        FROM old_rows o;
     END IF;
 
-    INSERT INTO customers_audit (
-        customer_id,
-        operation,
-        changed_by,
-        company_name,
-        contact_last_name,
-        contact_first_name,
-        phone,
-        phone_valid
-    )
-    
-    VALUES (
-        COALESCE(NEW.customer_id, OLD.customer_id),
-        -- get one character
-        CASE TG_OP
-            WHEN  'INSERT' THEN 'I'
-            WHEN  'UPDATE' THEN 'U'
-            ELSE                'D'
-        END,
-        current_user,
-
-        -- new value for insert and old value for update/delete
-        CASE WHEN TG_OP = 'DELETE' THEN OLD.company_name            ELSE NEW.company_name END,
-        CASE WHEN TG_OP = 'DELETE' THEN OLD.contact_last_name       ELSE NEW.contact_last_name END,
-        CASE WHEN TG_OP = 'DELETE' THEN OLD.contact_first_name      ELSE NEW.contact_first_name END,
-        CASE WHEN TG_OP = 'DELETE' THEN OLD.phone                   ELSE NEW.phone END,
-        CASE WHEN TG_OP = 'DELETE' THEN OLD.phone_valid             ELSE NEW.phone_valid END
-    );
-    -- return correct row depending on IUD (I/U --> return new; D --> return old)
-    RETURN CASE WHEN TG_OP = 'DELETE' THEN OLD ELSE NEW END;
+    RETURN NULL;
 END;
 $$ LANGUAGE plpgsql;
 
--- fire trigger after an audit per record
-CREATE TRIGGER trg_customers_audit
-AFTER INSERT OR UPDATE OR DELETE ON customers
-FOR EACH ROW EXECUTE FUNCTION audit_customers();------------------------------------------------------------------------
+-- fire trigger once per statement (old per record trigger dropped)
+DROP TRIGGER IF EXISTS trg_customers_audit ON customers;
+DROP TRIGGER IF EXISTS trg_customers_audit_ins ON customers;
+DROP TRIGGER IF EXISTS trg_customers_audit_upd ON customers;
+DROP TRIGGER IF EXISTS trg_customers_audit_del ON customers;
 
+CREATE TRIGGER trg_customers_audit_ins
+AFTER INSERT ON customers
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION audit_customers();
 
-/*--addresses: capture old values for updating/deleting and new for insert-----------------------------------------------------*/
+CREATE TRIGGER trg_customers_audit_upd
+AFTER UPDATE ON customers
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION audit_customers();
+
+CREATE TRIGGER trg_customers_audit_del
+AFTER DELETE ON customers
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION audit_customers();------------------------------------------------------------------------
+
+
+/*--addresses: capture old values for deleting and new for insert/update-----------------------------------------------------*/
 CREATE OR REPLACE FUNCTION audit_addresses()
 RETURNS trigger AS $$
 BEGIN
-    -- ignore updates with no changes
-    IF TG_OP = 'UPDATE'
-        AND NEW IS NOT DISTINCT FROM OLD THEN
-        RETURN NEW;
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO addresses_audit (
+            address_id, operation, changed_by,
+            st_addr, sub_addr, city, region, postal_code, country_code, score
+        )
+        SELECT  n.address_id, 'I', current_user,
+                n.st_addr, n.sub_addr, n.city, n.region, n.postal_code, n.country_code, n.score
+        FROM new_rows n;
+
+    ELSIF TG_OP = 'UPDATE' THEN
+        INSERT INTO addresses_audit (
+            address_id, operation, changed_by,
+            st_addr, sub_addr, city, region, postal_code, country_code, score
+        )
+        SELECT  n.address_id, 'U', current_user,
+                n.st_addr, n.sub_addr, n.city, n.region, n.postal_code, n.country_code, n.score
+        FROM new_rows n
+        JOIN old_rows o ON o.address_id = n.address_id
+        -- ignore updates with no changes
+        WHERE n IS DISTINCT FROM o;
+
+    ELSE
+        INSERT INTO addresses_audit (
+            address_id, operation, changed_by,
+            st_addr, sub_addr, city, region, postal_code, country_code, score
+        )
+        SELECT  o.address_id, 'D', current_user,
+                o.st_addr, o.sub_addr, o.city, o.region, o.postal_code, o.country_code, o.score
+        FROM old_rows o;
     END IF;
-    
-    INSERT INTO addresses_audit (
-        address_id,
-        operation, 
-        changed_by, 
-        st_addr, 
-        sub_addr, 
-        city, 
-        region, 
-        postal_code, 
-        country_code,
-        score
-    )
-
-    VALUES (
-        COALESCE(NEW.address_id, OLD.address_id),
-        -- get one character
-        CASE TG_OP
-            WHEN  'INSERT' THEN 'I'
-            WHEN  'UPDATE' THEN 'U'
-            ELSE                'D'
-        END,
-        current_user,
-
-        -- new value for insert and old for update/delete
-        CASE WHEN TG_OP = 'DELETE' THEN OLD.st_addr         ELSE NEW.st_addr END,
-        CASE WHEN TG_OP = 'DELETE' THEN OLD.sub_addr        ELSE NEW.sub_addr END,
-        CASE WHEN TG_OP = 'DELETE' THEN OLD.city            ELSE NEW.city END,
-        CASE WHEN TG_OP = 'DELETE' THEN OLD.region          ELSE NEW.region END,
-        CASE WHEN TG_OP = 'DELETE' THEN OLD.postal_code     ELSE NEW.postal_code END,
-        CASE WHEN TG_OP = 'DELETE' THEN OLD.country_code    ELSE NEW.country_code END,
-        CASE WHEN TG_OP = 'DELETE' THEN OLD.score           ELSE NEW.score END
-    );
-    -- return correct row depending on IUD (I/U --> return new; D --> return old)
-    RETURN CASE WHEN TG_OP = 'DELETE' THEN OLD ELSE NEW END;
+
+    RETURN NULL;
 END;
 $$ LANGUAGE plpgsql; 
 
--- fire trigger after an audit per record
-CREATE TRIGGER trg_addresses_audit
-AFTER INSERT OR UPDATE OR DELETE ON addresses
-FOR EACH ROW EXECUTE FUNCTION audit_addresses();
+-- fire trigger once per statement (old per record trigger dropped)
+DROP TRIGGER IF EXISTS trg_addresses_audit ON addresses;
+DROP TRIGGER IF EXISTS trg_addresses_audit_ins ON addresses;
+DROP TRIGGER IF EXISTS trg_addresses_audit_upd ON addresses;
+DROP TRIGGER IF EXISTS trg_addresses_audit_del ON addresses;
 
+CREATE TRIGGER trg_addresses_audit_ins
+AFTER INSERT ON addresses
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION audit_addresses();
 
-/*--customer_segments: capture old values for updating/deleting and new for insert-----------------------------------------------------*/
+CREATE TRIGGER trg_addresses_audit_upd
+AFTER UPDATE ON addresses
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION audit_addresses();
+
+CREATE TRIGGER trg_addresses_audit_del
+AFTER DELETE ON addresses
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION audit_addresses();
+
+
+/*--customer_segments: capture old values for deleting and new for insert/update-----------------------------------------------------*/
 CREATE OR REPLACE FUNCTION audit_customer_segments()
 RETURNS trigger as $$
 BEGIN
-    -- ignore updates with no changes
-    IF TG_OP = 'UPDATE'
-        AND NEW IS NOT DISTINCT FROM OLD THEN
-        RETURN NEW;
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO customer_segments_audit (
+            customer_id, operation, changed_by,
+            segment_id, run_id, recency_days, frequency, monetary_amt
+        )
+        SELECT  n.customer_id, 'I', current_user,
+                n.segment_id, n.run_id, n.recency_days, n.frequency, n.monetary_amt
+        FROM new_rows n;
+
+    ELSIF TG_OP = 'UPDATE' THEN
+        INSERT INTO customer_segments_audit (
+            customer_id, operation, changed_by,
+            segment_id, run_id, recency_days, frequency, monetary_amt
+        )
+        SELECT  n.customer_id, 'U', current_user,
+                n.segment_id, n.run_id, n.recency_days, n.frequency, n.monetary_amt
+        FROM new_rows n
+        JOIN old_rows o ON o.customer_id = n.customer_id
+        -- ignore updates with no changes
+        WHERE n IS DISTINCT FROM o;
+
+    ELSE
+        INSERT INTO customer_segments_audit (
+            customer_id, operation, changed_by,
+            segment_id, run_id, recency_days, frequency, monetary_amt
+        )
+        SELECT  o.customer_id, 'D', current_user,
+                o.segment_id, o.run_id, o.recency_days, o.frequency, o.monetary_amt
+        FROM old_rows o;
     END IF;
 
-    INSERT INTO customer_segments_audit(
-        customer_id,        
-        operation, 
-        changed_by,
-        segment_id,
-        run_id,
-        recency_days,
-        frequency,
-        monetary_amt
-    )
-
-    VALUES (
-        COALESCE (new.customer_id, OLD.customer_id),
-        -- get one character
-        CASE TG_OP
-            WHEN 'INSERT' THEN 'I'
-            WHEN 'UPDATE' THEN 'U'
-            ELSE               'D'
-        END,
-        current_user,
-
-        -- new value for insert and old value for update/delete
-        CASE WHEN TG_OP = 'DELETE' THEN OLD.segment_id         ELSE NEW.segment_id END,
-        CASE WHEN TG_OP = 'DELETE' THEN OLD.run_id             ELSE NEW.run_id END,
-        CASE WHEN TG_OP = 'DELETE' THEN OLD.recency_days       ELSE NEW.recency_days END,
-        CASE WHEN TG_OP = 'DELETE' THEN OLD.frequency          ELSE NEW.frequency END,
-        CASE WHEN TG_OP = 'DELETE' THEN OLD.monetary_amt       ELSE NEW.monetary_amt END
-    );
-    -- return correct row depending on IUD (I/U --> return new; D --> return old)
-    RETURN CASE WHEN TG_OP = 'DELETE' THEN OLD ELSE NEW END;
+    RETURN NULL;
 END;
 $$ LANGUAGE plpgsql;
 
--- fire trigger after an audit per record
-CREATE TRIGGER trg_cust_seg_audit
-AFTER INSERT OR UPDATE OR DELETE ON customer_segments
-FOR EACH ROW EXECUTE FUNCTION audit_customer_segments(); ------------------------------------------------------------------------
+-- fire trigger once per statement (old per record trigger dropped)
+DROP TRIGGER IF EXISTS trg_cust_seg_audit ON customer_segments;
+DROP TRIGGER IF EXISTS trg_cust_seg_audit_ins ON customer_segments;
+DROP TRIGGER IF EXISTS trg_cust_seg_audit_upd ON customer_segments;
+DROP TRIGGER IF EXISTS trg_cust_seg_audit_del ON customer_segments;
+
+CREATE TRIGGER trg_cust_seg_audit_ins
+AFTER INSERT ON customer_segments
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION audit_customer_segments();
+
+CREATE TRIGGER trg_cust_seg_audit_upd
+AFTER UPDATE ON customer_segments
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION audit_customer_segments();
+
+CREATE TRIGGER trg_cust_seg_audit_del
+AFTER DELETE ON customer_segments
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION audit_customer_segments(); ------------------------------------------------------------------------
 
 
 /*---------------------------------------------------------
 ------------------ CREATE EXTENSIONS ----------------------
 ---------------------------------------------------------*/
 CREATE EXTENSION IF NOT EXISTS unaccent;
-CREATE EXTENSION IF NOT EXISTS pg_trgm;
\ No newline at end of file
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+/*---------------------------------------------------------
+------------------ ADDRESS CORRECTIONS --------------------
+    (after extensions: wrapper needs unaccent)
+---------------------------------------------------------*/
+-- immutable unaccent wrapper: unaccent() is only STABLE so it can't be used in an index expression
+--   (dictionary pinned --> result no longer depends on search_path)
+CREATE OR REPLACE FUNCTION f_unaccent(text)
+RETURNS text AS $$
+    SELECT public.unaccent('public.unaccent'::regdictionary, $1)
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT;
+
+-- street key matched by correction rules: first word of the street, lowercase, no accents
+CREATE OR REPLACE FUNCTION f_street_key(text)
+RETURNS text AS $$
+    SELECT f_unaccent(lower(split_part($1, ' ', 1)))
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT;
+
+-- fuzzy street corrections applied by 04_transform_raw.py (one set based pass for all rules)
+--   address street key similar to match_key (> threshold) and street matching pattern
+--   --> the pattern's match (only) replaced by canonical_street, city set
+CREATE TABLE IF NOT EXISTS address_correction_rules (
+    rule_id             serial PRIMARY KEY,
+    country_code        char(3) NOT NULL,
+    match_key           text NOT NULL,                  -- f_street_key() form of the canonical street
+    pattern             text,                           -- case insensitive regex of the misspelt street token (NULL --> rule skipped)
+    canonical_street    text NOT NULL,
+    city                text,                           -- NULL --> keep city
+    threshold           real NOT NULL DEFAULT 0.5
+        CONSTRAINT chk_threshold
+        CHECK (threshold > 0 AND threshold <= 1),
+    UNIQUE (country_code, match_key)
+);
+
+-- rules table created before pattern existed
+ALTER TABLE address_correction_rules ADD COLUMN IF NOT EXISTS pattern text;
+
+INSERT INTO address_correction_rules (country_code, match_key, pattern, canonical_street, city, threshold)
+VALUES
+    ('SWE', 'berguvsvagen', '^berguvs\S*',   'Berguvsvägen', 'Luleå', 0.6),
+    ('SWE', 'akergatan',    '^[?aå]kerg\S*', 'Åkergatan',   'Borås', 0.5)
+ON CONFLICT (country_code, match_key) DO UPDATE
+    SET pattern = COALESCE(address_correction_rules.pattern, EXCLUDED.pattern); ------------------------------------------------------------------------
@@ -5,108 +5,258 @@ INSERT INTO etl_watermark (target, last_id)
 VALUES 
 ('core_refresh', 0),
 ('addr_geocode', 0),
-('phone_val', 0)
+('phone_val', 0),
+('rfm_agg', 0)
 ON CONFLICT (target) DO NOTHING;
 
-CREATE TEMP TABLE delta AS
-SELECT r.*
-FROM raw_orders_csv r
-JOIN etl_watermark w ON w.target = 'core_refresh'
-WHERE r.raw_id > w.last_id;
+-- one time backfill when rfm aggregates are behind the core tables (ex. table added to an existing db)
+INSERT INTO customer_rfm_agg (customer_id, first_order_date, last_order_date, order_count, total_sales)
+SELECT  o.customer_id,
+        MIN(o.order_date),
+        MAX(o.order_date),
+        COUNT(DISTINCT o.order_no),
+        SUM(ol.sales)
+FROM orders o
+JOIN order_lines ol USING (order_no)
+WHERE o.status IN ('Shipped', 'Resolved')
+    AND o.customer_id IS NOT NULL
+    AND (SELECT last_id FROM etl_watermark WHERE target = 'rfm_agg')
+        < (SELECT last_id FROM etl_watermark WHERE target = 'core_refresh')
+GROUP BY o.customer_id
+ON CONFLICT (customer_id) DO UPDATE
+    SET first_order_date    = EXCLUDED.first_order_date,
+        last_order_date     = EXCLUDED.last_order_date,
+        order_count         = EXCLUDED.order_count,
+        total_sales         = EXCLUDED.total_sales,
+        updated_at          = now();
 
--- strip leading/trailing spaces from every text column
+-- created_at bound on the delta --> raw_orders_csv partitions before it are pruned at run time
+--   - bound = earliest created_at among the rows past the watermark (read from the data, not a time slack:
+--     a long running load that committed after the last refresh still has all of its rows in range)
+--   - computed inside the statement that builds delta (same snapshot --> no row can commit in between)
+--   - min() per partition is an index only scan of the (raw_id, created_at) primary key past last_id
+-- strip leading/trailing spaces from every text column while building delta (one pass)
+--   - set app.trim_mode = 'per_column' to use old path: copy then one UPDATE per text column
 DO $$
 DECLARE 
     col text;
+    select_list text;
 BEGIN
-    FOR col IN
-        SELECT column_name
+    IF current_setting('app.trim_mode', true) = 'per_column' THEN
+        CREATE TEMP TABLE delta ON COMMIT DROP AS
+        SELECT r.*
+        FROM raw_orders_csv r
+        JOIN etl_watermark w ON w.target = 'core_refresh'
+        WHERE r.raw_id > w.last_id
+            AND r.created_at >= (
+                SELECT min(k.created_at)
+                FROM raw_orders_csv k
+                WHERE k.raw_id > (SELECT last_id FROM etl_watermark WHERE target = 'core_refresh')
+            );
+
+        FOR col IN
+            SELECT column_name
+            FROM information_schema.columns
+            WHERE table_name = 'delta'
+                AND data_type = 'text'
+        LOOP
+            EXECUTE format('UPDATE delta SET %I = trim(%I);', col, col);
+        END LOOP;
+    ELSE
+        -- trim(col) for text columns, col as is for the rest
+        SELECT string_agg(
+                CASE WHEN data_type = 'text'
+                    THEN format('trim(r.%I) AS %I', column_name, column_name)
+                    ELSE format('r.%I', column_name)
+                END, ', ' ORDER BY ordinal_position)
+        INTO select_list
         FROM information_schema.columns
-        WHERE table_name = 'delta'
-            AND data_type = 'text'
-    LOOP
-        EXECUTE format('UPDATE delta SET %I = trim(%I);', col, col);
-    END LOOP;
+        WHERE table_schema = current_schema()
+            AND table_name = 'raw_orders_csv';
+
+        EXECUTE format(
+            'CREATE TEMP TABLE delta ON COMMIT DROP AS
+            SELECT %s
+            FROM raw_orders_csv r
+            JOIN etl_watermark w ON w.target = ''core_refresh''
+            WHERE r.raw_id > w.last_id
+                AND r.created_at >= (
+                    SELECT min(k.created_at)
+                    FROM raw_orders_csv k
+                    WHERE k.raw_id > (SELECT last_id FROM etl_watermark WHERE target = ''core_refresh'')
+                )', select_list);
+    END IF;
 END$$;
 
+/* ------------------- Resolve keys once ------------------- */
+-- delta is read three times (order headers, products, order lines); customer/address keys are
+-- resolved once per order into indexed temp tables --> no text key joins against the whole delta
+--   (MERGE would need PostgreSQL 15, so targets are filled with INSERT ... ON CONFLICT as before)
+
+-- pass 1: one header row per order, carries the customer/address columns
+--   header values = the row the old DISTINCT ... ORDER BY order_no, order_date inserted first
+--   (earliest order date, then status/deal size in sort order) --> same orders.deal_size as before
+CREATE TEMP TABLE delta_orders ON COMMIT DROP AS
+SELECT DISTINCT ON (ordernumber)
+    ordernumber, orderdate, status, dealsize,
+    customername, contactlastname, contactfirstname, phone,
+    addressline1, addressline2, city, state, postalcode, country
+FROM delta
+WHERE ordernumber IS NOT NULL
+ORDER BY ordernumber, orderdate, status, dealsize, orderlinenumber;
+
+ANALYZE delta_orders;
+
 /* ------------------- Core tables ------------------- */
 -- customers
 INSERT INTO customers (company_name, contact_last_name, contact_first_name, phone)
-SELECT DISTINCT 
-    customername, 
-    contactlastname, 
-    contactfirstname, 
-    phone 
-FROM delta
+SELECT DISTINCT ON (customername)
+    customername,
+    contactlastname,
+    contactfirstname,
+    phone
+FROM delta_orders
+WHERE customername IS NOT NULL
+ORDER BY customername, ordernumber
 ON CONFLICT DO NOTHING; -- do nothing about rows already loaded
 
+-- company name --> customer_id, resolved once (uc_company_name)
+CREATE TEMP TABLE customer_map ON COMMIT DROP AS
+SELECT c.company_name AS customername, c.customer_id
+FROM customers c
+WHERE c.company_name IN (SELECT customername FROM delta_orders);
+
+CREATE UNIQUE INDEX ON customer_map (customername);
+ANALYZE customer_map;
+
 -- addresses
-WITH address_src AS (
-    SELECT DISTINCT
-        c.customer_id,
-        d.addressline1  AS st_addr,
-        d.addressline2  AS sub_addr,
-        d.city,
-        d.state         AS region,
-        d.postalcode    AS postal_code,
-        -- fall back on alias match
-        COALESCE(ic.alpha3, ia.alpha3) AS country_code       
-    FROM delta d
-    LEFT JOIN iso_country_codes ic ON d.country = ic.name
-    LEFT JOIN iso_country_aliases ia ON d.country = ia.alias
-    LEFT JOIN customers c ON d.customername = c.company_name
-)
 INSERT INTO addresses (
     customer_id, st_addr, sub_addr, city, region, postal_code, country_code)
-SELECT customer_id, st_addr, sub_addr, city, region, postal_code, country_code
-FROM address_src
+SELECT DISTINCT
+    m.customer_id,
+    o.addressline1  AS st_addr,
+    o.addressline2  AS sub_addr,
+    o.city,
+    o.state         AS region,
+    o.postalcode    AS postal_code,
+    -- fall back on alias match
+    COALESCE(ic.alpha3, ia.alpha3) AS country_code
+FROM delta_orders o
+JOIN customer_map m USING (customername)
+LEFT JOIN iso_country_codes ic ON o.country = ic.name
+LEFT JOIN iso_country_aliases ia ON o.country = ia.alias
 ON CONFLICT DO NOTHING;
 
--- products
+-- order --> customer_id + ship address, resolved once (addresses probed by customer_id per order)
+--   ship address matched on customer + postal code as before (NULL postal code --> no ship address)
+CREATE TEMP TABLE order_keys ON COMMIT DROP AS
+SELECT DISTINCT ON (o.ordernumber)
+    o.ordernumber       AS order_no,
+    m.customer_id,
+    a.address_id        AS ship_addr_id
+FROM delta_orders o
+LEFT JOIN customer_map m USING (customername)
+LEFT JOIN addresses a ON a.customer_id = m.customer_id
+                      AND a.postal_code = o.postalcode
+ORDER BY o.ordernumber, a.address_id;
+
+ALTER TABLE order_keys ADD PRIMARY KEY (order_no);
+ANALYZE order_keys;
+
+-- products (pass 2)
 INSERT INTO products (product_code, product_line, msrp)
-SELECT DISTINCT productcode, productline, msrp
+SELECT DISTINCT ON (productcode) productcode, productline, msrp
 FROM delta
+WHERE productcode IS NOT NULL
+ORDER BY productcode
 ON CONFLICT DO NOTHING;
 
--- orders
-WITH order_src AS (
-    SELECT DISTINCT
-        d.ordernumber       AS order_no,
-        c.customer_id,
-        a.address_id        AS ship_addr_id,
-        d.orderdate         AS order_date,
-        d.status,
-        d.dealsize          AS deal_size
-    FROM delta d
-    LEFT JOIN customers c ON d.customername = c.company_name
-    LEFT JOIN addresses a ON c.customer_id = a.customer_id
-                          AND d.postalcode = a.postal_code
+-- orders (keep newly inserted orders for rfm aggregates)
+CREATE TEMP TABLE new_orders (
+    order_no        int,
+    customer_id     bigint,
+    order_date      date,
+    status          varchar(10)
+) ON COMMIT DROP;
+
+WITH inserted AS (
+    INSERT INTO orders (
+        order_no, customer_id, ship_addr_id, order_date, status, deal_size)
+    SELECT o.ordernumber, k.customer_id, k.ship_addr_id, o.orderdate, o.status, o.dealsize
+    FROM delta_orders o
+    JOIN order_keys k ON k.order_no = o.ordernumber
+    ORDER BY o.ordernumber
+    ON CONFLICT DO NOTHING
+    RETURNING order_no, customer_id, order_date, status
 )
-INSERT INTO orders (
-    order_no, customer_id, ship_addr_id, order_date, status, deal_size)
-SELECT order_no, customer_id, ship_addr_id, order_date, status, deal_size
-FROM order_src
-ORDER BY order_no, order_date
-ON CONFLICT DO NOTHING;
+INSERT INTO new_orders SELECT * FROM inserted;
 
--- order_lines
-INSERT INTO order_lines (
-    order_no, line_no, product_code, quantity, price_each, sales)
-SELECT DISTINCT
-    ordernumber,
-    orderlinenumber,
-    productcode,
-    quantityordered,
-    priceeach,
-    sales
-FROM delta
-ON CONFLICT DO NOTHING;
+-- order_lines, pass 3 (keep newly inserted lines for rfm aggregates)
+CREATE TEMP TABLE new_lines (
+    order_no        int,
+    sales           numeric(12,2)
+) ON COMMIT DROP;
+
+WITH inserted AS (
+    INSERT INTO order_lines (
+        order_no, line_no, product_code, quantity, price_each, sales)
+    SELECT DISTINCT ON (ordernumber, orderlinenumber)
+        ordernumber,
+        orderlinenumber,
+        productcode,
+        quantityordered,
+        priceeach,
+        sales
+    FROM delta
+    WHERE ordernumber IS NOT NULL
+    ORDER BY ordernumber, orderlinenumber, raw_id
+    ON CONFLICT DO NOTHING
+    RETURNING order_no, sales
+)
+INSERT INTO new_lines SELECT * FROM inserted;
+
+/* ------------------- rfm aggregates (delta only) ------------------- */
+-- orders count once (when first inserted); sales come from new lines (lines can arrive in later loads)
+WITH order_part AS (
+    SELECT  customer_id,
+            MIN(order_date)     AS first_order_date,
+            MAX(order_date)     AS last_order_date,
+            COUNT(*)            AS order_count
+    FROM new_orders
+    WHERE status IN ('Shipped', 'Resolved')
+    GROUP BY customer_id
+),
+sales_part AS (
+    SELECT  o.customer_id,
+            SUM(nl.sales)       AS total_sales
+    FROM new_lines nl
+    JOIN orders o USING (order_no)
+    WHERE o.status IN ('Shipped', 'Resolved')
+    GROUP BY o.customer_id
+)
+INSERT INTO customer_rfm_agg (customer_id, first_order_date, last_order_date, order_count, total_sales)
+SELECT  customer_id,
+        op.first_order_date,
+        op.last_order_date,
+        COALESCE(op.order_count, 0),
+        COALESCE(sp.total_sales, 0)
+FROM order_part op
+FULL JOIN sales_part sp USING (customer_id)
+WHERE customer_id IS NOT NULL
+ON CONFLICT (customer_id) DO UPDATE
+    -- LEAST/GREATEST ignore NULLs
+    SET first_order_date    = LEAST(customer_rfm_agg.first_order_date, EXCLUDED.first_order_date),
+        last_order_date     = GREATEST(customer_rfm_agg.last_order_date, EXCLUDED.last_order_date),
+        order_count         = customer_rfm_agg.order_count + EXCLUDED.order_count,
+        total_sales         = customer_rfm_agg.total_sales + EXCLUDED.total_sales,
+        updated_at          = now();
 
-/* ------------------- advance watermark ------------------- */
+/* ------------------- advance watermarks ------------------- */
+-- rfm_agg follows core_refresh (both built from the same delta)
 UPDATE etl_watermark
-SET last_id = COALESCE((SELECT MAX(raw_id) FROM delta), last_id),
+SET last_id = COALESCE((SELECT MAX(raw_id) FROM delta), (SELECT last_id FROM etl_watermark WHERE target = 'core_refresh')),
     updated_at = now()
-WHERE target = 'core_refresh';
+WHERE target IN ('core_refresh', 'rfm_agg');
 
 
 COMMIT;
\ No newline at end of file
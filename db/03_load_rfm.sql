@@ -38,27 +38,60 @@ SELECT DISTINCT label
 FROM tmp_rfm
 ON CONFLICT DO NOTHING;
 
---  2nd load: customer_segments table
-INSERT INTO customer_segments(
+--  2nd load: full run result --> the run's own customer_segment_history partition (append only)
+SELECT ensure_segment_history_partition(current_setting('app.run_id')::bigint);
+
+INSERT INTO customer_segment_history(
+    run_id,
     customer_id,
     segment_id,
-    run_id,
     recency_days,
     frequency,
     monetary_amt
 )
 SELECT
+    current_setting('app.run_id')::bigint,  --grab stored run_id
     t.customer_id,
     r.segment_id,
-    current_setting('app.run_id')::int,     --grab stored run_id
     t.recency_days,
     t.frequency,
     t.monetary_amt
 FROM tmp_rfm t
-LEFT JOIN rfm_segment_def r ON t.label = r.label
+LEFT JOIN rfm_segment_def r ON t.label = r.label;
+
+--  3rd load: customer_segments table, only customers whose segment/metrics changed
+--    - unchanged customers are filtered out before the upsert --> no tuple rewrite, row lock, audit row or WAL for them
+--    - run_id = run that last changed the customer's row (full results per run: customer_segment_history)
+INSERT INTO customer_segments(
+    customer_id,
+    segment_id,
+    run_id,
+    recency_days,
+    frequency,
+    monetary_amt
+)
+SELECT
+    h.customer_id,
+    h.segment_id,
+    h.run_id,
+    h.recency_days,
+    h.frequency,
+    h.monetary_amt
+FROM customer_segment_history h
+LEFT JOIN customer_segments cs ON cs.customer_id = h.customer_id
+WHERE h.run_id = current_setting('app.run_id')::bigint
+    AND (
+        cs.customer_id IS NULL
+        OR (cs.segment_id, cs.recency_days, cs.frequency, cs.monetary_amt)
+            IS DISTINCT FROM (h.segment_id, h.recency_days, h.frequency, h.monetary_amt)
+    )
 ON CONFLICT (customer_id) DO UPDATE
     SET segment_id      = EXCLUDED.segment_id,
         run_id          = EXCLUDED.run_id,
         recency_days    = EXCLUDED.recency_days,
         frequency       = EXCLUDED.frequency,
-        monetary_amt    = EXCLUDED.monetary_amt;
\ No newline at end of file
+        monetary_amt    = EXCLUDED.monetary_amt
+    WHERE (customer_segments.segment_id, customer_segments.recency_days,
+           customer_segments.frequency, customer_segments.monetary_amt)
+        IS DISTINCT FROM (EXCLUDED.segment_id, EXCLUDED.recency_days,
+                          EXCLUDED.frequency, EXCLUDED.monetary_amt);
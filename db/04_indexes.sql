@@ -0,0 +1,62 @@
+/*---------------------------------------------------------
+------------------- SECONDARY INDEXES ---------------------
+    - applied by 01_bootstrap_db.py after 01_schema.sql (safe to re-run)
+    - plans checked by bench/explain_plans.py
+---------------------------------------------------------*/
+
+-- company name lookups use uc_company_name, customer --> addresses lookups use uc_cust_address
+--   (unique constraint indexes from 01_schema.sql, leading columns company_name / customer_id)
+--   --> no separate covering copies; dropped on dbs that still have them
+DROP INDEX IF EXISTS idx_customers_company_cover;
+DROP INDEX IF EXISTS idx_addresses_customer_cover;
+
+
+/*--customers-----------------------------------------------------*/
+-- 04_transform_raw.py phone validation: customer_id > watermark AND phone_valid IS NULL
+--   only unvalidated customers are indexed, so the index stays tiny once validation catches up
+CREATE INDEX IF NOT EXISTS idx_customers_phone_pending
+    ON customers (customer_id) INCLUDE (phone)
+    WHERE phone_valid IS NULL; -----------------------------------------------------------------------
+
+
+/*--addresses-----------------------------------------------------*/
+-- country filters (ex. address correction rules join on country_code, address_id > watermark)
+CREATE INDEX IF NOT EXISTS idx_addresses_country
+    ON addresses (country_code, address_id);
+
+-- address correction rules: trigram match on the street key (f_street_key() from 01_schema.sql)
+--   rules join through the % operator --> one index probe per rule instead of a scan per rule
+CREATE INDEX IF NOT EXISTS idx_addresses_street_key_trgm
+    ON addresses USING gin (f_street_key(st_addr) gin_trgm_ops);
+
+-- 04_transform_raw.py geocoding: address_id > watermark AND score IS NULL
+CREATE INDEX IF NOT EXISTS idx_addresses_geocode_pending
+    ON addresses (address_id)
+    WHERE score IS NULL; -----------------------------------------------------------------------
+
+
+/*--orders-----------------------------------------------------*/
+-- customer --> orders (customer history, foreign key checks on customers)
+CREATE INDEX IF NOT EXISTS idx_orders_customer
+    ON orders (customer_id);
+
+-- rfm inputs: purchases only (same status filter as rfm modeling / customer_rfm_agg)
+CREATE INDEX IF NOT EXISTS idx_orders_purchases_cover
+    ON orders (customer_id, order_date) INCLUDE (order_no)
+    WHERE status IN ('Shipped', 'Resolved'); -----------------------------------------------------------------------
+
+
+/*--order_lines-----------------------------------------------------*/
+-- 07_snapshot_parquet.py: lines inserted since the last snapshot (line_id > watermark)
+CREATE INDEX IF NOT EXISTS idx_order_lines_line_id
+    ON order_lines (line_id); -----------------------------------------------------------------------
+
+
+/*--segmentation-----------------------------------------------------*/
+-- segment --> customers (segment analysis joins/filters)
+CREATE INDEX IF NOT EXISTS idx_customer_segments_segment
+    ON customer_segments (segment_id); -----------------------------------------------------------------------
+
+
+-- refresh planner statistics for the new indexes
+ANALYZE customers, addresses, orders, customer_segments;
@@ -0,0 +1,53 @@
+/*---------------------------------------------------------
+------------- PARTITION RAW ORDERS (migration) ------------
+    - converts a single table raw_orders_csv (dbs created before partitioning) into the
+      monthly range partitioned layout of 01_schema.sql
+    - applied by 01_bootstrap_db.py after 01_schema.sql (no-op once partitioned --> safe to re-run)
+    - raw_id sequence carries over, so the core_refresh watermark stays valid
+---------------------------------------------------------*/
+
+DO $$
+DECLARE
+    part_month timestamptz;
+BEGIN
+    -- already partitioned (or fresh db) --> nothing to do
+    IF (SELECT relkind FROM pg_class WHERE oid = to_regclass('raw_orders_csv')) IS DISTINCT FROM 'r' THEN
+        RETURN;
+    END IF;
+
+    -- move the old table out of the way (constraint names would clash with the new table's)
+    ALTER TABLE raw_orders_csv RENAME TO raw_orders_csv_legacy;
+    ALTER TABLE raw_orders_csv_legacy RENAME CONSTRAINT raw_orders_csv_pkey TO raw_orders_csv_legacy_pkey;
+    UPDATE raw_orders_csv_legacy SET created_at = now() WHERE created_at IS NULL;
+
+    -- same columns/defaults (raw_id keeps using raw_orders_csv_raw_id_seq), no global unique
+    CREATE TABLE raw_orders_csv (
+        LIKE raw_orders_csv_legacy INCLUDING DEFAULTS,
+        PRIMARY KEY (raw_id, created_at)
+    ) PARTITION BY RANGE (created_at);
+    ALTER SEQUENCE raw_orders_csv_raw_id_seq OWNED BY raw_orders_csv.raw_id;
+
+    -- one partition per month already loaded
+    FOR part_month IN
+        SELECT DISTINCT date_trunc('month', created_at) FROM raw_orders_csv_legacy
+    LOOP
+        PERFORM ensure_raw_partition(part_month);
+    END LOOP;
+    CREATE TABLE IF NOT EXISTS raw_orders_csv_default PARTITION OF raw_orders_csv DEFAULT;
+
+    INSERT INTO raw_orders_csv
+    SELECT * FROM raw_orders_csv_legacy;
+
+    -- dedup registry from the rows loaded so far
+    INSERT INTO raw_order_keys (ordernumber, orderlinenumber, first_seen)
+    SELECT ordernumber, orderlinenumber, MIN(created_at)
+    FROM raw_orders_csv_legacy
+    WHERE ordernumber IS NOT NULL
+        AND orderlinenumber IS NOT NULL
+    GROUP BY ordernumber, orderlinenumber
+    ON CONFLICT DO NOTHING;
+
+    DROP TABLE raw_orders_csv_legacy;
+END $$;
+
+ANALYZE raw_orders_csv, raw_order_keys;
@@ -2,19 +2,20 @@
 # Python helper: 
 #   - creates target db if missing
 #   - executes schema.sql
+#   - executes partition_raw.sql (older dbs: raw orders table --> monthly partitions)
+#   - executes indexes.sql (secondary indexes)
 # ----------------------------------------
 
 # imports
-import os, pathlib, psycopg2, psycopg2.sql as sql
-from dotenv import load_dotenv
+import os, psycopg2, psycopg2.sql as sql
 from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from common import db_dir, target_db
+import metrics
 
 # ---------------------------------------------------------
 # Load Credentials
 # ---------------------------------------------------------
-# pull credentials from .env
-load_dotenv('../.env')
-
+# credentials pulled from .env by common.py
 maintenance_db = os.getenv('maintenance_db')
 super_user = os.getenv('super_user')  #role allowed to create db
 pg_password = os.getenv('pg_password')
@@ -24,11 +25,10 @@ port = os.getenv('port')
 # build admin dsn --> role that is allowed to create db
 admin_dsn = f'dbname={maintenance_db} user={super_user} password={pg_password} host={host} port={port}'
 
-# target database to create
-target_db = 'order_mgmt'
-
-# read schema as text
-schema = pathlib.Path('../db/01_schema.sql').read_text()
+# read schema/indexes as text
+schema = (db_dir / '01_schema.sql').read_text()
+indexes = (db_dir / '04_indexes.sql').read_text()
+partition_raw = (db_dir / '05_partition_raw.sql').read_text()
 
 # ---------------------------------------------------------
 # Build Functions
@@ -69,9 +69,32 @@ def apply_schema():
         except psycopg2.errors.DuplicateTable:
             print(f'☐ Duplicate table detected--already applied schema --> skipping... ')
 
+# function: convert a single table raw_orders_csv to the partitioned layout (no-op once converted)
+def apply_raw_partitioning():
+    target_dsn = admin_dsn.replace(maintenance_db, target_db, 1)
+
+    with psycopg2.connect(target_dsn) as conn, conn.cursor() as cur:
+        cur.execute(partition_raw)
+        conn.commit()
+        print(f'☑ Raw orders partitioning checked on {target_db}')
+
+# function: add secondary indexes (IF NOT EXISTS --> safe on existing dbs)
+def apply_indexes():
+    target_dsn = admin_dsn.replace(maintenance_db, target_db, 1)
+
+    with psycopg2.connect(target_dsn) as conn, conn.cursor() as cur:
+        cur.execute(indexes)
+        conn.commit()
+        print(f'☑ Indexes applied to {target_db}')
+
 # ---------------------------------------------------------
 # Run when functions executed
 # ---------------------------------------------------------
+def main():
+    with metrics.stage('bootstrap'), metrics.profiled('bootstrap'):
+        for fn in (create_db, apply_schema, apply_raw_partitioning, apply_indexes):
+            with metrics.step(fn.__name__):
+                fn()
+
 if __name__ == '__main__':
-    create_db()
-    apply_schema()
\ No newline at end of file
+    main()
\ No newline at end of file
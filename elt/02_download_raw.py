@@ -1,16 +1,24 @@
 # imports
 from kaggle.api.kaggle_api_extended import KaggleApi
-import pathlib
+from common import data_dir
+import metrics
 
 # setup output path
-output_path = pathlib.Path('../data/raw')
-output_path.mkdir(exist_ok=True, parents=True)
+output_path = data_dir / 'raw'
 
 # import dataset through kaggle api
-try:
-    api = KaggleApi()
-    api.authenticate()
-    api.dataset_download_files('kyanyoga/sample-sales-data', path=output_path, unzip=True)
-    print(f'☑ Data downloaded. Local path: "{output_path}"')
-except Exception as e:
-    print(f'☐ Data NOT downloaded. Error occured: {e}')
+def main():
+    output_path.mkdir(exist_ok=True, parents=True)
+    with metrics.stage('download') as metric:
+        try:
+            api = KaggleApi()
+            api.authenticate()
+            api.dataset_download_files('kyanyoga/sample-sales-data', path=output_path, unzip=True)
+            metric.bytes_read = sum(f.stat().st_size for f in output_path.glob('*.csv'))
+            print(f'☑ Data downloaded. Local path: "{output_path}"')
+        except Exception as e:
+            print(f'☐ Data NOT downloaded. Error occured: {e}')
+            raise
+
+if __name__ == '__main__':
+    main()
@@ -1,30 +1,39 @@
 # imports
-import csv, io, os, psycopg2, pycountry
+import argparse, csv, glob, hashlib, io, os, time, psycopg2, pycountry
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from dotenv import load_dotenv
 from psycopg2 import sql
+from common import connect, data_dir, db_dir, dsn as target_dsn, target_db
+import metrics
 
 # -------------------------------------
 # Prepare variables
 # -------------------------------------
-# database to create
-target_db = 'order_mgmt'
-
 # paths
 dest_table = 'raw_orders_csv'
-raw_path = Path('../data/raw/sales_data_sample.csv')
-refresh_core_sql = Path('../db/02_refresh_core.sql')
-
-# pull credentials from .env
-load_dotenv('../.env')
-
-target_dsn = f'''
-dbname={target_db} 
-user={os.getenv('super_user')} 
-password={os.getenv('pg_password')} 
-host={os.getenv('host')} 
-port={os.getenv('port')}
-'''
+raw_path = data_dir / 'raw' / 'sales_data_sample.csv'
+refresh_core_sql = db_dir / '02_refresh_core.sql'
+
+# raw file encoding (python codec name, postgres encoding name)
+raw_encoding = ('latin-1', 'LATIN1')
+
+# streaming copy settings
+stream_raw = True               # False --> old path: whole file re-serialised into memory before copy
+copy_chunk_size = 1 << 20       # ~characters handed to COPY per read()
+
+# core refresh whitespace trimming: 'single_pass' (while building delta) or 'per_column' (old: one UPDATE per column)
+trim_mode = 'single_pass'
+
+# raw orders retention: months of raw partitions kept after the core refresh (None --> keep everything)
+raw_retention_months = None
+
+# ingest manifest: content hash = md5 of every loaded byte (any edit to loaded rows --> full reload)
+#   read in hash_block_bytes blocks; previous prefix and whole file hashed in one pass
+hash_block_bytes = 1024 ** 2
+
+# sharded ingest settings (directory/glob of extracts)
+shard_workers = os.cpu_count() or 1
+
 # -------------------------------------
 # ISO country tables
 # -------------------------------------
@@ -56,58 +65,448 @@ def build_buf(rows, headers) -> io.StringIO:
 # -------------------------------------
 # Functions: load raw data into database
 # -------------------------------------
-# -------------------------- raw orders table --------------------------
-def load_raw_orders(cur) -> int:
+# -------------------------- streaming copy helpers --------------------------
+class ByteRange(io.RawIOBase):
     '''
-    Load new records for raw orders csv table
+    read only bytes [start, end) of a file
+    (appends are read from the last offset; bytes written while COPY runs wait for the next load)
     '''
-    # create empty staging table 
-    cur.execute(sql.SQL(
-            """
-            CREATE TEMP TABLE stage AS
-            SELECT * FROM {dest} LIMIT 0
-            """
-        ).format(dest=sql.Identifier(dest_table)))
-    
-    # copy data into staging
-    with open(raw_path, newline='', encoding='latin-1') as fh:
-        # read each row as a dict
-        reader = csv.DictReader(fh)
+    def __init__(self, path, start=0, end=None):
+        self.fh = open(path, 'rb')
+        self.fh.seek(start)
+        self.remaining = (os.path.getsize(path) if end is None else end) - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        n = self.fh.readinto(memoryview(b)[:min(len(b), self.remaining)])
+        self.remaining -= n
+        return n
+
+    def close(self):
+        self.fh.close()
+        super().close()
+
+
+def open_range(path, start=0, end=None, text=False):
+    '''
+    bytes [start, end) of path as a binary (or decoded text) file object
+    '''
+    fh = io.BufferedReader(ByteRange(path, start, end))
+    return io.TextIOWrapper(fh, encoding=raw_encoding[0], newline='') if text else fh
+
+
+class CsvCopyStream:
+    '''
+    file-like adapter for copy_expert: reads csv rows lazily, keeps only the
+    columns at keep_idx (in that order) and re-serialises them chunk by chunk
+    so memory stays flat no matter the file size
+    '''
+    def __init__(self, fh, keep_idx, chunk_size=copy_chunk_size):
+        self.reader = csv.reader(fh)
+        self.keep_idx = keep_idx
+        self.chunk_size = chunk_size
+        self.rows = 0
+
+        # reusable output buffer
+        self.buf = io.StringIO()
+        self.writer = csv.writer(self.buf, lineterminator='\n')
+        self.exhausted = False
+
+    def read(self, size=-1):
+        # copy_expert asks for `size` bytes per call
+        size = self.chunk_size if size is None or size < 0 else size
+
+        # fill buffer up to requested size
+        while not self.exhausted and self.buf.tell() < size:
+            row = next(self.reader, None)
+            if row is None:
+                self.exhausted = True
+                break
+            self.writer.writerow([row[i] if i < len(row) else '' for i in self.keep_idx])
+            self.rows += 1
+
+        # hand back chunk and reset buffer
+        chunk = self.buf.getvalue()
+        self.buf.seek(0)
+        self.buf.truncate(0)
+        return chunk
+
+
+def get_dest_columns(cur) -> list:
+    '''
+    returns column names of the destination table (in table order)
+    '''
+    cur.execute(
+        '''
+        SELECT column_name
+        FROM information_schema.columns
+        WHERE table_name = %s
+        ORDER BY ordinal_position
+        ''', (dest_table,)
+    )
+    return [r[0] for r in cur.fetchall()]
+
+
+def read_header(path) -> list:
+    '''
+    returns lowercased header of csv file
+    '''
+    with open(path, newline='', encoding=raw_encoding[0]) as fh:
+        return [c.strip().lower() for c in next(csv.reader(fh))]
+
+
+def report_throughput(rows, n_bytes, seconds, label='COPY') -> None:
+    '''
+    print rows/s and MB/s for a load step
+    '''
+    seconds = max(seconds, 1e-9)
+    print(
+        f"\t☑ {label}: {rows} rows, {n_bytes / 1e6:.1f} MB in {seconds:.2f}s "
+        f"--> {rows / seconds:,.0f} rows/s, {n_bytes / 1e6 / seconds:.1f} MB/s"
+    )
+
+
+def copy_raw_file(cur, path, stage='stage', start=0, end=None) -> tuple:
+    '''
+    Copy one raw csv file (or its bytes [start, end) --> appended rows) into the staging table
+    - header already matches dest table --> file handle passed straight to COPY
+    - otherwise --> CsvCopyStream drops unknown columns chunk by chunk
+    returns (copied columns, rows copied, bytes read)
+    '''
+    header = read_header(path)
+    dest_cols = set(get_dest_columns(cur))
+    keep_idx = [i for i, c in enumerate(header) if c in dest_cols]
+    csv_cols = [header[i] for i in keep_idx]
+    cols_sql = sql.SQL(',').join(map(sql.Identifier, csv_cols))
+    end = path.stat().st_size if end is None else end
+    n_bytes = end - start
+
+    # passthrough: postgres parses/re-encodes the file itself (header only at the start of the file)
+    if len(keep_idx) == len(header):
+        copy_sql = sql.SQL(
+            "COPY {stage} ({cols}) FROM STDIN WITH (FORMAT CSV, HEADER {header}, ENCODING {enc})"
+        ).format(
+            stage=sql.Identifier(stage), cols=cols_sql, enc=sql.Literal(raw_encoding[1]),
+            header=sql.SQL('true' if start == 0 else 'false')
+        )
+
+        with open_range(path, start, end) as fh:
+            cur.copy_expert(copy_sql, fh, size=copy_chunk_size)
+        return csv_cols, cur.rowcount, n_bytes
+
+    # adapter: remap columns while COPY reads
+    copy_sql = sql.SQL(
+        "COPY {stage} ({cols}) FROM STDIN WITH (FORMAT CSV)"
+    ).format(stage=sql.Identifier(stage), cols=cols_sql)
+
+    with open_range(path, start, end, text=True) as fh:
+        if start == 0:
+            next(fh)  # skip header
+        stream = CsvCopyStream(fh, keep_idx)
+        cur.copy_expert(copy_sql, stream, size=copy_chunk_size)
+    return csv_cols, stream.rows, n_bytes
+
+
+def buffer_raw_file(cur, path, stage='stage', start=0, end=None) -> tuple:
+    '''
+    Old in memory path (kept for comparison): whole file (or bytes [start, end)) re-serialised into one buffer
+    returns (copied columns, rows copied, bytes read)
+    '''
+    end = path.stat().st_size if end is None else end
+    with open_range(path, start, end, text=True) as fh:
+        # read each row as a dict (appended bytes have no header --> take it from the file start)
+        reader = csv.DictReader(fh, fieldnames=None if start == 0 else read_header(path))
         # get header names
         csv_cols = [c.lower() for c in reader.fieldnames]
 
         # put reordered rows in an in memory buffer ready for copy
         buf = io.StringIO()
         writer = csv.writer(buf, lineterminator='\n')
+        rows = 0
         for row in reader:
             writer.writerow([row.get(c.upper(), row.get(c)) for c in csv_cols])
+            rows += 1
         buf.seek(0)
 
         # copy into staging
         copy_sql = sql.SQL(
-            "COPY stage ({cols}) FROM STDIN WITH (FORMAT CSV)"
+            "COPY {stage} ({cols}) FROM STDIN WITH (FORMAT CSV)"
         )
         cur.copy_expert(
-            copy_sql.format(cols=sql.SQL(',').join(map(sql.Identifier, csv_cols))),
+            copy_sql.format(
+                stage=sql.Identifier(stage),
+                cols=sql.SQL(',').join(map(sql.Identifier, csv_cols))
+            ),
             buf
         )
-        print(f"\t☑ Data copied into staging")
+    return csv_cols, rows, end - start
+
+# -------------------------- ingest manifest --------------------------
+def content_hashes(path, lengths) -> list:
+    '''
+    md5 of the first n bytes of path for each n in lengths (ascending), one sequential read
+    (every byte hashed --> an edit anywhere in the loaded part changes the hash)
+    '''
+    digest, hashes, pos = hashlib.md5(), [], 0
+    with open(path, 'rb') as fh:
+        for length in lengths:
+            while pos < length:
+                block = fh.read(min(hash_block_bytes, length - pos))
+                if not block:
+                    break
+                digest.update(block)
+                pos += len(block)
+            hashes.append(digest.hexdigest())
+    return hashes
+
+
+def content_hash(path, length) -> str:
+    '''
+    md5 of the first length bytes of path
+    '''
+    return content_hashes(path, [length])[0]
+
+
+def plan_file(cur, path, reload=False):
+    '''
+    compare a raw file with its ingest_manifest row
+    returns None (unchanged --> skip) or {path, start, end, hash} of the bytes to load:
+        - file only grew since last load --> start at the last offset
+        - new, shrunk or edited file (or reload) --> whole file
+    '''
+    end = path.stat().st_size
+    cur.execute(
+        'SELECT last_offset, content_hash FROM ingest_manifest WHERE source_path = %s',
+        (str(path.resolve()),)
+    )
+    row = cur.fetchone()
+    start = 0
+
+    if row and not reload and 0 < row[0] <= end:
+        last_offset, loaded_hash = row
+        # loaded part and whole file hashed in the same read
+        prefix_hash, file_hash = content_hashes(path, [last_offset, end])
+        if prefix_hash == loaded_hash:
+            if last_offset == end:
+                return None
+            # appended rows only if the loaded part ended on a full line
+            with open(path, 'rb') as fh:
+                fh.seek(last_offset - 1)
+                if fh.read(1) == b'\n':
+                    start = last_offset
+    else:
+        file_hash = content_hash(path, end)
+
+    return {'path': path, 'start': start, 'end': end, 'hash': file_hash}
+
+
+def record_file(cur, plan, rows) -> None:
+    '''
+    store what was loaded from a file (same transaction as the merge --> rolled back together)
+    '''
+    cur.execute(
+        '''
+        INSERT INTO ingest_manifest (source_path, file_size, last_offset, content_hash, rows_loaded)
+        VALUES (%(source_path)s, %(end)s, %(end)s, %(hash)s, %(rows)s)
+        ON CONFLICT (source_path) DO UPDATE
+            SET file_size = EXCLUDED.file_size,
+                last_offset = EXCLUDED.last_offset,
+                content_hash = EXCLUDED.content_hash,
+                rows_loaded = CASE WHEN %(start)s > 0
+                                THEN ingest_manifest.rows_loaded + EXCLUDED.rows_loaded
+                                ELSE EXCLUDED.rows_loaded
+                            END,
+                loaded_at = now()
+        ''', {
+            'source_path': str(plan['path'].resolve()),
+            'start': plan['start'],
+            'end': plan['end'],
+            'hash': plan['hash'],
+            'rows': rows
+        }
+    )
+
+# -------------------------- raw orders table --------------------------
+def merge_stage(cur, stage, csv_cols) -> int:
+    '''
+    insert from a staging table into actual destination table
+    returns number of new records
+
+    dedup runs against raw_order_keys (the partitioned raw table has no global unique key):
+        - keys not seen before are registered, only their rows are inserted
+        - duplicates inside one file --> first row in the file wins (as with the old ON CONFLICT)
+        - rows without order/line number are skipped (can't become orders in the core refresh)
+    '''
+    # partition for this load's created_at (now() = transaction start)
+    cur.execute("SELECT ensure_raw_partition(now())")
 
-    # insert from staging into actual destination table
     insert_sql = sql.SQL(
         """
+        WITH new_keys AS (
+            INSERT INTO raw_order_keys (ordernumber, orderlinenumber)
+            SELECT DISTINCT ordernumber, orderlinenumber
+            FROM {stage}
+            WHERE ordernumber IS NOT NULL
+                AND orderlinenumber IS NOT NULL
+            ON CONFLICT DO NOTHING
+            RETURNING ordernumber, orderlinenumber
+        ),
+        first_rows AS (
+            SELECT DISTINCT ON (s.ordernumber, s.orderlinenumber) s.ctid AS row_pos, {stage_cols}
+            FROM {stage} s
+            JOIN new_keys k USING (ordernumber, orderlinenumber)
+            ORDER BY s.ordernumber, s.orderlinenumber, s.ctid
+        )
         INSERT INTO {dest} ({cols})
-        SELECT {cols} FROM stage
-        ON CONFLICT (ordernumber, orderlinenumber) DO NOTHING
+        SELECT {cols} FROM first_rows
+        ORDER BY row_pos
         """
     ).format(
         dest = sql.Identifier(dest_table),
-        cols = sql.SQL(',').join(map(sql.Identifier, csv_cols))
+        stage = sql.Identifier(stage),
+        cols = sql.SQL(',').join(map(sql.Identifier, csv_cols)),
+        stage_cols = sql.SQL(',').join(sql.Identifier('s', c) for c in csv_cols)
     )
     cur.execute(insert_sql)
-    
-    # return new raw records count
     return cur.rowcount
+
+
+def drop_old_partitions(cur, keep_months=raw_retention_months) -> list:
+    '''
+    retention: drop raw orders partitions older than keep_months
+    (only ones the core refresh already processed --> see drop_raw_partitions() in 01_schema.sql)
+    returns dropped partition names
+    '''
+    if keep_months is None:
+        return []
+    cur.execute("SELECT drop_raw_partitions(%s)", (keep_months,))
+    return [r[0] for r in cur.fetchall()]
+
+
+def load_raw_orders(cur, plan) -> int:
+    '''
+    Load new records for raw orders csv table
+    (plan from plan_file(): whole file or only its appended bytes)
+    '''
+    # create empty staging table 
+    cur.execute(sql.SQL(
+            """
+            CREATE TEMP TABLE stage AS
+            SELECT * FROM {dest} LIMIT 0
+            """
+        ).format(dest=sql.Identifier(dest_table)))
+    
+    # copy data into staging
+    started = time.perf_counter()
+    copy_file = copy_raw_file if stream_raw else buffer_raw_file
+    with metrics.step('copy') as metric:
+        csv_cols, rows, n_bytes = copy_file(cur, plan['path'], 'stage', plan['start'], plan['end'])
+        metric.bytes_read = n_bytes
+    print(f"\t☑ Data copied into staging" + (f" (appended bytes from offset {plan['start']})" if plan['start'] else ''))
+    report_throughput(rows, n_bytes, time.perf_counter() - started)
+
+    # return new raw records count (manifest upsert in its own step --> merge rows = raw rows only)
+    with metrics.step('merge'):
+        new_records = merge_stage(cur, 'stage', csv_cols)
+    with metrics.step('manifest'):
+        record_file(cur, plan, rows)
+    return new_records
+
+# -------------------------- sharded raw orders (many files) --------------------------
+def resolve_raw_paths(source) -> list:
+    '''
+    directory, glob pattern or single file --> sorted list of csv paths
+    '''
+    source_path = Path(source)
+    if source_path.is_dir():
+        return sorted(source_path.glob('*.csv'))
+    if source_path.is_file():
+        return [source_path]
+    return sorted(Path(p) for p in glob.glob(str(source)))
+
+
+def copy_shard(job) -> tuple:
+    '''
+    process pool worker: copy one csv file into its own UNLOGGED staging table
+    over its own connection (committed so the merge connection can see it)
+    returns (stage table, copied columns, rows copied, bytes read)
+    '''
+    stage, plan = job
+    conn = psycopg2.connect(target_dsn)
+    try:
+        with conn, conn.cursor() as cur:
+            cur.execute(sql.SQL(
+                """
+                DROP TABLE IF EXISTS {stage};
+                CREATE UNLOGGED TABLE {stage} AS
+                SELECT * FROM {dest} LIMIT 0
+                """
+            ).format(stage=sql.Identifier(stage), dest=sql.Identifier(dest_table)))
+
+            copy_file = copy_raw_file if stream_raw else buffer_raw_file
+            csv_cols, rows, n_bytes = copy_file(cur, plan['path'], stage, plan['start'], plan['end'])
+    finally:
+        conn.close()
+    return stage, csv_cols, rows, n_bytes
+
+
+def drop_shard_stages(stages) -> None:
+    '''
+    drop leftover shard staging tables after a failed load (own connection; the merges have to be
+    rolled back to their savepoint first, their reads of the stages hold locks the DROP would wait on)
+    '''
+    conn = psycopg2.connect(target_dsn)
+    try:
+        with conn, conn.cursor() as cur:
+            for stage in stages:
+                cur.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(sql.Identifier(stage)))
+    finally:
+        conn.close()
+
+
+def load_raw_orders_sharded(cur, plans, workers=shard_workers) -> int:
+    '''
+    Load many raw csv files: COPY them in parallel from a process pool
+    (one connection + UNLOGGED staging table per file), then merge each
+    staging table into raw orders csv table in file order
+    (plans from plan_file(): whole files or only their appended bytes)
+    '''
+    stages = [f'raw_stage_{os.getpid()}_{i}' for i in range(len(plans))]
+    started = time.perf_counter()
+    new_records, total_rows, total_bytes = 0, 0, 0
+
+    # merges undone on their own if a shard fails (caller's earlier work in the transaction kept)
+    cur.execute('SAVEPOINT shard_merge')
+    try:
+        # parallel copy (worker connections --> wall time only, no db time)
+        with metrics.step('copy_shards') as metric, ProcessPoolExecutor(max_workers=min(workers, len(plans))) as pool:
+            shards = list(pool.map(copy_shard, zip(stages, plans)))
+            metric.bytes_read = sum(n_bytes for *_, n_bytes in shards)
+        print(f"\t☑ {len(shards)} files copied into staging with {min(workers, len(plans))} workers")
+
+        # merge in file order so raw_id follows the extracts
+        #   stage dropped on the merging cursor (same transaction --> no wait on its own locks)
+        for plan, (stage, csv_cols, rows, n_bytes) in zip(plans, shards):
+            with metrics.step('merge'):
+                new_records += merge_stage(cur, stage, csv_cols)
+                cur.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(stage)))
+            with metrics.step('manifest'):
+                record_file(cur, plan, rows)
+            total_rows += rows
+            total_bytes += n_bytes
+        cur.execute('RELEASE SAVEPOINT shard_merge')
+    except BaseException:
+        # undo the merges (releases their locks on the stages), clean up whatever stages are left,
+        #   then leave commit/rollback of the transaction to the caller
+        if not cur.connection.closed:
+            cur.execute('ROLLBACK TO SAVEPOINT shard_merge')
+        drop_shard_stages(stages)
+        raise
+
+    report_throughput(total_rows, total_bytes, time.perf_counter() - started)
+    return new_records
     
 # -------------------------- iso country codes/aliases tables --------------------------
 def load_country_codes_tables(cur) -> None:
@@ -167,35 +566,80 @@ def load_country_codes_tables(cur) -> None:
     print(f'\t☑ ISO country aliases table filled')
 
 # -------------------------- apply core refresh sql --------------------------
-def refresh_core_tables(cur) -> None:
-    # execute text version of sql file
+def refresh_core_tables(cur) -> dict:
+    '''
+    run 02_refresh_core.sql on the new raw rows
+    returns {table: rows written}
+    '''
+    # pick how delta gets trimmed
+    cur.execute("SELECT set_config('app.trim_mode', %s, false)", (trim_mode,))
+
+    # execute sql file statement by statement (one metrics step each)
     sql_text = refresh_core_sql.read_text()
-    cur.execute(sql_text)
+    results = metrics.run_statements(cur, sql_text, 'refresh')
+
+    # rows each target received
+    targets = metrics.rows_by_table(results)
+    for table, rows in targets.items():
+        print(f"\t\t{table}: {rows} rows")
+    return targets
 
 # -------------------------- main driver --------------------------
-def main():
+def load(conn, source=raw_path, workers=shard_workers, keep_months=raw_retention_months, reload=False) -> int:
+    '''
+    raw load + core refresh on an open connection (caller commits)
+    returns new raw records
+    '''
+    # one file --> single connection load; many files --> sharded load
+    paths = resolve_raw_paths(source)
+    if not paths:
+        raise FileNotFoundError(f"No raw csv files found for: {source}")
+
+    with conn.cursor() as cur:
+        # load raw table
+        print("Load 1: load raw orders csv table")
+
+        # ingest manifest: unchanged files skipped, grown files read from their last offset
+        with metrics.step('plan_files'):
+            plans = [plan for plan in (plan_file(cur, path, reload) for path in paths) if plan]
+        if len(plans) < len(paths):
+            print(f"\t☐ {len(paths) - len(plans)} unchanged file(s) --> skipping...")
+
+        if not plans:
+            new_records = 0
+        elif len(plans) == 1:
+            new_records = load_raw_orders(cur, plans[0])
+        else:
+            new_records = load_raw_orders_sharded(cur, plans, workers)
+        print(f"\t☑ {new_records} new records loaded to {dest_table}")
+
+        # load country iso/alias tables
+        print("Load 2: prepare iso country codes/aliases tables")
+        with metrics.step('country_codes'):
+            load_country_codes_tables(cur)
+        print(f"\t☑ ISO country codes/aliases tables ready")
+
+        # load core tables
+        print("Load 3: load core tables")
+        refresh_core_tables(cur)
+        print(f"\t☑ Loaded core tables with the {new_records} new records")
+
+        # retention on raw partitions (after the refresh moved the watermark)
+        with metrics.step('retention'):
+            dropped = drop_old_partitions(cur, keep_months)
+        if dropped:
+            print(f"\t☑ Dropped raw partitions: {', '.join(dropped)}")
+    return new_records
+
+
+def main(source=raw_path, workers=shard_workers, keep_months=raw_retention_months, reload=False):
     print(f"Starting connection to {target_db}....")
     try:
         # connect to postgresql server
-        with psycopg2.connect(target_dsn) as conn:
-            with conn.cursor() as cur:
-                print(f"\t☑ Connected to database")
-
-                # load raw table
-                print("Load 1: load raw orders csv table")
-                new_records = load_raw_orders(cur)
-                print(f"\t☑ {new_records} new records loaded to {dest_table}")
-
-                # load country iso/alias tables
-                print("Load 2: prepare iso country codes/aliases tables")
-                load_country_codes_tables(cur)
-                print(f"\t☑ ISO country codes/aliases tables ready")
-
-                # load core tables
-                print("Load 3: load core tables")
-                refresh_core_tables(cur)
-                print(f"\t☑ Loaded core tables with the {new_records} new records")
-            
+        with metrics.stage('load_raw'), metrics.profiled('load_raw'), connect() as conn:
+            print(f"\t☑ Connected to database")
+            load(conn, source, workers, keep_months, reload)
+
             print(f"Finished loading data into {target_db}...")
             conn.commit()
             print(f"\t☑ Commited changes to database")
@@ -206,4 +650,11 @@ def main():
         raise
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='load raw order extracts into the database')
+    parser.add_argument('source', nargs='?', default=raw_path, help='csv file, directory or glob of csv extracts')
+    parser.add_argument('--workers', type=int, default=shard_workers, help='copy processes for sharded loads')
+    parser.add_argument('--keep-months', type=int, default=raw_retention_months, help='drop processed raw partitions older than this many months')
+    parser.add_argument('--reload', action='store_true', help='ignore the ingest manifest and read every file whole')
+    args = parser.parse_args()
+
+    main(args.source, args.workers, args.keep_months, args.reload)
\ No newline at end of file
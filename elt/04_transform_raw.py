@@ -3,7 +3,7 @@
 #   - uses Google's libphonenumber library
 #   - validates and reformats numbers
 # 2) Geocodes addresses
-#   - uses ArcGIS REST API geocoding service
+#   - uses ArcGIS REST API geocoding service (concurrent client in geocoder.py)
 #   - updates new addresses with a score > 80
 # -------------------------------------------
 
@@ -11,25 +11,17 @@
 # ------------------- SETUP ------------------- #
 #################################################
 # imports
-import os, phonenumbers, time, requests, psycopg2, socket
-from dotenv import load_dotenv
+import csv, io, os, phonenumbers, psycopg2
+from psycopg2 import sql
+from common import connect, dsn
+import metrics
+from geocoder import GeocodeCache, GeocodeClient, default_base_url
 from phonenumbers import NumberParseException, is_valid_number, format_number, PhoneNumberFormat  
 
 
-# setup dsn
-target_db = 'order_mgmt'
-
-load_dotenv('../.env')
-dsn = f'''
-dbname={target_db} 
-user={os.getenv('super_user')} 
-password={os.getenv('pg_password')} 
-host={os.getenv('host')} 
-port={os.getenv('port')}
-'''
 # set up api credentials
 token = os.getenv('access_token')
-url = 'https://geocode-api.arcgis.com/arcgis/rest/services/World/GeocodeServer/findAddressCandidates'
+geocode_url = os.getenv('geocode_url', default_base_url)   # override to point at a local stub
 
 out_fields = ','.join([
     'StAddr',
@@ -43,6 +35,21 @@ out_fields = ','.join([
 
 score_threshold = 80  # threshold to update addresses
 
+# geocoding client settings
+geocode_concurrency = int(os.getenv('geocode_concurrency', 8))   # requests in flight
+geocode_rate = float(os.getenv('geocode_rate', 20))               # max requests per second
+geocode_retries = 3                                               # retries per request (backoff doubles)
+geocode_batch_size = int(os.getenv('geocode_batch_size', 1))      # >1 --> geocodeAddresses batch requests
+
+# geocode cache settings (geocode_cache table)
+use_geocode_cache = True
+cache_ttl_days = 90             # cached answers older than this are refreshed
+cache_max_rows = 1_000_000      # least recently hit entries evicted past this
+
+# batch write settings
+batch_size = 500      # results buffered per COPY + UPDATE ... FROM
+commit_every = 4      # batches per commit (watermark advances with each commit)
+
 
 #################################################
 # ----------------- FUNCTIONS ----------------- #
@@ -77,83 +84,202 @@ def update_phone(raw_phone, country):
 def na_to_empty(field):
     return '' if field is None else field
 
-# function: geocoding address
-def geocode(record, id_no):
-    '''
-    return geocoded address if found or none
-    '''
-    # setup multifield query
+# function: address fields of geocoding query (blanks dropped)
+def address_query(record):
     query = {
         'address':      na_to_empty(record['st_addr']),
         'address2':     na_to_empty(record['sub_addr']),
         'city':         na_to_empty(record['city']),
         'region':       na_to_empty(record['region']),
         'postal':       na_to_empty(record['postal_code']),
-        'countryCode':  na_to_empty(record['country_code']),
-        
-        # base
+        'countryCode':  na_to_empty(record['country_code'])
+    }
+    return {field: input for field, input in query.items() if input}
+
+# shared client: pooled connections, rate limit, retries
+client = GeocodeClient(
+    base_url=geocode_url,
+    base_params={
         'f':            'pjson',
         'token':        token,
         'maxLocations': 1,
         'forStorage':   'false',
         'langCode':     'ENG',
         'outFields':    out_fields
+    },
+    concurrency=geocode_concurrency,
+    rate=geocode_rate,
+    max_retries=geocode_retries,
+    # batch mode (geocodeAddresses always stores results --> forStorage implied)
+    batch_size=geocode_batch_size,
+    batch_params={
+        'f':            'pjson',
+        'token':        token,
+        'langCode':     'ENG',
+        'outFields':    out_fields
     }
-    
-    # drop blanks from query
-    query = {field: input for field, input in query.items() if input}
+)
 
-    # geocoding
-    try:
-        # make api request
-        address_data = requests.get(url, params=query, timeout=10).json()
-        print(f'Address ID {id_no}:')
-        print(address_data)
-        
-        candidate = address_data.get('candidates', [None])[0]
-        time.sleep(0.1)
-        return candidate
+# -------------------------- batch writes --------------------------
+class BatchWriter:
+    '''
+    buffers result rows and writes each batch set-based:
+    COPY into a temp table + one UPDATE ... FROM
 
-    except Exception as e:
-        print(f'\n⚠ GEOCODE ERROR: {e}')
-        return None
+    - commits every commit_every batches and advances the etl watermark in the same transaction
+    - a failed batch is rolled back and freezes the watermark at the last commit,
+      so its rows are picked up again next run
+    '''
+    def __init__(self, conn, target, last_id, stage, stage_cols, update_sql):
+        self.conn = conn
+        self.target = target
+        self.stage = stage
+        self.stage_cols = stage_cols        # [(name, type), ...]
+        self.update_sql = update_sql        # UPDATE ... FROM <stage>
+
+        # buffered rows keyed by id (first result per id wins)
+        self.rows = {}
+
+        # watermark tracking
+        self.seen_id = last_id              # highest id handed to the writer
+        self.pending_id = last_id           # highest id covered by flushed batches
+        self.watermark = last_id            # highest id committed
+        self.frozen = False
+        self.batches_since_commit = 0
+
+        # counters (written = committed rows only; pending_written = flushed, not yet committed)
+        self.written = 0
+        self.pending_written = 0
+        self.failed = 0
+
+    def add(self, row_id, row=None):
+        '''
+        mark row_id as processed and buffer its result (None --> nothing to write)
+        '''
+        self.seen_id = max(self.seen_id, row_id)
+        if row is not None:
+            self.rows.setdefault(row_id, row)
+        if len(self.rows) >= batch_size:
+            self.flush()
+
+    def flush(self):
+        '''
+        write buffered rows with one COPY and one UPDATE
+        '''
+        rows, self.rows = list(self.rows.values()), {}
+        try:
+            if rows:
+                with self.conn.cursor() as cur:
+                    # (re)create temp table and empty it
+                    cur.execute(sql.SQL(
+                        'CREATE TEMP TABLE IF NOT EXISTS {stage} ({cols}); TRUNCATE {stage};'
+                    ).format(
+                        stage=sql.Identifier(self.stage),
+                        cols=sql.SQL(', ').join(
+                            sql.SQL('{} {}').format(sql.Identifier(c), sql.SQL(t)) for c, t in self.stage_cols
+                        )
+                    ))
+
+                    # copy batch into temp table
+                    buf = io.StringIO()
+                    csv.writer(buf, lineterminator='\n').writerows(rows)
+                    buf.seek(0)
+                    cur.copy_expert(sql.SQL('COPY {stage} ({cols}) FROM STDIN WITH (FORMAT CSV)').format(
+                        stage=sql.Identifier(self.stage),
+                        cols=sql.SQL(', ').join(sql.Identifier(c) for c, _ in self.stage_cols)
+                    ), buf)
+
+                    # one set-based update for the batch
+                    cur.execute(self.update_sql)
+                    self.pending_written += cur.rowcount
+        except psycopg2.Error as e:
+            # rollback also discards earlier uncommitted batches --> their rows are not written either
+            self.conn.rollback()
+            self.pending_written = 0
+            self.failed += len(rows)
+            self.frozen = True
+            self.batches_since_commit = 0
+            print(f'\n⚠ POSTGRES ERROR: batch of {len(rows)} rolled back, {self.target} watermark held at {self.watermark}: {e}')
+            return
+
+        self.pending_id = self.seen_id
+        self.batches_since_commit += 1
+        if self.batches_since_commit >= commit_every:
+            self.commit()
+
+    def commit(self):
+        '''
+        commit flushed batches (and watermark unless a batch failed this run)
+        '''
+        try:
+            if not self.frozen and self.pending_id > self.watermark:
+                with self.conn.cursor() as cur:
+                    cur.execute(
+                        '''
+                        UPDATE etl_watermark
+                            SET last_id = %s,
+                                updated_at = now()
+                            WHERE target = %s
+                        ''', (self.pending_id, self.target)
+                    )
+            self.conn.commit()
+        except psycopg2.Error as e:
+            self.conn.rollback()
+            self.frozen = True
+            print(f'\n⚠ POSTGRES ERROR: commit failed, {self.target} watermark held at {self.watermark}: {e}')
+        else:
+            self.written += self.pending_written
+            if not self.frozen:
+                self.watermark = max(self.watermark, self.pending_id)
+        self.pending_written = 0
+        self.batches_since_commit = 0
+
+    def close(self):
+        '''
+        flush what is left and commit
+        '''
+        self.flush()
+        self.commit()
+        print(f'\t☑ {self.written} rows updated ({self.failed} failed), {self.target} watermark at {self.watermark}')
 
 #################################################
 # ---------------- ETL DRIVER ----------------- #
 #################################################
-# connect to db
-with psycopg2.connect(dsn) as conn, conn.cursor() as cur:
-    # -----------------------------------------------
-    # 1. PHONE VALIDATION
-    # -----------------------------------------------
-    
-    # -------------------------- get new customers' info --------------------------  
-    # get last customer id 
-    cur.execute(
-        '''
-        SELECT last_id FROM etl_watermark
-        WHERE target = 'phone_val'
-        '''
-    )
-    last_cust_id = cur.fetchone()[0]
+# phone validation and geocoding write different tables (customers vs addresses)
+#   --> pipeline.py runs them concurrently, each on its own connection
+
+# -----------------------------------------------
+# 1. PHONE VALIDATION
+# -----------------------------------------------
+def validate_phones(conn):
+    with metrics.step('fetch_customers'), conn.cursor() as cur:
+        # -------------------------- get new customers' info --------------------------  
+        # get last customer id 
+        cur.execute(
+            '''
+            SELECT last_id FROM etl_watermark
+            WHERE target = 'phone_val'
+            '''
+        )
+        last_cust_id = cur.fetchone()[0]
 
-    # get newest records
-    cur.execute(
-    '''
-    SELECT	c.customer_id,
-		    c.phone,
-		    c.phone_valid,
-		    ic.alpha2
-    FROM customers c
-    JOIN addresses a ON c.customer_id = a.customer_id
-    JOIN iso_country_codes ic ON a.country_code = ic.alpha3
-    WHERE c.customer_id > %s
-        AND c.phone_valid IS NULL
-    ORDER BY c.customer_id
-    ''', (last_cust_id,))
-    
-    records = cur.fetchall()
-    fields = [field.name for field in cur.description]
+        # get newest records
+        cur.execute(
+        '''
+        SELECT	c.customer_id,
+                c.phone,
+                c.phone_valid,
+                ic.alpha2
+        FROM customers c
+        JOIN addresses a ON c.customer_id = a.customer_id
+        JOIN iso_country_codes ic ON a.country_code = ic.alpha3
+        WHERE c.customer_id > %s
+            AND c.phone_valid IS NULL
+        ORDER BY c.customer_id
+        ''', (last_cust_id,))
+        
+        records = cur.fetchall()
+        fields = [field.name for field in cur.description]
 
     # display
     record_cnt = len(records)
@@ -166,128 +292,118 @@ with psycopg2.connect(dsn) as conn, conn.cursor() as cur:
 
     print(f'\nValidating/updating {record_cnt} {plural_or_no}...') if plural_or_no else print('\n☐ No phone numbers to check --> skipping...')
 
-    # track high watermark
-    max_cust_id = last_cust_id
+    # buffered, set-based writes
+    phone_writer = BatchWriter(
+        conn, 'phone_val', last_cust_id,
+        stage='phone_batch',
+        stage_cols=[('customer_id', 'bigint'), ('phone', 'varchar(25)'), ('phone_valid', 'boolean')],
+        update_sql='''
+            UPDATE customers c
+                SET phone       = b.phone,
+                    phone_valid = b.phone_valid
+            FROM phone_batch b
+            WHERE c.customer_id = b.customer_id
+                AND c.phone_valid IS NULL
+        '''
+    )
 
     # -------------------------- update phone numbers --------------------------
-    for r in records:
-        # set variables
-        phone_info = dict(zip(fields, r))
-        max_cust_id = max(max_cust_id,phone_info['customer_id'])
-        raw_phone = phone_info['phone']
-        phone_valid = phone_info['phone_valid']
-        country = phone_info['alpha2']
-        
-        # validate phone
-        print(f'\tChecking customer_id {phone_info['customer_id']}')
+    with metrics.step('validate_write'):
+        for r in records:
+            # set variables
+            phone_info = dict(zip(fields, r))
+            raw_phone = phone_info['phone']
+            country = phone_info['alpha2']
+            
+            # validate phone
+            print(f"\tChecking customer_id {phone_info['customer_id']}")
+
+            parsed_dict = update_phone(raw_phone, country)
+            phone_writer.add(
+                phone_info['customer_id'],
+                (phone_info['customer_id'], parsed_dict['phone'], parsed_dict['phone_valid'])
+            )
 
-        parsed_dict = update_phone(raw_phone, country)
-        phone = parsed_dict['phone']
-        phone_valid = parsed_dict['phone_valid']
+        # -------------------------- write last batch + advance watermark --------------------------
+        phone_writer.close()
 
-        try:
-            # update phones
-            cur.execute(
-                '''
-                UPDATE customers
-                    SET phone       = %s,
-                        phone_valid = %s
-                WHERE customer_id = %s
-                    AND phone_valid IS NULL
-                ''', (
-                    phone, phone_valid, phone_info['customer_id']
-                )
+# -----------------------------------------------
+# 2. GEOCODING
+# -----------------------------------------------
+def correct_addresses(conn, last_addr_id) -> int:
+    '''
+    every rule in address_correction_rules applied in one pass (trigram index on the street key)
+    returns addresses corrected
+    '''
+    print('Applying address correction rules...')
+    with metrics.step('address_corrections'), conn.cursor() as cur:
+        # % operator candidates: lowest rule threshold (each rule's own threshold checked after)
+        cur.execute(
+            '''
+            SELECT set_config('pg_trgm.similarity_threshold', COALESCE(MIN(threshold), 0.3)::text, true)
+            FROM address_correction_rules
+            '''
+        )
+        cur.execute(
+            r'''
+            WITH matches AS (
+                -- best rule per address (street has to contain the rule's misspelt token)
+                SELECT  DISTINCT ON (a.address_id)
+                        a.address_id, r.pattern, r.canonical_street, r.city
+                FROM address_correction_rules r
+                JOIN addresses a
+                    ON a.country_code = r.country_code
+                    AND f_street_key(a.st_addr) %% r.match_key
+                WHERE a.address_id > %s
+                    AND similarity(f_street_key(a.st_addr), r.match_key) > r.threshold
+                    AND a.st_addr ~* r.pattern
+                ORDER BY a.address_id, similarity(f_street_key(a.st_addr), r.match_key) DESC
             )
-        except Exception as e:
-            print(f'\n⚠ ERROR: {e}')
-        else:
-            conn.commit()
+            -- only the matched token is replaced (rest of the street kept as is)
+            UPDATE addresses a
+            SET st_addr = regexp_replace(a.st_addr, m.pattern, m.canonical_street, 'i'),
+                city = COALESCE(m.city, a.city)
+            FROM matches m
+            WHERE a.address_id = m.address_id
+            ''', (last_addr_id,)
+        )
+        corrected = cur.rowcount
+
+    conn.commit()
+    print(f'\t☑ Corrected {corrected} addresses')
+    return corrected
 
-    # -------------------------- advance watermark --------------------------
-    if max_cust_id > last_cust_id:
+
+def geocode_addresses(conn):
+    with conn.cursor() as cur:
+        # -------------------------- get new addresses --------------------------  
+        # get last address id 
         cur.execute(
             '''
-            UPDATE etl_watermark
-                SET last_id = %s,
-                    updated_at = now()
-                WHERE target = 'phone_val'
-            ''', (max_cust_id,)
+            SElECT last_id FROM etl_watermark
+            WHERE target = 'addr_geocode'
+            '''
         )
-        conn.commit()
-    # -----------------------------------------------
-    # 2. GEOCODING
-    # -----------------------------------------------
-
-    # -------------------------- get new addresses --------------------------  
-    # get last address id 
-    cur.execute(
-        '''
-        SElECT last_id FROM etl_watermark
-        WHERE target = 'addr_geocode'
-        '''
-    )
-    last_addr_id = cur.fetchone()[0]
-
-    # -------------------------- update swedish addresses --------------------------  
-    print('Updating Swedish addresses...')
-    cur.execute(
-        r'''
-        UPDATE addresses
-        SET st_addr =
-            regexp_replace(
-                st_addr,
-                '^(berguvs[^\s]*)(\s+.*)$',
-                'Berguvsvägen\2',
-                'i'
-            ),
-            city = 'Luleå'
-        WHERE similarity(
-                unaccent(lower(split_part(st_addr, ' ', 1))),
-                unaccent('berguvsvagen')
-            ) > 0.6
-            AND country_code = 'SWE'
-            AND address_id > %s
-        ''', (last_addr_id,)
-    )
+        last_addr_id = cur.fetchone()[0]
 
-    cur.execute(
-        r'''
-        UPDATE addresses
-        SET st_addr =
-            regexp_replace(
-                st_addr,
-                '^\?kerg[^\s]*(\s+.*)$',
-                'Åkergatan\1',
-                'i'
-            ),
-            city = 'Borås'
-        WHERE similarity(
-                unaccent(lower(split_part(st_addr, ' ', 1))),
-                unaccent('akergatan')
-            ) > 0.5
-            AND country_code = 'SWE'
-            AND address_id > %s
-        ''', (last_addr_id,)
-    )
-
-    conn.commit()
-    print('\t☑ Updated addresses')
+    # -------------------------- fuzzy address corrections --------------------------
+    correct_addresses(conn, last_addr_id)
 
-    
     # -------------------------- geocode addresses --------------------------
-    cur.execute(
-    '''
-    SELECT  address_id, customer_id,
-            st_addr, sub_addr, city, region,
-            postal_code, country_code, score
-    FROM addresses
-    WHERE address_id > %s
-        AND score is NULL
-    ORDER BY address_id
-    ''', (last_addr_id,))
-    
-    records = cur.fetchall()
-    fields = [field.name for field in cur.description]
+    with metrics.step('fetch_addresses'), conn.cursor() as cur:
+        cur.execute(
+        '''
+        SELECT  address_id, customer_id,
+                st_addr, sub_addr, city, region,
+                postal_code, country_code, score
+        FROM addresses
+        WHERE address_id > %s
+            AND score is NULL
+        ORDER BY address_id
+        ''', (last_addr_id,))
+        
+        records = cur.fetchall()
+        fields = [field.name for field in cur.description]
 
     # display
     record_cnt = len(records)
@@ -300,68 +416,80 @@ with psycopg2.connect(dsn) as conn, conn.cursor() as cur:
 
     print(f'\nGeocoding {record_cnt} {plural_or_no}...') if plural_or_no else print('\n☐ No addresses to geocode --> skipping...')
 
-    # track high watermark
-    max_addr_id = last_addr_id
+    # buffered, set-based writes
+    geocode_writer = BatchWriter(
+        conn, 'addr_geocode', last_addr_id,
+        stage='geocode_batch',
+        stage_cols=[
+            ('address_id', 'bigint'), ('st_addr', 'text'), ('sub_addr', 'text'), ('city', 'text'),
+            ('region', 'text'), ('postal_code', 'text'), ('country_code', 'char(3)'), ('score', 'numeric(5,2)')
+        ],
+        update_sql='''
+            UPDATE addresses a
+                SET st_addr         = NULLIF(b.st_addr, ''),
+                    sub_addr        = NULLIF(b.sub_addr, ''),
+                    city            = NULLIF(b.city, ''),
+                    region          = NULLIF(b.region, ''),
+                    postal_code     = NULLIF(b.postal_code, ''),
+                    country_code    = NULLIF(b.country_code, ''),
+                    score           = b.score
+            FROM geocode_batch b
+            WHERE a.address_id = b.address_id
+                AND a.score IS NULL
+        '''
+    )
 
     # -------------------------- geocode addresses --------------------------
-    for r in records:
-        address = dict(zip(fields, r))
-        max_addr_id = max(max_addr_id, address['address_id'])
+    addresses = [dict(zip(fields, r)) for r in records]
+    queries = (address_query(address) for address in addresses)
 
-        cand = geocode(address, address['address_id'])
-        
-        # skip if no match or low score
-        if not cand or cand['score'] < score_threshold:
-            continue
+    # cache hits skip the network entirely
+    cache = GeocodeCache(dsn, ttl_days=cache_ttl_days, max_rows=cache_max_rows) if use_geocode_cache else None
+    candidates = cache.map(client, queries) if cache else client.map(queries)
 
-        # update addresses that pass threshold
-        try:
-            # get new inputs (normalize empty fields)
-            attr = cand['attributes']
+    # geocoding requests + writes (db time = batch writes only, the cache uses its own connection)
+    with metrics.step('geocode_write'):
+        for address, cand in zip(addresses, candidates):
+            print(f"\tGeocoded address_id {address['address_id']}")
+
+            # skip if no match or low score
+            if not cand or cand['score'] < score_threshold:
+                geocode_writer.add(address['address_id'])
+                continue
 
             # skip if addressline 1 is null
+            attr = cand['attributes']
             if not attr['StAddr']:
+                geocode_writer.add(address['address_id'])
                 continue
 
-            # update addresses
-            cur.execute(
-                '''
-                UPDATE addresses
-                    SET st_addr         = NULLIF(%s, ''),
-                        sub_addr        = NULLIF(%s, ''),
-                        city            = NULLIF(%s, ''),
-                        region          = NULLIF(%s, ''),
-                        postal_code     = NULLIF(%s, ''),
-                        country_code    = NULLIF(%s, ''),
-                        score           = %s   
-                    WHERE address_id    = %s
-                        AND score IS NULL
-                ''', (
-                    attr['StAddr'], attr['SubAddr'], attr['City'], 
-                    attr['Region'], attr['Postal'], attr['CountryCode'],
-                    cand['score'], address['address_id']
-                )
-            )
-        except psycopg2.Error as e:
-            conn.rollback()
-            print(f'\n⚠ POSTGRES ERROR: {e}')
-        except (requests.exceptions.RequestException, socket.gaierror) as e:
-            print(f'\n⚠ GEOCODE NETWORK ERROR: {e}')
-        except Exception as e:
-            print(f'\n⚠ ERROR: {e}')
-        else:
-            conn.commit()
-
-    # -------------------------- advance watermark --------------------------
-    if max_addr_id > last_addr_id:
-        cur.execute(
-            '''
-            UPDATE etl_watermark
-                SET last_id = %s,
-                    updated_at = now()
-                WHERE target = 'addr_geocode'
-            ''', (max_addr_id,)
-        )
-        conn.commit()
-
-print ('\n☑ Geocoding done')
\ No newline at end of file
+            # buffer addresses that pass threshold
+            geocode_writer.add(address['address_id'], (
+                address['address_id'],
+                attr['StAddr'], attr['SubAddr'], attr['City'],
+                attr['Region'], attr['Postal'], attr['CountryCode'],
+                cand['score']
+            ))
+
+        # -------------------------- write last batch + advance watermark --------------------------
+        geocode_writer.close()
+    print(f'\t☑ Geocoder: {client.stats()}')
+    if cache:
+        cache.close()
+        print(f'\t☑ Geocode cache: {cache.stats()}')
+    print ('\n☑ Geocoding done')
+
+# -------------------------- main driver --------------------------
+def main():
+    # connect to db
+    try:
+        with connect() as conn:
+            with metrics.stage('phones'), metrics.profiled('phones'):
+                validate_phones(conn)
+            with metrics.stage('geocode'), metrics.profiled('geocode'):
+                geocode_addresses(conn)
+    finally:
+        client.close()
+
+if __name__ == '__main__':
+    main()
@@ -1,67 +1,92 @@
 # imports
-import os, json, psycopg2
-from pathlib import Path
-from dotenv import load_dotenv
+import json
+from common import config_dir, connect, data_dir, db_dir, target_db
+import metrics
 
 # -------------------------------------
 # 1) Prepare variables
 # -------------------------------------
 # ----- initial variables --------------------------------------------------
-# setup dsn
-target_db = 'order_mgmt'
-
-load_dotenv('../.env')
-dsn = f'''
-dbname={target_db} 
-user={os.getenv('super_user')} 
-password={os.getenv('pg_password')} 
-host={os.getenv('host')} 
-port={os.getenv('port')}
-'''
-
 # set up paths
-rfm_csv = Path('../data/derived/rfm_labels.csv')
-sql_file = Path('../db/03_load_rfm.sql')
-date_range = Path('../config/rfm_dates.json')
+rfm_csv = data_dir / 'derived' / 'rfm_labels.csv'
+sql_file = db_dir / '03_load_rfm.sql'
+date_range = config_dir / 'rfm_dates.json'
+
+# customer_segment_history retention: newest runs kept (None --> keep every run)
+segment_history_runs = None
 
 # ---- get date values --------------------------------------------
-try:
-    # get date values from config json file
-    with open(date_range, 'r') as f:
-          date_data = json.load(f)
+def get_date_range() -> tuple:
+    try:
+        # get date values from config json file
+        with open(date_range, 'r') as f:
+              date_data = json.load(f)
 
-    start_date = date_data.get('start_date')
-    end_date = date_data.get('end_date')
-except Exception as e:
-    print(f"⚠ ERROR! RFM analysis date range not collected: {e}")
-    raise
+        start_date = date_data.get('start_date')
+        end_date = date_data.get('end_date')
+    except Exception as e:
+        print(f"⚠ ERROR! RFM analysis date range not collected: {e}")
+        raise
+    return start_date, end_date
 
 # -------------------------------------
 # 2) Execute Load RFM SQL File
 # -------------------------------------       
 # ---- load rfm data into db ---------------------------------------
-print(f"Starting to load rfm results to {target_db}....")
-try:
+def load_rfm(conn):
+    '''
+    register a new rfm run and copy the notebook's labels into it (caller commits)
+    '''
+    start_date, end_date = get_date_range()
+
     # get sql file commands then split based on pre copy and then start copy
-    sql_text = open(sql_file).read()
+    sql_text = sql_file.read_text()
     sql_pre_copy, sql_start_copy = sql_text.split('STEP 2', 1)
 
-    # connect to db and read rfm data file
-    with psycopg2.connect(dsn) as conn, conn.cursor() as cur:
+    with conn.cursor() as cur:
         # ---- 1) store run_id in session --------------------
-        cur.execute(sql_pre_copy, {
-             'v_start_date': start_date,
-             'v_end_date': end_date
-        })
+        with metrics.step('register_run'):
+            cur.execute(sql_pre_copy, {
+                 'v_start_date': start_date,
+                 'v_end_date': end_date
+            })
         print("☑ Run ID registered and session variable set")
 
         # ---- 2) copy rfm data into temp table and properly upload
-        with open(rfm_csv, 'r', encoding='utf-8') as f:
+        with metrics.step('copy_labels') as metric, open(rfm_csv, 'r', encoding='utf-8') as f:
             # import rfm data into db
             cur.copy_expert(sql_start_copy, f)
-        conn.commit()
-        print("☑ Completed loading.")
+            metric.bytes_read = rfm_csv.stat().st_size
+
+        # ---- 3) drop history partitions of old runs
+        if segment_history_runs is not None:
+            with metrics.step('retention'):
+                dropped = drop_segment_history(cur, segment_history_runs)
+            if dropped:
+                print(f"☑ Dropped segment history: {', '.join(dropped)}")
+
+
+def drop_segment_history(cur, keep_runs) -> list:
+    '''
+    drop customer_segment_history partitions of all but the newest keep_runs runs
+    returns dropped partition names
+    '''
+    cur.execute('SELECT drop_segment_history(%s)', (keep_runs,))
+    return [r[0] for r in cur.fetchall()]
+
+
+def main():
+    print(f"Starting to load rfm results to {target_db}....")
+    try:
+        # connect to db and read rfm data file
+        with metrics.stage('load_rfm'), metrics.profiled('load_rfm'), connect() as conn:
+            load_rfm(conn)
+            conn.commit()
+            print("☑ Completed loading.")
+
+    except Exception as e:
+            print(f"⚠ ERROR! Data NOT loaded: {e}")
+            raise
 
-except Exception as e:
-        print(f"⚠ ERROR! Data NOT loaded: {e}")
-        raise
\ No newline at end of file
+if __name__ == '__main__':
+    main()
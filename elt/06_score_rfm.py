@@ -0,0 +1,89 @@
+# ----------------------------------------
+# Score every customer against the stored segmentation model (no notebooks, no refit)
+#   - rfm inputs from customer_rfm_agg (kept up to date by core refresh)
+#   - nearest stored medoid per customer (analysis/rfm_scoring.py)
+#   - results loaded with the same sql as 05_load_rfm.py (new rfm_run + history partition, changed customer_segments rows)
+# ----------------------------------------
+
+# imports
+import argparse, io, sys
+from common import analysis_dir, connect, db_dir, target_db
+import metrics
+
+sys.path.append(str(analysis_dir))
+from rfm_scoring import score_customers
+
+# -------------------------------------
+# Prepare variables
+# -------------------------------------
+# set up paths
+sql_file = db_dir / '03_load_rfm.sql'
+
+# customer_segment_history retention: newest runs kept (None --> keep every run)
+segment_history_runs = None
+
+# -------------------------------------
+# Functions
+# -------------------------------------
+# -------------------------- analysis date range --------------------------
+def get_date_range(cur, start_date=None, end_date=None) -> tuple:
+    '''
+    default date range = first to latest loaded order (same as rfm_modeling.ipynb)
+    '''
+    cur.execute('SELECT MIN(first_order_date), MAX(last_order_date) FROM customer_rfm_agg')
+    first_date, last_date = cur.fetchone()
+    return start_date or first_date, end_date or last_date
+
+# -------------------------- main driver --------------------------
+def main(start_date=None, end_date=None, model_id=None, keep_runs=segment_history_runs):
+    print(f"Starting to score customers in {target_db}....")
+
+    # get sql file commands then split based on pre copy and then start copy
+    sql_pre_copy, sql_start_copy = sql_file.read_text().split('STEP 2', 1)
+
+    try:
+        with metrics.stage('score_rfm'), metrics.profiled('score_rfm'), connect() as conn, conn.cursor() as cur:
+            # ---- 1) score customers --------------------
+            with metrics.step('score'):
+                start_date, end_date = get_date_range(cur, start_date, end_date)
+                rfm_df = score_customers(conn, end_date, model_id)
+            print(f"☑ Scored {len(rfm_df)} customers ({start_date} - {end_date})")
+
+            # ---- 2) store run_id in session --------------------
+            with metrics.step('register_run'):
+                cur.execute(sql_pre_copy, {
+                    'v_start_date': start_date,
+                    'v_end_date': end_date
+                })
+            print("☑ Run ID registered and session variable set")
+
+            # ---- 3) copy scores into temp table and properly upload
+            with metrics.step('copy_scores'):
+                buf = io.StringIO()
+                rfm_df.to_csv(buf, index=False)
+                buf.seek(0)
+                cur.copy_expert(sql_start_copy, buf)
+
+            # ---- 4) drop history partitions of old runs
+            if keep_runs is not None:
+                with metrics.step('retention'):
+                    cur.execute('SELECT drop_segment_history(%s)', (keep_runs,))
+                    dropped = [r[0] for r in cur.fetchall()]
+                if dropped:
+                    print(f"☑ Dropped segment history: {', '.join(dropped)}")
+            conn.commit()
+            print("☑ Completed loading.")
+
+    except Exception as e:
+        print(f"⚠ ERROR! Scores NOT loaded: {e}")
+        raise
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='score customers with the stored rfm model')
+    parser.add_argument('--start-date', default=None, help='analysis start date (default: first order)')
+    parser.add_argument('--end-date', default=None, help='analysis end date (default: latest order)')
+    parser.add_argument('--model-id', type=int, default=None, help='stored model (default: active one)')
+    parser.add_argument('--keep-runs', type=int, default=segment_history_runs, help='segment history runs kept (default: all)')
+    args = parser.parse_args()
+
+    main(args.start_date, args.end_date, args.model_id, args.keep_runs)
@@ -0,0 +1,315 @@
+# ----------------------------------------
+# Local Parquet snapshot of the analytics tables (read by analysis/snapshot.py)
+#   - orders, order_lines, customers, customer_segments --> data/snapshot/<table>/<partition>=<value>/
+#   - incremental: only rows past the table's etl_watermark target (parquet_<table>) are appended
+#   - file names carry their key range (part-<lo>-<hi>-<n>.parquet) so leftovers from an
+#     interrupted run/compaction are found and removed before the next append
+#   - small files in a partition are compacted into one
+# ----------------------------------------
+
+# imports
+import argparse, os, shutil, sys, numpy as np, pyarrow as pa, pyarrow.parquet as pq
+from pathlib import Path
+from common import analysis_dir, connect, data_dir, target_db
+import metrics
+
+sys.path.append(str(analysis_dir))
+from extract import iter_chunks
+
+# -------------------------------------
+# Prepare variables
+# -------------------------------------
+# output
+snapshot_dir = data_dir / 'snapshot'
+
+# rows per extract chunk/file
+chunk_rows = 250_000
+
+# postgres type oid --> parquet column type (one fixed schema per table, whatever a chunk's numpy dtypes are;
+#   ints stay int64 with real nulls, all NULL text stays string --> every file of a table has the same schema)
+#   anything else --> string
+oid_arrow_types = {
+    16:     pa.bool_(),                     # bool
+    20:     pa.int64(),                     # int8
+    21:     pa.int64(),                     # int2
+    23:     pa.int64(),                     # int4
+    700:    pa.float64(),                   # float4
+    701:    pa.float64(),                   # float8
+    1700:   pa.float64(),                   # numeric (decoded to float by extract.py)
+    1082:   pa.date32(),                    # date
+    1114:   pa.timestamp('us'),             # timestamp
+    1184:   pa.timestamp('us', tz='UTC'),   # timestamptz
+}
+
+# compaction: merge a partition's files once it holds this many files under small_file_bytes
+compact_min_files = 4
+small_file_bytes = 32 * 1024 ** 2
+
+# table --> incremental key, hive partition column, extract query (rows past the watermark)
+#   - orders: order numbers only grow in the source extracts
+#   - order_lines: line_id (insert order) --> lines arriving in a later load for an already
+#     snapshotted order are picked up too (only core refresh inserts lines, and the pipeline
+#     finishes it before the snapshot stage starts)
+#   - customers: new customers only (run with --full to pick up edits to existing ones)
+#   - customer_segments: every scoring run is a new run_id partition (full run results from customer_segment_history,
+#     customer_segments itself only keeps each customer's current row)
+snapshot_tables = {
+    'orders': {
+        'key': 'order_no',
+        'partition': 'order_year',
+        'query': '''
+            SELECT  o.*, extract(year FROM o.order_date)::int AS order_year
+            FROM orders o
+            WHERE o.order_no > %(last_id)s
+            ORDER BY o.order_no
+        '''
+    },
+    'order_lines': {
+        'key': 'line_id',
+        'partition': 'order_year',
+        'query': '''
+            SELECT  ol.*, extract(year FROM o.order_date)::int AS order_year
+            FROM order_lines ol
+            JOIN orders o USING (order_no)
+            WHERE ol.line_id > %(last_id)s
+            ORDER BY ol.line_id
+        '''
+    },
+    'customers': {
+        'key': 'customer_id',
+        'partition': None,
+        'query': '''
+            SELECT  *
+            FROM customers
+            WHERE customer_id > %(last_id)s
+            ORDER BY customer_id
+        '''
+    },
+    'customer_segments': {
+        'key': 'run_id',
+        'partition': 'run_id',
+        'query': '''
+            SELECT  h.customer_id, h.run_id, d.label,
+                    h.recency_days, h.frequency, h.monetary_amt
+            FROM customer_segment_history h
+            JOIN rfm_segment_def d USING (segment_id)
+            WHERE h.run_id > %(last_id)s
+            ORDER BY h.run_id, h.customer_id
+        '''
+    }
+}
+
+# -------------------------------------
+# Functions
+# -------------------------------------
+# -------------------------- watermarks --------------------------
+def get_watermark(cur, table) -> int:
+    target = f'parquet_{table}'
+    cur.execute(
+        '''
+        INSERT INTO etl_watermark (target, last_id)
+        VALUES (%s, 0)
+        ON CONFLICT (target) DO NOTHING
+        ''', (target,)
+    )
+    cur.execute('SELECT last_id FROM etl_watermark WHERE target = %s', (target,))
+    return cur.fetchone()[0]
+
+
+def set_watermark(cur, table, last_id) -> None:
+    cur.execute(
+        '''
+        UPDATE etl_watermark
+            SET last_id = %s,
+                updated_at = now()
+        WHERE target = %s
+        ''', (last_id, f'parquet_{table}')
+    )
+
+
+# -------------------------- file bookkeeping --------------------------
+def key_range(path: Path) -> tuple:
+    '''
+    part-<lo>-<hi>-<n>.parquet / compact-<lo>-<hi>.parquet --> (lo, hi)
+    '''
+    _, lo, hi = path.stem.split('-')[:3]
+    return int(lo), int(hi)
+
+
+def temp_path(path: Path) -> Path:
+    '''
+    in progress file name (leading _ --> skipped by parquet dataset readers)
+    '''
+    return path.with_name(f'_{path.stem}.tmp')
+
+
+def cleanup(table_dir: Path, last_id: int) -> int:
+    '''
+    remove leftovers of an interrupted run before appending:
+        - files past the watermark (written but never committed)
+        - files already covered by a compacted file in the same partition
+        - half written temp files
+    returns files removed
+    '''
+    removed = 0
+    for f in table_dir.rglob('_*.tmp'):
+        f.unlink()
+        removed += 1
+
+    for part_dir in {p.parent for p in table_dir.rglob('*.parquet')}:
+        files = sorted(part_dir.glob('*.parquet'))
+        compacted = [(f, key_range(f)) for f in files if f.name.startswith('compact-')]
+        for f in files:
+            lo, hi = key_range(f)
+            covered = any(
+                c != f and c_lo <= lo and hi <= c_hi
+                for c, (c_lo, c_hi) in compacted
+            )
+            if lo > last_id or covered:
+                f.unlink()
+                removed += 1
+    return removed
+
+
+# -------------------------- file schema --------------------------
+def table_schema(conn, spec: dict) -> pa.Schema:
+    '''
+    fixed parquet schema of a snapshot table from the query's column type oids
+    (partition column left out, it lives in the directory name)
+    '''
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT * FROM ({spec['query']}) AS q LIMIT 0", {'last_id': 0})
+        return pa.schema([
+            pa.field(desc.name, oid_arrow_types.get(desc.type_code, pa.string()))
+            for desc in cur.description
+            if desc.name != spec['partition']
+        ])
+
+
+def to_arrow(cols: dict, schema: pa.Schema) -> pa.Table:
+    '''
+    numpy columns --> table with the fixed schema (nan/NaT/None --> null, float holding ints --> int64)
+    '''
+    return pa.table([
+        pa.array(cols[field.name], from_pandas=True).cast(field.type)
+        for field in schema
+    ], schema=schema)
+
+
+def write_chunk(table_dir: Path, spec: dict, chunk: dict, file_no: int, schema: pa.Schema) -> int:
+    '''
+    write one extract chunk as parquet file(s), one per partition value
+    returns rows written
+    '''
+    key, part_col = spec['key'], spec['partition']
+    parts = np.unique(chunk[part_col]) if part_col else [None]
+
+    for value in parts:
+        # rows for this partition (partition column lives in the directory name)
+        mask = chunk[part_col] == value if part_col else slice(None)
+        cols = {name: arr[mask] for name, arr in chunk.items() if name != part_col}
+        part_dir = table_dir / f'{part_col}={value}' if part_col else table_dir
+        part_dir.mkdir(parents=True, exist_ok=True)
+
+        keys = chunk[key][mask]
+        path = part_dir / f'part-{keys.min():012d}-{keys.max():012d}-{file_no:04d}.parquet'
+        tmp_path = temp_path(path)
+        pq.write_table(to_arrow(cols, schema), tmp_path)
+        os.replace(tmp_path, path)
+
+    return len(chunk[key])
+
+
+def compact(table_dir: Path, schema: pa.Schema) -> int:
+    '''
+    merge small files per partition into one compact-<lo>-<hi>.parquet
+    (files read back with the table's schema --> concat never sees mismatched types)
+    returns partitions compacted
+    '''
+    compacted = 0
+    for part_dir in {p.parent for p in table_dir.rglob('*.parquet')}:
+        small = sorted(f for f in part_dir.glob('*.parquet') if f.stat().st_size < small_file_bytes)
+        if len(small) < compact_min_files:
+            continue
+
+        ranges = [key_range(f) for f in small]
+        path = part_dir / f'compact-{min(lo for lo, _ in ranges):012d}-{max(hi for _, hi in ranges):012d}.parquet'
+        merged = pa.concat_tables([pq.read_table(f, schema=schema) for f in small])
+
+        # new file first, then old ones (cleanup() removes covered files if interrupted)
+        tmp_path = temp_path(path)
+        pq.write_table(merged, tmp_path)
+        os.replace(tmp_path, path)
+        for f in small:
+            if f != path:
+                f.unlink()
+        compacted += 1
+    return compacted
+
+
+# -------------------------- snapshot --------------------------
+def snapshot_table(conn, table: str, full: bool = False) -> int:
+    '''
+    append rows past the watermark to data/snapshot/<table>, returns rows written
+    '''
+    spec = snapshot_tables[table]
+    table_dir = snapshot_dir / table
+
+    with conn.cursor() as cur:
+        last_id = get_watermark(cur, table)
+
+        # full rebuild --> start over (watermark reset committed first: an interrupted rebuild
+        #   resumes from 0 instead of the old watermark with half the files gone)
+        if full:
+            set_watermark(cur, table, 0)
+            conn.commit()
+            shutil.rmtree(table_dir, ignore_errors=True)
+            last_id = 0
+
+    table_dir.mkdir(parents=True, exist_ok=True)
+    cleanup(table_dir, last_id)
+    schema = table_schema(conn, spec)
+
+    rows, max_key = 0, last_id
+    for file_no, chunk in enumerate(iter_chunks(conn, spec['query'], {'last_id': last_id}, chunk_size=chunk_rows)):
+        rows += write_chunk(table_dir, spec, chunk, file_no, schema)
+        max_key = max(max_key, int(chunk[spec['key']].max()))
+
+    # files are in place --> move watermark
+    with conn.cursor() as cur:
+        set_watermark(cur, table, max_key)
+    conn.commit()
+
+    compact(table_dir, schema)
+    return rows
+
+
+# -------------------------- main driver --------------------------
+def main(tables=None, full=False):
+    tables = tables or list(snapshot_tables)
+    print(f"Starting parquet snapshot of {target_db} into {snapshot_dir}....")
+
+    try:
+        with metrics.stage('snapshot'), metrics.profiled('snapshot'), connect() as conn:
+            for table in tables:
+                with metrics.step(table) as metric:
+                    rows = snapshot_table(conn, table, full)
+                    metric.rows = rows
+                print(f"\t☑ {table}: {rows} new rows")
+        print("☑ Completed snapshot.")
+
+    except Exception as e:
+        print(f"⚠ ERROR! Snapshot NOT completed: {e}")
+        raise
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='append new rows of the analytics tables to local parquet files')
+    parser.add_argument('tables', nargs='*', help=f'tables to snapshot (default: all of {", ".join(snapshot_tables)})')
+    parser.add_argument('--full', action='store_true', help='rebuild from scratch instead of appending')
+    args = parser.parse_args()
+
+    unknown = set(args.tables) - set(snapshot_tables)
+    if unknown:
+        parser.error(f'unknown table(s): {", ".join(sorted(unknown))}')
+
+    main(args.tables, args.full)
@@ -0,0 +1,110 @@
+# ----------------------------------------
+# Shared ELT settings:
+#   - repo paths (built from this file's location --> scripts run from any working directory)
+#   - credentials/dsn from .env
+#   - thread safe connection pool shared by the pipeline stages (pipeline.py)
+#   - connections use metrics.TimedCursor --> db time per stage/step in etl_run_metrics
+# ----------------------------------------
+
+# imports
+import os, threading, psycopg2
+from contextlib import contextmanager
+from pathlib import Path
+from dotenv import load_dotenv
+from psycopg2.pool import ThreadedConnectionPool
+
+# -------------------------------------
+# Paths
+# -------------------------------------
+root_dir = Path(__file__).resolve().parents[1]
+elt_dir = root_dir / 'elt'
+db_dir = root_dir / 'db'
+data_dir = root_dir / 'data'
+config_dir = root_dir / 'config'
+analysis_dir = root_dir / 'analysis'
+
+# -------------------------------------
+# Credentials
+# -------------------------------------
+load_dotenv(root_dir / '.env')
+
+# database the elt loads into (etl_target_db overrides --> benchmarks run against a scratch db)
+target_db = os.getenv('etl_target_db', 'order_mgmt')
+
+
+def make_dsn(dbname=target_db) -> str:
+    return f'''
+dbname={dbname}
+user={os.getenv('super_user')}
+password={os.getenv('pg_password')}
+host={os.getenv('host')}
+port={os.getenv('port')}
+'''
+
+dsn = make_dsn()
+
+# -------------------------------------
+# Connections
+# -------------------------------------
+def connect():
+    '''
+    new connection to the target db (cursors time themselves into the open metrics stage/steps)
+    '''
+    from metrics import TimedCursor
+    return psycopg2.connect(dsn, cursor_factory=TimedCursor)
+
+
+# connections kept open for pipeline stages (one per concurrently running stage is enough)
+pool_min = 1
+pool_max = int(os.getenv('pool_max', 4))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ThreadedConnectionPool:
+    '''
+    shared pool, created on first use (target db has to exist by then)
+    '''
+    from metrics import TimedCursor
+
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.closed:
+            _pool = ThreadedConnectionPool(pool_min, pool_max, dsn, cursor_factory=TimedCursor)
+        return _pool
+
+
+@contextmanager
+def pooled_connection():
+    '''
+    borrow a pooled connection: committed on success, rolled back on error, always returned
+    '''
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        if not conn.closed:
+            conn.rollback()
+        raise
+    finally:
+        # next borrower gets a clean session (no temp tables/settings left by this stage)
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute('DISCARD ALL')
+            conn.autocommit = False
+        except psycopg2.Error:
+            conn.close()
+        # broken connections are discarded instead of reused
+        pool.putconn(conn, close=bool(conn.closed))
+
+
+def close_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None and not _pool.closed:
+            _pool.closeall()
+        _pool = None
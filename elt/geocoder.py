@@ -0,0 +1,394 @@
+# -------------------------------------------
+# Concurrent geocoding client (ArcGIS findAddressCandidates compatible)
+#   - pooled keep-alive connections (one requests session)
+#   - token bucket rate limiter shared by all workers
+#   - bounded retries with exponential backoff
+#   - optional batch mode: many records per geocodeAddresses request
+#   - works against any base url (ex. local stub server for benchmarks)
+#   - optional persistent result cache (geocode_cache table)
+# -------------------------------------------
+
+# imports
+import hashlib, json, random, threading, time, requests, psycopg2
+from collections import deque
+from psycopg2.extras import Json, execute_values
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+
+# default service
+default_base_url = 'https://geocode-api.arcgis.com/arcgis/rest/services/World/GeocodeServer'
+
+# responses worth retrying
+retry_statuses = {429, 500, 502, 503, 504}
+
+# findAddressCandidates query field --> geocodeAddresses record attribute
+batch_fields = {
+    'address':      'Address',
+    'address2':     'Address2',
+    'city':         'City',
+    'region':       'Region',
+    'postal':       'Postal',
+    'countryCode':  'CountryCode'
+}
+
+
+# -------------------------- rate limiting --------------------------
+class TokenBucket:
+    '''
+    thread safe token bucket: allows `rate` requests per second with bursts up to `burst`
+    '''
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        '''
+        block until a token is available
+        '''
+        while True:
+            with self.lock:
+                # refill based on elapsed time
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+# -------------------------- client --------------------------
+class GeocodeClient:
+    '''
+    geocoding client that runs requests from a thread pool
+
+    Parameters
+    ----------
+    base_url: geocode server url (findAddressCandidates is appended)
+    base_params: params sent with every request (token, outFields, f, ...)
+    concurrency: number of requests in flight
+    rate: max requests per second (None --> no limit)
+    max_retries: retries per request for network errors / 429 / 5xx
+    backoff: first retry wait in seconds (doubles each retry, with jitter)
+    timeout: request timeout in seconds
+    batch_size: records per geocodeAddresses request (1 --> one findAddressCandidates request per record)
+    batch_params: params sent with every batch request (token, outFields, f, ...)
+    '''
+    def __init__(
+        self,
+        base_url=default_base_url,
+        base_params=None,
+        concurrency=8,
+        rate=None,
+        max_retries=3,
+        backoff=0.5,
+        timeout=10,
+        batch_size=1,
+        batch_params=None
+    ):
+        self.base_url = base_url.rstrip('/')
+        self.base_params = dict(base_params or {})
+        self.concurrency = max(1, int(concurrency))
+        self.limiter = TokenBucket(rate, burst=self.concurrency) if rate else None
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.batch_size = max(1, int(batch_size))
+        self.batch_params = dict(batch_params or {})
+
+        # keep-alive connection pool sized to concurrency
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        # counters
+        self.requests = 0
+        self.retries = 0
+        self.errors = 0
+        self.fallbacks = 0
+        self.lock = threading.Lock()
+
+    def _count(self, field):
+        with self.lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def request(self, method, endpoint, **kwargs):
+        '''
+        send one request with rate limiting and retries, returns parsed json
+        '''
+        url = f'{self.base_url}/{endpoint}'
+        for attempt in range(self.max_retries + 1):
+            if self.limiter:
+                self.limiter.acquire()
+            self._count('requests')
+
+            try:
+                resp = self.session.request(method, url, timeout=self.timeout, **kwargs)
+                if resp.status_code not in retry_statuses:
+                    resp.raise_for_status()
+                    return resp.json()
+                retry_after = resp.headers.get('Retry-After')
+            except (requests.ConnectionError, requests.Timeout):
+                retry_after = None
+                if attempt == self.max_retries:
+                    raise
+
+            # give up after max retries
+            if attempt == self.max_retries:
+                resp.raise_for_status()
+
+            # wait before next attempt
+            self._count('retries')
+            wait = float(retry_after) if retry_after and retry_after.isdigit() else self.backoff * 2 ** attempt
+            time.sleep(wait * random.uniform(0.5, 1.5))
+
+    def lookup(self, query):
+        '''
+        return (request succeeded, best findAddressCandidates candidate or None)
+        '''
+        try:
+            data = self.request('GET', 'findAddressCandidates', params={**self.base_params, **query})
+            if 'error' in data:
+                raise RuntimeError(data['error'])
+            candidates = data.get('candidates') or [None]
+            return True, candidates[0]
+        except Exception as e:
+            self._count('errors')
+            print(f'\n⚠ GEOCODE ERROR: {e}')
+            return False, None
+
+    def lookup_batch(self, queries):
+        '''
+        geocode many queries with one geocodeAddresses request
+        returns [(request succeeded, candidate or None), ...] in input order;
+        records missing from the answer (or a failed request) fall back to single lookups
+        '''
+        records = [
+            {'attributes': {'OBJECTID': i, **{batch_fields[f]: v for f, v in q.items() if f in batch_fields}}}
+            for i, q in enumerate(queries)
+        ]
+        try:
+            data = self.request('POST', 'geocodeAddresses', data={
+                **self.batch_params,
+                'addresses': json.dumps({'records': records})
+            })
+            if 'error' in data:
+                raise RuntimeError(data['error'])
+            locations = data.get('locations') or []
+        except Exception as e:
+            self._count('errors')
+            print(f'\n⚠ GEOCODE BATCH ERROR ({len(queries)} records --> single requests): {e}')
+            locations = []
+
+        # map answers back by ResultID (== OBJECTID sent)
+        results = [None] * len(queries)
+        for loc in locations:
+            idx = (loc.get('attributes') or {}).get('ResultID')
+            if isinstance(idx, int) and 0 <= idx < len(queries):
+                # same shape as a findAddressCandidates candidate
+                cand = {
+                    'address':      loc.get('address'),
+                    'location':     loc.get('location'),
+                    'score':        loc.get('score', 0),
+                    'attributes':   loc.get('attributes') or {}
+                }
+                # unmatched --> no candidate (like an empty candidates list)
+                results[idx] = (True, None if cand['attributes'].get('Status') == 'U' else cand)
+
+        # fall back for anything that did not come back
+        for i, res in enumerate(results):
+            if res is None:
+                self._count('fallbacks')
+                results[i] = self.lookup(queries[i])
+        return results
+
+    def _ordered(self, fn, items):
+        '''
+        run fn over items in the thread pool and yield results in input order
+        (at most concurrency * 4 calls queued at once so memory stays bounded)
+        '''
+        window = self.concurrency * 4
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            pending = deque()
+            for item in items:
+                pending.append(pool.submit(fn, item))
+                if len(pending) >= window:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def map_lookup(self, queries):
+        '''
+        geocode an iterable of queries concurrently, yield (ok, candidate) in input order
+        '''
+        if self.batch_size == 1:
+            yield from self._ordered(self.lookup, queries)
+            return
+
+        # chunk queries into batches
+        def batches():
+            batch = []
+            for query in queries:
+                batch.append(query)
+                if len(batch) >= self.batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+
+        for results in self._ordered(self.lookup_batch, batches()):
+            yield from results
+
+    def map(self, queries):
+        '''
+        geocode an iterable of queries concurrently, yield candidate or None in input order
+        '''
+        for _, cand in self.map_lookup(queries):
+            yield cand
+
+    def stats(self) -> str:
+        return f'{self.requests} requests, {self.retries} retries, {self.errors} errors, {self.fallbacks} batch fallbacks'
+
+    def close(self):
+        self.session.close()
+
+
+# -------------------------- persistent cache --------------------------
+def query_key(query) -> str:
+    '''
+    md5 of normalised address fields (lowercase, single spaces, fixed field order)
+    '''
+    normalised = {
+        field: ' '.join(str(value).lower().split())
+        for field, value in sorted(query.items())
+        if value not in (None, '')
+    }
+    return hashlib.md5(json.dumps(normalised, sort_keys=True).encode()).hexdigest()
+
+
+class GeocodeCache:
+    '''
+    geocode results cached in the geocode_cache table keyed by query_key()
+    - entries older than ttl_days are ignored and evicted
+    - table is trimmed to max_rows (least recently hit first) on close()
+    - no-match answers are cached too; failed requests are not
+    '''
+    def __init__(self, dsn, ttl_days=90, max_rows=1_000_000, chunk_size=500):
+        self.conn = psycopg2.connect(dsn)
+        self.conn.autocommit = True
+        self.ttl_days = ttl_days
+        self.max_rows = max_rows
+        self.chunk_size = chunk_size
+
+        # counters
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, keys) -> dict:
+        '''
+        return {key: candidate} for fresh cached keys and touch their last_hit_at
+        '''
+        with self.conn.cursor() as cur:
+            cur.execute(
+                '''
+                UPDATE geocode_cache
+                    SET last_hit_at = now(),
+                        hits = hits + 1
+                WHERE query_hash = ANY(%s)
+                    AND created_at > now() - make_interval(days => %s)
+                RETURNING query_hash, candidate
+                ''', (list(keys), self.ttl_days)
+            )
+            return dict(cur.fetchall())
+
+    def put_many(self, items) -> None:
+        '''
+        store [(key, candidate), ...]
+        '''
+        if not items:
+            return
+        with self.conn.cursor() as cur:
+            execute_values(
+                cur,
+                '''
+                INSERT INTO geocode_cache (query_hash, candidate)
+                VALUES %s
+                ON CONFLICT (query_hash) DO UPDATE
+                    SET candidate = EXCLUDED.candidate,
+                        created_at = now(),
+                        last_hit_at = now()
+                ''',
+                [(key, Json(cand) if cand is not None else None) for key, cand in items]
+            )
+
+    def map(self, client, queries):
+        '''
+        like client.map() but answers cached queries without touching the network
+        (works chunk by chunk: one cache read + one cache write per chunk)
+        '''
+        chunk = []
+        for query in queries:
+            chunk.append(query)
+            if len(chunk) >= self.chunk_size:
+                yield from self._map_chunk(client, chunk)
+                chunk = []
+        if chunk:
+            yield from self._map_chunk(client, chunk)
+
+    def _map_chunk(self, client, queries):
+        keys = [query_key(q) for q in queries]
+        cached = self.get_many(set(keys))
+
+        # unique misses go to the geocoder once
+        miss_keys = list(dict.fromkeys(k for k in keys if k not in cached))
+        miss_queries = {k: q for k, q in zip(keys, queries) if k in miss_keys}
+        results = dict(zip(miss_keys, client.map_lookup(miss_queries[k] for k in miss_keys)))
+        self.put_many([(k, cand) for k, (ok, cand) in results.items() if ok])
+
+        # answer in input order
+        for k in keys:
+            if k in cached:
+                self.hits += 1
+                yield cached[k]
+            else:
+                self.misses += 1
+                yield results[k][1]
+
+    def evict(self) -> int:
+        '''
+        drop expired entries and trim to max_rows, returns rows deleted
+        '''
+        with self.conn.cursor() as cur:
+            cur.execute(
+                '''
+                DELETE FROM geocode_cache
+                WHERE created_at <= now() - make_interval(days => %s)
+                ''', (self.ttl_days,)
+            )
+            deleted = cur.rowcount
+            cur.execute(
+                '''
+                DELETE FROM geocode_cache
+                WHERE query_hash IN (
+                    SELECT query_hash FROM geocode_cache
+                    ORDER BY last_hit_at DESC
+                    OFFSET %s
+                )
+                ''', (self.max_rows,)
+            )
+            return deleted + cur.rowcount
+
+    def stats(self) -> str:
+        total = self.hits + self.misses
+        rate = self.hits / total if total else 0
+        return f'{self.hits} hits, {self.misses} misses ({rate:.1%} hit rate)'
+
+    def close(self) -> None:
+        self.evict()
+        self.conn.close()
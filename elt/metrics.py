@@ -0,0 +1,312 @@
+# ----------------------------------------
+# ELT instrumentation (etl_run_metrics table)
+#   - stage()/step(): wall time, db time, statements, rows affected, bytes read per stage and sub-step
+#   - TimedCursor: cursor class that adds the time of every execute/copy to the open stage/steps
+#     (used by common.connect() and the pooled connections)
+#   - run_statements(): sql file statement by statement, one step each (dollar quoting aware split)
+#   - profiled(): opt-in cProfile dump per stage (etl_profile=1 or pipeline.py --profile)
+#   - every row carries run_id (etl_run_id env var, set by pipeline.py/bench run_benchmarks.py so all stages
+#     and their child processes share it; otherwise one per process)
+# ----------------------------------------
+
+# imports
+import cProfile, os, re, threading, time, psycopg2
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from psycopg2.extras import execute_values
+
+# -------------------------------------
+# Prepare variables
+# -------------------------------------
+run_id = os.getenv('etl_run_id') or f"{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}"
+
+# cProfile dumps (data/profiles/<run_id>_<stage>.prof)
+profile_enabled = os.getenv('etl_profile', '').lower() in ('1', 'true', 'yes')
+
+# open stages/steps of the current thread (outermost first)
+_local = threading.local()
+
+# finished rows waiting to be written (written when a stage ends)
+_pending = []
+_pending_lock = threading.Lock()
+_write_failed = False
+
+
+# -------------------------- metric rows --------------------------
+class Metric:
+    '''
+    counters of one stage or step: db time/statements/rows by TimedCursor, bytes_read by the caller
+    '''
+    def __init__(self, stage, step):
+        self.stage = stage
+        self.step = step
+        self.started_at = datetime.now(timezone.utc)
+        self.started = time.perf_counter()
+        self.wall_seconds = 0.0
+        self.db_seconds = 0.0
+        self.statements = 0
+        self.rows = None
+        self.bytes_read = None
+        self.ok = True
+
+    def row(self) -> tuple:
+        return (
+            run_id, self.stage, self.step, self.started_at,
+            round(self.wall_seconds * 1000, 2), round(self.db_seconds * 1000, 2),
+            self.statements, self.rows, self.bytes_read, self.ok
+        )
+
+
+def _stack() -> list:
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+
+@contextmanager
+def _track(metric):
+    stack = _stack()
+    stack.append(metric)
+    try:
+        yield metric
+    except BaseException:
+        metric.ok = False
+        raise
+    finally:
+        metric.wall_seconds = time.perf_counter() - metric.started
+        stack.pop()
+        with _pending_lock:
+            _pending.append(metric.row())
+        if not stack:
+            flush()
+
+
+@contextmanager
+def stage(name):
+    '''
+    time a whole stage (step = 'total'); re-entering the open stage of the same name is a no-op
+    (pipeline.py opens the stage, the script's main() opens it again)
+    '''
+    stack = _stack()
+    if stack and stack[0].stage == name:
+        yield stack[0]
+        return
+    with _track(Metric(name, 'total')) as metric:
+        yield metric
+
+
+@contextmanager
+def step(name):
+    '''
+    time a sub-step of the open stage (outside a stage --> recorded under stage = step name)
+    '''
+    stack = _stack()
+    with _track(Metric(stack[0].stage if stack else name, name)) as metric:
+        yield metric
+
+
+# command tags that report rows written (SELECT/FETCH row counts are reads, not counted)
+_write_tags = ('INSERT', 'UPDATE', 'DELETE', 'MERGE', 'COPY')
+
+
+def _add_db_time(seconds, status=None, statement=True, rows=None):
+    '''
+    charge db time (and one statement) to every open stage/step of this thread
+    rows: rows written when known up front, else read from the status message's command tag
+    '''
+    if rows is None:
+        words = (status or '').split()
+        rows = int(words[-1]) if words and words[0] in _write_tags and words[-1].isdigit() else None
+    for metric in _stack():
+        metric.db_seconds += seconds
+        metric.statements += statement
+        if rows is not None:
+            metric.rows = (metric.rows or 0) + rows
+
+
+# -------------------------- timed cursor --------------------------
+class TimedCursor(psycopg2.extensions.cursor):
+    '''
+    cursor that adds time spent in execute/executemany/copy_expert to the open stage/steps
+    (named cursors: fetches go to the server too --> timed, not counted as statements)
+    '''
+    def _timed(self, fn, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _add_db_time(time.perf_counter() - started, self.statusmessage)
+
+    def execute(self, query, vars=None):
+        return self._timed(super().execute, query, vars)
+
+    def executemany(self, query, vars_list):
+        return self._timed(super().executemany, query, vars_list)
+
+    def copy_expert(self, sql, file, size=8192):
+        # COPY leaves no status message to read --> rows copied from rowcount
+        started = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            _add_db_time(time.perf_counter() - started, rows=self.rowcount if self.rowcount >= 0 else None)
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        if not self.name:
+            return super().fetchmany(size)
+        started = time.perf_counter()
+        try:
+            return super().fetchmany(size)
+        finally:
+            _add_db_time(time.perf_counter() - started, statement=False)
+
+
+# -------------------------- sql files --------------------------
+# dollar quote tag ($$ or $name$)
+_dollar_tag = re.compile(r'\$[A-Za-z_][A-Za-z_0-9]*\$|\$\$')
+
+
+def split_statements(sql_text: str) -> list:
+    '''
+    split a sql script on top level semicolons
+    (ignores ; inside quotes, quoted identifiers, comments and dollar quoted bodies like DO $$ ... $$)
+    '''
+    statements, start, i, n = [], 0, 0, len(sql_text)
+    while i < n:
+        ch = sql_text[i]
+        if ch in ("'", '"'):
+            # quoted literal/identifier ('' and "" escape themselves)
+            i = sql_text.find(ch, i + 1)
+            while i != -1 and sql_text[i + 1:i + 2] == ch:
+                i = sql_text.find(ch, i + 2)
+            i = n if i == -1 else i + 1
+        elif sql_text.startswith('--', i):
+            i = sql_text.find('\n', i)
+            i = n if i == -1 else i + 1
+        elif sql_text.startswith('/*', i):
+            i = sql_text.find('*/', i + 2)
+            i = n if i == -1 else i + 2
+        elif ch == '$' and (tag := _dollar_tag.match(sql_text, i)):
+            i = sql_text.find(tag.group(), tag.end())
+            i = n if i == -1 else i + len(tag.group())
+        elif ch == ';':
+            statements.append(sql_text[start:i + 1])
+            start = i = i + 1
+        else:
+            i += 1
+
+    statements.append(sql_text[start:])
+    return [s.strip() for s in statements if strip_comments(s).strip(' \n\t;')]
+
+
+def strip_comments(statement: str) -> str:
+    '''
+    statement without leading -- / /* */ comment lines (for step labels)
+    '''
+    return re.sub(r'^(\s*(--[^\n]*|/\*.*?\*/))*', '', statement, flags=re.S).strip()
+
+
+def run_statements(cur, sql_text: str, label: str) -> list:
+    '''
+    execute a sql script one statement at a time, each recorded as step '<label> NN: <statement start>'
+    (statements sent without parameters --> literal % needs no escaping, same as one execute of the file)
+    returns [(statement, rows written or None), ...]
+    '''
+    results = []
+    for i, statement in enumerate(split_statements(sql_text), 1):
+        summary = ' '.join(strip_comments(statement).split())[:60]
+        with step(f'{label} {i:02d}: {summary}') as metric:
+            cur.execute(statement)
+        results.append((statement, metric.rows))
+    return results
+
+
+# first table a statement writes (WITH ... AS (INSERT INTO t ...) counts as t)
+_write_target = re.compile(r'\b(?:INSERT\s+INTO|UPDATE|DELETE\s+FROM|MERGE\s+INTO)\s+([A-Za-z_][A-Za-z_0-9.]*)', re.I)
+
+# pipeline bookkeeping, not data targets (left out of rows per target)
+bookkeeping_tables = {'etl_watermark'}
+
+
+def rows_by_table(results: list) -> dict:
+    '''
+    run_statements() results --> {table: rows written}
+    (statements without a row count and writes to bookkeeping_tables left out)
+    '''
+    totals = {}
+    for statement, rows in results:
+        match = _write_target.search(strip_comments(statement))
+        if match and rows is not None and match.group(1).lower() not in bookkeeping_tables:
+            totals[match.group(1)] = totals.get(match.group(1), 0) + rows
+    return totals
+
+
+# -------------------------- storage --------------------------
+def flush() -> None:
+    '''
+    write finished rows to etl_run_metrics (own autocommit connection --> kept when the stage rolls back)
+    rows stay queued if the table isn't there yet (ex. before bootstrap) and go with the next flush
+    '''
+    from common import dsn
+
+    with _pending_lock:
+        rows = list(_pending)
+        _pending.clear()
+    if not rows:
+        return
+
+    try:
+        conn = psycopg2.connect(dsn)
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                execute_values(cur, '''
+                    INSERT INTO etl_run_metrics
+                        (run_id, stage, step, started_at, wall_ms, db_ms, statements, rows_affected, bytes_read, ok)
+                    VALUES %s
+                ''', rows)
+        finally:
+            conn.close()
+    except psycopg2.Error as e:
+        global _write_failed
+        with _pending_lock:
+            _pending[:0] = rows
+        if not _write_failed:
+            print(f'☐ Metrics not written yet, rows queued for the next flush: {str(e).strip()}')
+        _write_failed = True
+
+
+# -------------------------- profiling --------------------------
+@contextmanager
+def profiled(name):
+    '''
+    cProfile the block when profiling is enabled --> data/profiles/<run_id>_<name>.prof
+    (view with: python -m pstats <file> or snakeviz)
+    nested calls in the same thread are no-ops (a second profiler would replace the first one's hook)
+    '''
+    if not profile_enabled or getattr(_local, 'profiling', False):
+        yield
+        return
+
+    from common import data_dir
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError as e:
+        # python 3.12+: one active profiler per process (ex. two stages running side by side)
+        print(f'☐ Profiling skipped for {name}: {e}')
+        yield
+        return
+
+    _local.profiling = True
+    try:
+        yield
+    finally:
+        profiler.disable()
+        _local.profiling = False
+        path = data_dir / 'profiles' / f'{run_id}_{name}.prof'
+        path.parent.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(path)
+        print(f'\t☑ Profile written: {path}')
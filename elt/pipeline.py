@@ -0,0 +1,235 @@
+# ----------------------------------------
+# ELT pipeline: every elt script as one stage of a dependency graph
+#   - a stage starts as soon as the stages it depends on are done
+#     (ex. raw download while the db is bootstrapped, phone validation next to geocoding)
+#     --> wall time follows the longest dependency chain, not the sum of every step
+#   - stages borrow connections from one shared pool (common.py)
+#   - progress saved to data/pipeline_state.json --> --resume reruns only unfinished/failed stages
+#   - every stage/sub-step timed into etl_run_metrics under one run_id (metrics.py), --profile adds cProfile dumps
+#
+# usage (from any folder):
+#   python elt/pipeline.py                          # default stages
+#   python elt/pipeline.py --resume                 # continue after a failed run
+#   python elt/pipeline.py --skip download
+#   python elt/pipeline.py --stages score_rfm snapshot
+#   python elt/pipeline.py --stages load_raw --profile
+# ----------------------------------------
+
+# imports
+import argparse, importlib, json, os, sys, threading, time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from common import close_pool, data_dir, pool_max, pooled_connection, target_db
+import metrics
+
+# -------------------------------------
+# Prepare variables
+# -------------------------------------
+# run state (for --resume)
+state_path = data_dir / 'pipeline_state.json'
+
+# stages running at once (each holds at most one pooled connection)
+max_workers = pool_max
+
+# -------------------------------------
+# Stages
+# -------------------------------------
+def script(name):
+    '''
+    import an elt script by file name (ex. 03_load_raw) --> module
+    '''
+    return importlib.import_module(name)
+
+
+def run_bootstrap():
+    script('01_bootstrap_db').main()
+
+
+def run_download():
+    script('02_download_raw').main()
+
+
+def run_load_raw():
+    with pooled_connection() as conn:
+        script('03_load_raw').load(conn)
+
+
+def run_phones():
+    with pooled_connection() as conn:
+        script('04_transform_raw').validate_phones(conn)
+
+
+def run_geocode():
+    transform = script('04_transform_raw')
+    try:
+        with pooled_connection() as conn:
+            transform.geocode_addresses(conn)
+    finally:
+        transform.client.close()
+
+
+def run_load_rfm():
+    with pooled_connection() as conn:
+        script('05_load_rfm').load_rfm(conn)
+
+
+def run_score_rfm():
+    script('06_score_rfm').main()
+
+
+def run_snapshot():
+    script('07_snapshot_parquet').main()
+
+
+# stage --> function, stages it waits for, part of a default run
+#   (listed in dependency order; deps outside the selected stages count as done)
+#   - phones/geocode: customers vs addresses --> no shared rows, safe side by side
+#   - load_rfm: loads the notebook's labels, only needs the customers in place
+#   - score_rfm/snapshot: opt in (model scoring and parquet copy)
+stages = {
+    'bootstrap':    {'run': run_bootstrap,  'deps': [],                         'default': True},
+    'download':     {'run': run_download,   'deps': [],                         'default': True},
+    'load_raw':     {'run': run_load_raw,   'deps': ['bootstrap', 'download'],  'default': True},
+    'phones':       {'run': run_phones,     'deps': ['load_raw'],               'default': True},
+    'geocode':      {'run': run_geocode,    'deps': ['load_raw'],               'default': True},
+    'load_rfm':     {'run': run_load_rfm,   'deps': ['load_raw'],               'default': True},
+    'score_rfm':    {'run': run_score_rfm,  'deps': ['load_raw'],               'default': False},
+    'snapshot':     {'run': run_snapshot,   'deps': ['load_rfm', 'score_rfm'],  'default': False},
+}
+
+# -------------------------------------
+# Run state
+# -------------------------------------
+_state_lock = threading.Lock()
+
+
+def load_state(resume: bool) -> dict:
+    if resume and state_path.exists():
+        return json.loads(state_path.read_text())
+    return {'started_at': datetime.now().isoformat(timespec='seconds'), 'stages': {}}
+
+
+def save_state(state: dict, name: str, **fields) -> None:
+    '''
+    update one stage's entry and write the state file (temp file + rename --> never half written)
+    '''
+    with _state_lock:
+        state['stages'].setdefault(name, {}).update(fields)
+        state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = state_path.with_name(f'_{state_path.name}.tmp')
+        tmp_path.write_text(json.dumps(state, indent=2))
+        os.replace(tmp_path, state_path)
+
+
+# -------------------------------------
+# Scheduler
+# -------------------------------------
+def run_stage(name: str, state: dict) -> float:
+    '''
+    run one stage and record its outcome, returns seconds taken
+    '''
+    print(f"\nStage {name}: started")
+    save_state(state, name, status='running', error=None)
+    started = time.perf_counter()
+    try:
+        with metrics.stage(name), metrics.profiled(name):
+            stages[name]['run']()
+    except BaseException as e:
+        seconds = time.perf_counter() - started
+        save_state(state, name, status='failed', seconds=round(seconds, 2), error=repr(e))
+        print(f"⚠ ERROR! Stage {name} failed after {seconds:.1f}s: {e}")
+        raise
+    seconds = time.perf_counter() - started
+    save_state(state, name, status='done', seconds=round(seconds, 2),
+               finished_at=datetime.now().isoformat(timespec='seconds'))
+    print(f"☑ Stage {name} done in {seconds:.1f}s")
+    return seconds
+
+
+def critical_path(selected: list, seconds: dict) -> tuple:
+    '''
+    longest chain of dependent stages by recorded seconds --> (stage names, total seconds)
+    '''
+    best = {}
+    for name in selected:
+        deps = [best[d] for d in stages[name]['deps'] if d in best]
+        path, total = max(deps, key=lambda p: p[1], default=([], 0.0))
+        best[name] = (path + [name], total + seconds.get(name, 0.0))
+    return max(best.values(), key=lambda p: p[1], default=([], 0.0))
+
+
+def run(selected: list, resume: bool = False, workers: int = max_workers) -> bool:
+    '''
+    run selected stages, each as soon as its dependencies are done
+    returns True if every stage finished
+
+    Parameters
+    ----------
+    selected: stage names (run in dependency order, see stages)
+    resume: skip stages the last run already finished
+    workers: stages running at once
+    '''
+    # stages and the processes they start (ex. sharded COPY workers) record under this run's id
+    os.environ['etl_run_id'] = metrics.run_id
+    state = load_state(resume)
+    done = {name for name in selected if state['stages'].get(name, {}).get('status') == 'done'}
+    pending = [name for name in selected if name not in done]
+    running, failed = {}, []
+    print(f"Pipeline run {metrics.run_id} (etl_run_metrics)")
+    if done:
+        print(f"☐ Already done in last run --> skipping: {', '.join(sorted(done))}")
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while pending or running:
+            # start every stage whose deps are done (none once a stage failed)
+            if not failed:
+                for name in list(pending):
+                    if all(d in done or d not in selected for d in stages[name]['deps']):
+                        pending.remove(name)
+                        running[pool.submit(run_stage, name, state)] = name
+            if not running:
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                if future.exception() is None:
+                    done.add(name)
+                else:
+                    failed.append(name)
+    close_pool()
+    metrics.flush()
+
+    # summary
+    seconds = {name: state['stages'].get(name, {}).get('seconds', 0.0) for name in selected}
+    path, path_seconds = critical_path(selected, seconds)
+    print(f"\nPipeline wall time {time.perf_counter() - started:.1f}s "
+          f"(sum of stages {sum(seconds.values()):.1f}s, critical path {' --> '.join(path)} {path_seconds:.1f}s)")
+    if failed:
+        print(f"⚠ ERROR! Failed: {', '.join(failed)}; not run: {', '.join(pending) or 'none'} --> fix and rerun with --resume")
+        return False
+    print(f"☑ Pipeline completed for {target_db}")
+    return True
+
+
+# -------------------------- main driver --------------------------
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='run the elt scripts as one dependency graph')
+    parser.add_argument('--stages', nargs='+', default=None, help=f'stages to run (default: {", ".join(n for n, s in stages.items() if s["default"])})')
+    parser.add_argument('--skip', nargs='+', default=[], help='stages to leave out')
+    parser.add_argument('--resume', action='store_true', help='skip stages the last run finished')
+    parser.add_argument('--workers', type=int, default=max_workers, help='stages running at once')
+    parser.add_argument('--profile', action='store_true', help='write a cProfile dump per stage to data/profiles')
+    args = parser.parse_args()
+    metrics.profile_enabled = metrics.profile_enabled or args.profile
+
+    unknown = (set(args.stages or []) | set(args.skip)) - set(stages)
+    if unknown:
+        parser.error(f'unknown stage(s): {", ".join(sorted(unknown))}')
+
+    # keep dependency order whatever order the names were given in
+    wanted = set(args.stages) if args.stages else {n for n, s in stages.items() if s['default']}
+    selected = [name for name in stages if name in wanted and name not in args.skip]
+
+    sys.exit(0 if run(selected, args.resume, args.workers) else 1)
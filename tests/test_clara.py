@@ -0,0 +1,57 @@
+# ----------------------------------------
+# CLARA (analysis/clara.py): same seed --> same fit, memory cap bounds sample/chunk sizes
+# ----------------------------------------
+
+# imports
+import sys
+from pathlib import Path
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('sklearn_extra')
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'analysis'))
+from clara import Clara, compare_to_pam
+from sklearn_extra.cluster import KMedoids
+
+
+@pytest.fixture
+def data():
+    # three well separated blobs
+    rng = np.random.default_rng(0)
+    centers = np.array([[0, 0, 0], [10, 10, 0], [0, 10, 10]], dtype=np.float64)
+    return np.concatenate([c + rng.normal(size=(400, 3)) for c in centers])
+
+
+def test_same_seed_same_fit(data):
+    fits = [Clara(n_clusters=3, sample_size=200, n_sampling=3, random_state=7).fit(data) for _ in range(2)]
+    assert np.array_equal(fits[0].medoid_indices_, fits[1].medoid_indices_)
+    assert np.array_equal(fits[0].labels_, fits[1].labels_)
+    assert fits[0].inertia_ == fits[1].inertia_
+
+
+def test_memory_cap_bounds_sample_and_chunks(data):
+    # 0.1MB --> s×s float64 matrix of at most 114 rows, chunk×k×4 float64 within the cap too
+    model = Clara(n_clusters=3, sample_size=1000, max_memory_mb=0.1, random_state=0).fit(data)
+    cap = int(0.1 * 1024 ** 2)
+    assert model.sample_size_ ** 2 * 8 <= cap
+    assert model._chunk_rows() * 3 * 8 * 4 <= cap
+
+    # chunked assignment = nearest medoid over the whole dataset
+    dist = np.linalg.norm(data[:, None, :] - model.cluster_centers_[None], axis=2)
+    assert np.array_equal(model.labels_, dist.argmin(axis=1))
+    assert np.isclose(model.inertia_, dist.min(axis=1).sum())
+    assert np.array_equal(model.predict(data), model.labels_)
+
+
+def test_sample_covering_all_rows_matches_pam(data):
+    small = data[::12]
+    pam = KMedoids(n_clusters=3, method='pam', init='build', random_state=0)
+    report = compare_to_pam(small, pam, Clara(n_clusters=3, init='build', random_state=0), silhouette_sample=None)
+    assert report.loc['CLARA', 'label_agreement'] == 1.0
+    assert report.loc['CLARA', 'medoids_shared'] == 3
+
+
+def test_fewer_rows_than_clusters():
+    with pytest.raises(ValueError):
+        Clara(n_clusters=5).fit(np.zeros((3, 2)))
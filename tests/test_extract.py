@@ -0,0 +1,100 @@
+# ----------------------------------------
+# Streaming extract (analysis/extract.py): column dtypes from postgres type oids, chunked reads
+#   - rows come from an in memory cursor shaped like a psycopg2 named cursor (no database needed)
+# ----------------------------------------
+
+# imports
+import sys
+from collections import namedtuple
+from datetime import date, datetime
+from pathlib import Path
+import pytest
+
+np = pytest.importorskip('numpy')
+pd = pytest.importorskip('pandas')
+pytest.importorskip('psycopg2')
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'analysis'))
+import extract
+
+Column = namedtuple('Column', 'name type_code')
+
+# order_no int4, customer_id int8 (with a NULL), total_sales numeric, order_date date,
+# created_at timestamp, shipped bool, status text
+columns = [
+    Column('order_no', 23), Column('customer_id', 20), Column('total_sales', 1700),
+    Column('order_date', 1082), Column('created_at', 1114), Column('shipped', 16), Column('status', 25)
+]
+rows = [
+    (10100, 1, 10223.83, date(2003, 1, 6), datetime(2024, 1, 1, 8), True, 'Shipped'),
+    (10101, 2, 10549.01, date(2003, 1, 9), datetime(2024, 1, 1, 9), True, 'Shipped'),
+    (10102, None, 5494.78, date(2003, 1, 10), datetime(2024, 1, 2, 8), False, 'Cancelled'),
+    (10103, 4, 50218.95, date(2003, 1, 29), datetime(2024, 1, 3, 8), True, 'Resolved'),
+    (10104, 5, 40206.20, date(2003, 1, 31), datetime(2024, 1, 3, 9), True, 'Shipped'),
+]
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.description = columns
+        self.itersize = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        self.query = query
+
+    def fetchmany(self, size):
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def cursor(self, name=None):
+        assert name, 'extract reads through a named (server side) cursor'
+        return FakeCursor(self.rows)
+
+
+@pytest.fixture(autouse=True)
+def no_type_registration(monkeypatch):
+    # DEC2FLOAT is registered on real psycopg2 cursors only
+    monkeypatch.setattr(extract.psycopg2.extensions, 'register_type', lambda *args: None)
+
+
+def test_dtypes_across_chunks():
+    df = extract.read_frame(FakeConnection(rows), 'SELECT ...', chunk_size=2)
+
+    assert len(df) == len(rows)
+    assert df['order_no'].dtype == np.int64
+    assert df['customer_id'].dtype == np.float64            # NULL in one chunk --> float with nan
+    assert np.isnan(df['customer_id'][2])
+    assert df['total_sales'].dtype == np.float64
+    assert df['order_date'].dtype == 'datetime64[ns]'
+    assert df['created_at'].dtype == 'datetime64[ns]'
+    assert df['shipped'].dtype == np.bool_
+    assert df['status'].dtype == object
+    assert df['order_date'][4] == pd.Timestamp('2003-01-31')
+
+
+def test_to_column_nulls():
+    assert extract.to_column((True, None), 16).dtype == object
+    assert np.isnat(extract.to_column((date(2003, 1, 6), None), 1082)[1])
+    assert extract.to_column((1, 2), 21).dtype == np.int64
+
+
+def test_numeric_decoded_to_float():
+    assert extract.DEC2FLOAT('10223.83', None) == 10223.83
+    assert extract.DEC2FLOAT(None, None) is None
+
+
+def test_empty_result_keeps_columns():
+    df = extract.read_frame(FakeConnection([]), 'SELECT ...', columns=['order_no', 'status'])
+    assert df.empty and list(df.columns) == ['order_no', 'status']
@@ -0,0 +1,192 @@
+# ----------------------------------------
+# Geocoding client (elt/geocoder.py) against the local stub server (bench/geocode_stub.py)
+# ----------------------------------------
+
+# imports
+import random, sys, time
+from pathlib import Path
+import pytest
+
+pytest.importorskip('requests')
+pytest.importorskip('psycopg2')
+
+root_dir = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(root_dir / 'elt'))
+sys.path.insert(0, str(root_dir / 'bench'))
+from geocoder import GeocodeCache, GeocodeClient, TokenBucket, query_key
+from geocode_stub import serve
+
+
+def make_queries(n):
+    return [
+        {'address': f'{i} Main St', 'city': 'Springfield', 'postal': f'{10000 + i}', 'countryCode': 'USA'}
+        for i in range(n)
+    ]
+
+
+@pytest.fixture
+def stub():
+    '''
+    start a stub server with the given settings --> base url (shut down after the test)
+    '''
+    servers = []
+
+    def start(**settings):
+        server, base_url = serve(background=True, **settings)
+        servers.append(server)
+        return base_url
+
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+# -------------------------- rate limiting --------------------------
+def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=50, burst=1)
+    started = time.perf_counter()
+    for _ in range(11):
+        bucket.acquire()
+    # first token free, 10 more at 50/s
+    assert time.perf_counter() - started >= 0.18
+
+
+def test_token_bucket_allows_burst():
+    bucket = TokenBucket(rate=1, burst=5)
+    started = time.perf_counter()
+    for _ in range(5):
+        bucket.acquire()
+    assert time.perf_counter() - started < 0.5
+
+
+# -------------------------- concurrent client --------------------------
+def test_results_in_input_order(stub):
+    client = GeocodeClient(stub(latency=0.01), concurrency=8)
+    queries = make_queries(50)
+    try:
+        results = list(client.map(queries))
+    finally:
+        client.close()
+
+    assert [c['address'] for c in results] == [q['address'] for q in queries]
+    assert client.requests == 50
+
+
+def test_throttled_requests_retried(stub):
+    random.seed(0)
+    client = GeocodeClient(stub(throttle=0.3), concurrency=4, max_retries=20, backoff=0.001)
+    queries = make_queries(30)
+    try:
+        results = list(client.map_lookup(queries))
+    finally:
+        client.close()
+
+    assert all(ok for ok, _ in results)
+    assert client.retries > 0 and client.errors == 0
+    assert client.requests == 30 + client.retries
+
+
+# -------------------------- batch mode --------------------------
+def test_batch_requests(stub):
+    client = GeocodeClient(stub(), concurrency=2, batch_size=10)
+    queries = make_queries(25)
+    try:
+        results = list(client.map_lookup(queries))
+    finally:
+        client.close()
+
+    assert [c['address'] for _, c in results] == [q['address'] for q in queries]
+    assert client.requests == 3 and client.fallbacks == 0
+
+
+def test_dropped_batch_records_fall_back_to_single_requests(stub):
+    # every batch record left out of the answer --> one findAddressCandidates request each
+    client = GeocodeClient(stub(drop=1.0), concurrency=2, batch_size=10)
+    queries = make_queries(25)
+    try:
+        results = list(client.map_lookup(queries))
+    finally:
+        client.close()
+
+    assert [c['address'] for _, c in results] == [q['address'] for q in queries]
+    assert client.fallbacks == 25
+    assert client.requests == 3 + 25
+
+
+def test_unmatched_batch_record_has_no_candidate(stub):
+    client = GeocodeClient(stub(), batch_size=10)
+    try:
+        results = client.lookup_batch([{'address': '', 'city': 'Springfield'}, make_queries(1)[0]])
+    finally:
+        client.close()
+
+    assert results[0] == (True, None)
+    assert results[1][1]['address'] == '0 Main St'
+    assert client.fallbacks == 0
+
+
+# -------------------------- persistent cache --------------------------
+class MemoryCache(GeocodeCache):
+    '''
+    GeocodeCache with the geocode_cache table kept in a dict (lookup logic unchanged)
+    '''
+    def __init__(self, chunk_size=500):
+        self.rows = {}
+        self.chunk_size = chunk_size
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, keys) -> dict:
+        return {key: self.rows[key] for key in keys if key in self.rows}
+
+    def put_many(self, items) -> None:
+        self.rows.update(items)
+
+
+def test_query_key_normalised():
+    assert query_key({'address': '  1 Main  St ', 'city': 'SPRINGFIELD', 'address2': ''}) \
+        == query_key({'city': 'springfield', 'address': '1 main st', 'address2': None})
+    assert query_key({'address': '1 Main St'}) != query_key({'address': '2 Main St'})
+
+
+def test_cached_queries_skip_the_network(stub):
+    client = GeocodeClient(stub(), concurrency=4)
+    cache = MemoryCache(chunk_size=7)
+    queries = make_queries(20)
+    try:
+        first = list(cache.map(client, queries))
+        # repeated (differently spelled) queries --> answered from the cache
+        second = list(cache.map(client, [{**q, 'city': q['city'].upper()} for q in queries]))
+    finally:
+        client.close()
+
+    assert first == second
+    assert client.requests == 20
+    assert (cache.hits, cache.misses) == (20, 20)
+
+
+def test_duplicate_misses_geocoded_once(stub):
+    client = GeocodeClient(stub(), concurrency=4)
+    cache = MemoryCache()
+    queries = make_queries(5) * 3
+    try:
+        results = list(cache.map(client, queries))
+    finally:
+        client.close()
+
+    assert [c['address'] for c in results] == [q['address'] for q in queries]
+    assert client.requests == 5
+    assert len(cache.rows) == 5
+
+
+def test_failed_requests_not_cached(stub):
+    # every request throttled, no retries --> failed, nothing stored
+    client = GeocodeClient(stub(throttle=1.0), concurrency=2, max_retries=0)
+    cache = MemoryCache()
+    try:
+        results = list(cache.map(client, make_queries(3)))
+    finally:
+        client.close()
+
+    assert results == [None, None, None]
+    assert cache.rows == {}
@@ -0,0 +1,124 @@
+# ----------------------------------------
+# Ingest manifest (elt/03_load_raw.py plan_file/record_file): unchanged, grown, edited and shrunk files
+#   - ingest_manifest rows kept in an in memory cursor (no database needed)
+# ----------------------------------------
+
+# imports
+import importlib, sys
+from pathlib import Path
+import pytest
+
+pytest.importorskip('psycopg2')
+pytest.importorskip('pycountry')
+pytest.importorskip('dotenv')
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'elt'))
+load_raw = importlib.import_module('03_load_raw')
+
+header = b'ORDERNUMBER,ORDERLINENUMBER,SALES\n'
+
+
+class ManifestCursor:
+    '''
+    answers plan_file()'s manifest lookup and stores record_file()'s upsert
+    '''
+    def __init__(self):
+        self.rows = {}
+        self.result = None
+
+    def execute(self, query, params=None):
+        if 'INSERT INTO ingest_manifest' in query:
+            self.rows[params['source_path']] = (params['end'], params['hash'])
+        else:
+            self.result = self.rows.get(params[0])
+
+    def fetchone(self):
+        return self.result
+
+
+def write_rows(path, first, n, mode='wb'):
+    with open(path, mode) as fh:
+        if mode == 'wb':
+            fh.write(header)
+        fh.writelines(f'{10100 + i},1,{i * 1.5:.2f}\n'.encode() for i in range(first, first + n))
+
+
+def load(cur, path, reload=False):
+    '''
+    plan + record as a load would (rows not counted here) --> plan or None
+    '''
+    plan = load_raw.plan_file(cur, path, reload)
+    if plan:
+        load_raw.record_file(cur, plan, 0)
+    return plan
+
+
+@pytest.fixture
+def cur():
+    return ManifestCursor()
+
+
+def test_new_then_unchanged_file(cur, tmp_path):
+    path = tmp_path / 'sales.csv'
+    write_rows(path, 0, 100)
+    assert load(cur, path)['start'] == 0
+    assert load(cur, path) is None
+
+
+def test_grown_file_reads_appended_bytes_only(cur, tmp_path):
+    path = tmp_path / 'sales.csv'
+    write_rows(path, 0, 100)
+    size = load(cur, path)['end']
+
+    write_rows(path, 100, 20, mode='ab')
+    plan = load(cur, path)
+    assert (plan['start'], plan['end']) == (size, path.stat().st_size)
+
+    # appended range holds exactly the new rows (header taken from the file start)
+    with load_raw.open_range(path, plan['start'], plan['end'], text=True) as fh:
+        lines = fh.read().splitlines()
+    assert len(lines) == 20 and lines[0].startswith('10200,')
+    assert load_raw.read_header(path) == ['ordernumber', 'orderlinenumber', 'sales']
+
+
+@pytest.mark.parametrize('at', [i / 16 for i in range(1, 16)])
+def test_edited_large_file_reloaded(cur, tmp_path, at):
+    # > 4MB: one changed digit anywhere in the loaded part still forces a full reload
+    path = tmp_path / 'sales.csv'
+    write_rows(path, 0, 250_000)
+    load(cur, path)
+    write_rows(path, 250_000, 10, mode='ab')
+
+    data = bytearray(path.read_bytes())
+    line = data.index(b'\n', int(len(data) * at)) + 1
+    data[line + 4] = ord('9') if data[line + 4] != ord('9') else ord('8')
+    path.write_bytes(bytes(data))
+
+    assert load(cur, path)['start'] == 0
+
+
+def test_shrunk_file_reloaded(cur, tmp_path):
+    path = tmp_path / 'sales.csv'
+    write_rows(path, 0, 100)
+    load(cur, path)
+    write_rows(path, 0, 50)
+    assert load(cur, path)['start'] == 0
+
+
+def test_partial_last_line_reloaded(cur, tmp_path):
+    # loaded part ended mid line --> appended bytes can't be read on their own
+    path = tmp_path / 'sales.csv'
+    write_rows(path, 0, 10)
+    with open(path, 'ab') as fh:
+        fh.write(b'10110,1,')
+    load(cur, path)
+    with open(path, 'ab') as fh:
+        fh.write(b'9.99\n')
+    assert load(cur, path)['start'] == 0
+
+
+def test_reload_forces_whole_file(cur, tmp_path):
+    path = tmp_path / 'sales.csv'
+    write_rows(path, 0, 100)
+    load(cur, path)
+    assert load(cur, path, reload=True)['start'] == 0
@@ -0,0 +1,37 @@
+# ----------------------------------------
+# PAM fits through model_selection.fit_model on cached (memory mapped) distance matrices
+# ----------------------------------------
+
+# imports
+import sys
+from pathlib import Path
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('sklearn_extra')
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'analysis'))
+import distance_cache
+from model_selection import fit_model
+from sklearn_extra.cluster import KMedoids
+
+
+@pytest.fixture(autouse=True)
+def tmp_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(distance_cache, 'cache_dir', tmp_path / 'distances')
+
+
+@pytest.mark.parametrize('metric', ['euclidean', 'manhattan', 'cosine'])
+@pytest.mark.parametrize('init', ['k-medoids++', 'build'])
+def test_pam_fit_on_cached_distances(metric, init):
+    data = np.random.default_rng(0).normal(size=(60, 3))
+    model = KMedoids(n_clusters=3, metric=metric, method='pam', init=init, random_state=0)
+
+    # first fit fills the cache, second one reads the memory mapped file back
+    for _ in range(2):
+        fitted, centers = fit_model(model, data)
+        assert fitted.labels_.shape == (60,)
+        assert np.array_equal(centers, data[fitted.medoid_indices_])
+
+    # cache file itself untouched by the fit
+    assert not distance_cache.get_distances(data, metric).flags.writeable
@@ -0,0 +1,74 @@
+# ----------------------------------------
+# Vectorised percentile ranks (analysis/percentiles.py) against scipy percentileofscore(kind='rank')
+# and the per segment lambda groupby the notebook used before
+# ----------------------------------------
+
+# imports
+import sys
+from pathlib import Path
+import pytest
+
+np = pytest.importorskip('numpy')
+pd = pytest.importorskip('pandas')
+stats = pytest.importorskip('scipy.stats')
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'analysis'))
+from percentiles import add_percentiles, rank_percentiles, segment_percentile_summary
+
+rfm_cols = ['recency', 'frequency', 'monetary']
+
+
+@pytest.fixture
+def rfm_df():
+    # small integer ranges --> plenty of ties
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        'recency': rng.integers(0, 30, 500),
+        'frequency': rng.integers(1, 8, 500),
+        'monetary': rng.integers(1, 50, 500) * 100.0,
+        'segment': rng.integers(0, 4, 500)
+    })
+
+
+def scipy_pct(reference, value, higher_better=True):
+    # pct_rank() from the notebook before percentiles.py
+    p = stats.percentileofscore(reference, value, kind='rank')
+    return p if higher_better else 100 - p
+
+
+@pytest.mark.parametrize('col', rfm_cols)
+def test_rank_percentiles_match_scipy(rfm_df, col):
+    higher_better = col != 'recency'
+    expected = [scipy_pct(rfm_df[col], v, higher_better) for v in rfm_df[col]]
+    assert np.array_equal(rank_percentiles(rfm_df[col], higher_better=higher_better), expected)
+
+
+def test_rank_percentiles_of_values_outside_reference(rfm_df):
+    # medoids/new values ranked against the customer distribution (below, between, above, equal)
+    values = [-1, 0, 3.5, 29, 100]
+    expected = [scipy_pct(rfm_df['recency'], v) for v in values]
+    assert np.array_equal(rank_percentiles(rfm_df['recency'], values), expected)
+
+
+def test_add_percentiles_decimal(rfm_df):
+    out = add_percentiles(rfm_df, rfm_cols, decimal_no_pct=True)
+    expected = [scipy_pct(rfm_df['recency'], v, higher_better=False) / 100 for v in rfm_df['recency']]
+    assert np.allclose(out['recency_pct'], expected, rtol=0, atol=1e-12)
+    assert list(rfm_df.columns) == rfm_cols + ['segment']
+
+
+def test_segment_summary_matches_lambda_groupby(rfm_df):
+    pct_df = add_percentiles(rfm_df, rfm_cols)
+
+    # per segment lambdas from the notebook before percentiles.py
+    expected = pct_df.groupby('segment').agg(**{
+        f'{col}_{name}': (f'{col}_pct', func)
+        for col in rfm_cols
+        for name, func in [
+            ('p25', lambda s: s.quantile(0.25)),
+            ('median', 'median'),
+            ('p75', lambda s: s.quantile(0.75))
+        ]
+    })
+
+    pd.testing.assert_frame_equal(segment_percentile_summary(pct_df, rfm_cols), expected)
@@ -0,0 +1,146 @@
+# ----------------------------------------
+# Parquet snapshot (elt/07_snapshot_parquet.py): incremental appends, compaction, leftovers of
+# interrupted runs
+#   - watermarks/extract come from an in memory table (no database needed)
+# ----------------------------------------
+
+# imports
+import importlib, sys
+from pathlib import Path
+import pytest
+
+np = pytest.importorskip('numpy')
+pa = pytest.importorskip('pyarrow')
+pq = pytest.importorskip('pyarrow.parquet')
+pytest.importorskip('psycopg2')
+pytest.importorskip('dotenv')
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'elt'))
+snapshot = importlib.import_module('07_snapshot_parquet')
+
+spec = {'key': 'order_no', 'partition': 'order_year', 'query': 'SELECT ...'}
+schema = pa.schema([pa.field('order_no', pa.int64()), pa.field('customer_id', pa.int64()), pa.field('sales', pa.float64())])
+
+
+class FakeConnection:
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def commit(self):
+        pass
+
+
+class Source:
+    '''
+    orders table + parquet_orders watermark in memory
+    '''
+    def __init__(self, n_rows):
+        self.order_no = np.arange(1, n_rows + 1, dtype=np.int64)
+        self.watermark = 0
+        self.fail_after = None          # chunks yielded before the extract fails
+
+    def add_rows(self, n_rows):
+        start = self.order_no[-1] + 1
+        self.order_no = np.concatenate([self.order_no, np.arange(start, start + n_rows, dtype=np.int64)])
+
+    def iter_chunks(self, conn, query, params, chunk_size):
+        keys = self.order_no[self.order_no > params['last_id']]
+        for i, start in enumerate(range(0, len(keys), chunk_size)):
+            if self.fail_after is not None and i == self.fail_after:
+                raise RuntimeError('extract interrupted')
+            chunk = keys[start:start + chunk_size]
+            # customer_id NULL for every 7th order --> float with nan, written as int64 with nulls
+            customer_id = np.where(chunk % 7 == 0, np.nan, chunk % 50).astype(np.float64)
+            yield {
+                'order_no': chunk,
+                'customer_id': customer_id,
+                'sales': chunk * 1.5,
+                'order_year': 2003 + chunk % 3
+            }
+
+
+@pytest.fixture
+def source(tmp_path, monkeypatch):
+    src = Source(100)
+    monkeypatch.setattr(snapshot, 'snapshot_dir', tmp_path / 'snapshot')
+    monkeypatch.setattr(snapshot, 'snapshot_tables', {'orders': spec})
+    monkeypatch.setattr(snapshot, 'chunk_rows', 10)
+    monkeypatch.setattr(snapshot, 'compact_min_files', 4)
+    monkeypatch.setattr(snapshot, 'iter_chunks', src.iter_chunks)
+    monkeypatch.setattr(snapshot, 'table_schema', lambda conn, spec: schema)
+    monkeypatch.setattr(snapshot, 'get_watermark', lambda cur, table: src.watermark)
+    monkeypatch.setattr(snapshot, 'set_watermark', lambda cur, table, last_id: setattr(src, 'watermark', last_id))
+    return src
+
+
+def read_back(table_dir) -> pa.Table:
+    files = sorted(table_dir.rglob('*.parquet'))
+    return pa.concat_tables([pq.read_table(f, schema=schema) for f in files])
+
+
+def test_incremental_append_and_compaction(source):
+    conn = FakeConnection()
+    table_dir = snapshot.snapshot_dir / 'orders'
+
+    assert snapshot.snapshot_table(conn, 'orders') == 100
+    source.add_rows(35)
+    assert snapshot.snapshot_table(conn, 'orders') == 35
+    assert snapshot.snapshot_table(conn, 'orders') == 0
+    assert source.watermark == 135
+
+    # every row exactly once, one fixed schema, small files compacted per partition
+    table = read_back(table_dir)
+    assert sorted(table.column('order_no').to_pylist()) == list(range(1, 136))
+    assert all(pq.read_schema(f).equals(schema) for f in table_dir.rglob('*.parquet'))
+    for part_dir in table_dir.iterdir():
+        assert len(list(part_dir.glob('*.parquet'))) < snapshot.compact_min_files
+
+
+def test_leftovers_of_interrupted_run_removed(source):
+    conn = FakeConnection()
+    table_dir = snapshot.snapshot_dir / 'orders'
+    snapshot.snapshot_table(conn, 'orders')
+
+    # interrupted append: files past the watermark written, watermark never moved
+    source.add_rows(40)
+    source.fail_after = 2
+    with pytest.raises(RuntimeError):
+        snapshot.snapshot_table(conn, 'orders')
+    assert source.watermark == 100
+
+    source.fail_after = None
+    snapshot.snapshot_table(conn, 'orders')
+    assert sorted(read_back(table_dir).column('order_no').to_pylist()) == list(range(1, 141))
+
+
+def test_interrupted_full_rebuild_resumes_from_zero(source):
+    conn = FakeConnection()
+    table_dir = snapshot.snapshot_dir / 'orders'
+    snapshot.snapshot_table(conn, 'orders')
+
+    source.fail_after = 3
+    with pytest.raises(RuntimeError):
+        snapshot.snapshot_table(conn, 'orders', full=True)
+    assert source.watermark == 0
+
+    source.fail_after = None
+    snapshot.snapshot_table(conn, 'orders')
+    assert sorted(read_back(table_dir).column('order_no').to_pylist()) == list(range(1, 101))
+
+
+def test_cleanup_removes_covered_and_temp_files(tmp_path):
+    part_dir = tmp_path / 'order_year=2003'
+    part_dir.mkdir()
+    for name in ['part-000000000001-000000000010-0000.parquet', 'part-000000000011-000000000020-0001.parquet',
+                 'compact-000000000001-000000000020.parquet', 'part-000000000021-000000000030-0002.parquet',
+                 '_part-000000000031-000000000040-0003.tmp']:
+        (part_dir / name).touch()
+
+    assert snapshot.cleanup(tmp_path, last_id=20) == 4
+    assert sorted(f.name for f in part_dir.iterdir()) == ['compact-000000000001-000000000020.parquet']